@@ -1,10 +1,55 @@
 
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.models import User
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 from .models import PDFDocument, Course, Lesson, LessonPDF
 from .enrollment import Enrollment
 from .profile import Profile
+from .forms import LessonPDFAdminForm
+from .pdf_processing import queue_pdf_processing, restore_original_pdf
+
+# Changelists of big tables (users, lessons, PDFs, enrollments)
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses the planner's row estimate (pg_class.reltuples) as the count of an
+    unfiltered queryset over a big PostgreSQL table, since an exact COUNT(*)
+    scans the whole table. Filtered querysets, small tables and other
+    databases are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = self.estimated_count()
+            # reltuples is -1 for tables that were never analyzed
+            if estimate is not None and estimate >= settings.ADMIN_ESTIMATED_COUNT_MIN:
+                return int(estimate)
+        return super().count
+
+    def estimated_count(self):
+        connection = connections[self.object_list.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                           [self.object_list.model._meta.db_table])
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skips the second, unfiltered COUNT(*) behind "N results (M total)"
+    show_full_result_count = False
+
 
 # Custom User Profile Inline
 class ProfileInline(admin.StackedInline):
@@ -14,10 +59,11 @@ class ProfileInline(admin.StackedInline):
     fields = ('role',)
 
 # Enhanced User Admin
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(BaseUserAdmin, LargeTableAdmin):
     inlines = (ProfileInline,)
     list_display = BaseUserAdmin.list_display + ('get_role',)
     list_filter = BaseUserAdmin.list_filter + ('profile__role',)
+    list_select_related = ('profile',)
     
     def get_role(self, obj):
         return obj.profile.role if hasattr(obj, 'profile') else 'No Profile'
@@ -31,51 +77,96 @@ class LessonInline(admin.TabularInline):
     readonly_fields = ('created_at',)
 
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ('title', 'lesson_count', 'enrollment_count')
+    # Stored counters (courses/counters.py), so no COUNT per row
+    list_display = ('title', 'lesson_link', 'pdf_count', 'enrollment_link')
     search_fields = ('title',)
+    readonly_fields = ('lesson_count', 'pdf_count', 'enrollment_count')
     inlines = [LessonInline]
-    
-    def lesson_count(self, obj):
-        return obj.lessons.count()
-    lesson_count.short_description = 'Lessons'
-    
-    def enrollment_count(self, obj):
-        return Enrollment.objects.filter(course=obj).count()
-    enrollment_count.short_description = 'Enrollments'
+
+    def lesson_link(self, obj):
+        url = reverse('admin:courses_lesson_changelist') + f'?course__id__exact={obj.pk}'
+        return format_html('<a href="{}">{}</a>', url, obj.lesson_count)
+    lesson_link.short_description = 'Lessons'
+    lesson_link.admin_order_field = 'lesson_count'
+
+    def enrollment_link(self, obj):
+        url = reverse('admin:courses_enrollment_changelist') + f'?course__id__exact={obj.pk}'
+        return format_html('<a href="{}">{}</a>', url, obj.enrollment_count)
+    enrollment_link.short_description = 'Enrollments'
+    enrollment_link.admin_order_field = 'enrollment_count'
 
 # Enhanced Lesson Admin with PDF management
 class LessonPDFInline(admin.TabularInline):
     model = LessonPDF
+    form = LessonPDFAdminForm
     extra = 1
     fields = ('title', 'pdf_file', 'uploaded_at')
     readonly_fields = ('uploaded_at',)
 
-class LessonAdmin(admin.ModelAdmin):
+class LessonAdmin(LargeTableAdmin):
+    # No course filter, as for enrollments: the course changelist links to
+    # each course's lessons instead
     list_display = ('title', 'course', 'pdf_count', 'created_at')
-    list_filter = ('course', 'created_at')
+    list_filter = ('created_at',)
+    list_select_related = ('course',)
     search_fields = ('title', 'course__title')
+    autocomplete_fields = ('course',)
     inlines = [LessonPDFInline]
-    
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(pdf_total=Count('pdfs'))
+
     def pdf_count(self, obj):
-        return obj.pdfs.count()
+        return obj.pdf_total
     pdf_count.short_description = 'PDFs'
+    pdf_count.admin_order_field = 'pdf_total'
 
 # Enhanced LessonPDF Admin
-class LessonPDFAdmin(admin.ModelAdmin):
-    list_display = ('title', 'lesson', 'get_course', 'uploaded_at')
-    list_filter = ('lesson__course', 'uploaded_at')
+class LessonPDFAdmin(LargeTableAdmin):
+    # A course filter would list every course; search by course title instead
+    form = LessonPDFAdminForm
+    list_display = ('title', 'lesson', 'get_course', 'page_count', 'get_bytes_saved', 'processing_status', 'uploaded_at')
+    list_filter = ('processing_status', 'uploaded_at')
+    list_select_related = ('lesson__course', 'blob__original')
     search_fields = ('title', 'lesson__title', 'lesson__course__title')
+    autocomplete_fields = ('lesson',)
+    actions = ['reprocess', 'restore_original']
     
     def get_course(self, obj):
         return obj.lesson.course.title
     get_course.short_description = 'Course'
+    get_course.admin_order_field = 'lesson__course__title'
+
+    def get_bytes_saved(self, obj):
+        return obj.blob.bytes_saved if obj.blob else 0
+    get_bytes_saved.short_description = 'Bytes saved'
+
+    def reprocess(self, request, queryset):
+        ids = list(queryset.values_list('pk', flat=True))
+        for pdf_id in ids:
+            queue_pdf_processing(pdf_id, force=True)
+        self.message_user(request, f"Queued {len(ids)} PDFs for processing.")
+    reprocess.short_description = 'Re-run PDF processing'
+
+    def restore_original(self, request, queryset):
+        for pdf in queryset.select_related('blob__original'):
+            restore_original_pdf(pdf)
+        self.message_user(request, "Restored the original uploads.")
+    restore_original.short_description = 'Serve the original (unoptimized) upload'
 
 # Enhanced Enrollment Admin
-class EnrollmentAdmin(admin.ModelAdmin):
+class EnrollmentAdmin(LargeTableAdmin):
+    # No date_hierarchy: its year/month links come from a DISTINCT over every
+    # enrollment, and no course filter: its sidebar lists every course on
+    # each page load. A course's enrollments are one click from the course
+    # changelist (?course__id__exact=). Searches match a user exactly rather
+    # than substring-matching across three joined tables.
     list_display = ('user', 'course', 'enrolled_at')
-    list_filter = ('course', 'enrolled_at')
-    search_fields = ('user__username', 'user__email', 'course__title')
-    date_hierarchy = 'enrolled_at'
+    list_filter = ('enrolled_at',)
+    list_select_related = ('user', 'course')
+    search_fields = ('=user__username', '=user__email')
+    raw_id_fields = ('user',)
+    autocomplete_fields = ('course',)
 
 # Enhanced PDFDocument Admin
 class PDFDocumentAdmin(admin.ModelAdmin):
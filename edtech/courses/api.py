@@ -1,52 +1,196 @@
 
-from django.db import models
-from rest_framework import viewsets, permissions, exceptions, status
+import io
+
+from rest_framework import viewsets, mixins, permissions, exceptions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from django.conf import settings
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
-from .models import Course, Lesson, LessonPDF
+from django.utils.functional import SimpleLazyObject
+from .models import Course, Lesson, LessonPDF, SearchEntry, UploadSession
 from .serializers import CourseSerializer, LessonSerializer
 from .pdf_serializers import LessonPDFSerializer
-from .enrollment import Enrollment
-from .upload_serializers import PDFUploadSerializer
-from .storage import upload_bytes, signed_url
-from rest_framework.decorators import action
-class LessonPDFViewSet(viewsets.ModelViewSet):
-    queryset = LessonPDF.objects.all()
+from .enrollment import enroll, enrolled_course_ids, unenroll
+from .permissions import IsEnrolled
+from .upload_serializers import PDFUploadSerializer, UploadSessionSerializer
+from .blobs import store_uploaded_file
+from .bulk_enroll import BulkEnrollError, bulk_enroll, parse_course_ids, read_csv, read_data
+from .pdf_tokens import InvalidToken, issue_pdf_token, verify_pdf_token
+from .pdf_delivery import serve_cached_file, serve_pdf
+from .watermark import serve_stamped, server_watermarks_enabled
+from .pdf_pages import (
+    PageRangeError, PDFNotCached, UnreadablePDF, content_key, extract_pages, page_manifest, parse_page_range,
+)
+from .uploads import UploadError, complete_upload, write_part
+from .pagination import KeysetPagination, LessonKeysetPagination, LessonPDFKeysetPagination
+from . import catalog_cache, fast_read
+from .bundle import course_bundle
+from .fieldsets import SparseFieldsetViewMixin
+from .conditional import conditional_get, payload_digest, set_etag
+from .search import matching_course_ids, search
+from .suggest import suggest as suggest_titles
+
+
+def _view_url(request, pdf_id):
+    """Locally signed, user-specific link; verified by the pdf-content view"""
+    token = issue_pdf_token(request.user.id, pdf_id, expires_sec=settings.PDF_TOKEN_TTL)
+    return request.build_absolute_uri(f"{reverse('pdf-content', args=[pdf_id])}?token={token}")
+
+
+def _unavailable(exc):
+    """Response for a PDF that can't be paged yet (PDFNotCached) or at all (UnreadablePDF)"""
+    if isinstance(exc, PDFNotCached):
+        return Response({'error': 'The PDF is being prepared, try again shortly.'},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '2'})
+    code = status.HTTP_409_CONFLICT if exc.encrypted else status.HTTP_422_UNPROCESSABLE_ENTITY
+    return Response({'error': str(exc)}, status=code)
+
+
+def _client_watermark(user):
+    return f"{user.username or user.email} • {timezone.now().strftime('%Y-%m-%d %H:%M')}"
+
+
+class LessonPDFViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    queryset = LessonPDF.objects.select_related('lesson')
     serializer_class = LessonPDFSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = LessonPDFKeysetPagination
+    sparse_always_loaded = ('id', 'lesson', 'uploaded_at')
 
-    @action(detail=True, methods=['get'])
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = self.sparse_queryset(queryset)
+        return queryset
+
+    @action(detail=True, methods=['get'], permission_classes=[IsEnrolled])
     def view_pdf(self, request, pk=None):
+        # IsEnrolled admits enrolled users only
         pdf = self.get_object()
         user = request.user
         
-        # Verify user is authenticated and enrolled in the course
-        if not user.is_authenticated:
-            raise exceptions.PermissionDenied("Authentication required.")
-        
-        # Check if user is enrolled in the course
-        if not Enrollment.objects.filter(user=user, course=pdf.lesson.course).exists():
-            raise exceptions.PermissionDenied("You are not enrolled in this course.")
-        
-        # Generate secure URL with user-specific validation
-        from .storage import generate_secure_pdf_url
-        url = generate_secure_pdf_url(pdf.pdf_path, user.id, expires_sec=300)  # 5 minutes for better UX
-        watermark = f"{user.username or user.email} • {timezone.now().strftime('%Y-%m-%d %H:%M')}"
-        
         return Response({
-            'signed_url': url,
-            'watermark': watermark,
+            'signed_url': _view_url(request, pdf.id),
+            'expires_in': settings.PDF_TOKEN_TTL,
+            'watermark': _client_watermark(user),
             'user_id': user.id,
-            'course_id': pdf.lesson.course.id,
-            'lesson_id': pdf.lesson.id,
+            'course_id': pdf.lesson.course_id,
+            'lesson_id': pdf.lesson_id,
             'access_token': user.auth_token if hasattr(user, 'auth_token') else None
         })
 
-class CourseViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['get'], permission_classes=[IsEnrolled])
+    def stream(self, request, pk=None):
+        """
+        Serve the PDF bytes with Range/ETag support from the local disk cache.
+
+        PDF viewers that can't send an Authorization header pass the token
+        from view_pdf as ?token=.
+        """
+        pdf, user_id = self._get_readable_pdf(request, pk)
+        if server_watermarks_enabled():
+            try:
+                return serve_stamped(request, pdf, user_id)
+            except (PDFNotCached, UnreadablePDF) as exc:
+                return _unavailable(exc)
+        return serve_pdf(request, pdf)
+
+    @action(detail=True, methods=['get'], permission_classes=[IsEnrolled])
+    def pages(self, request, pk=None):
+        """Page manifest (count and page sizes) for lazy, page-by-page viewers."""
+        pdf, _ = self._get_readable_pdf(request, pk)
+        try:
+            return Response({'pdf_id': pdf.id, **page_manifest(pdf)})
+        except (PDFNotCached, UnreadablePDF) as exc:
+            return _unavailable(exc)
+
+    @action(detail=True, methods=['get'], url_path=r'pages/(?P<pages>\d+(?:-\d+)?)', permission_classes=[IsEnrolled])
+    def page(self, request, pk=None, pages=None):
+        """A single page (pages/3/) or page range (pages/3-7/) as its own PDF."""
+        pdf, user_id = self._get_readable_pdf(request, pk)
+        try:
+            first, last = parse_page_range(pages, page_manifest(pdf)['page_count'])
+            if server_watermarks_enabled():
+                # Viewers loading page by page get each page stamped on demand
+                return serve_stamped(request, pdf, user_id, first, last)
+            return serve_cached_file(
+                request,
+                lambda: extract_pages(pdf, first, last),
+                etag=f'"{content_key(pdf)}-p{first}-{last}"',
+                last_modified=pdf.uploaded_at.timestamp(),
+            )
+        except PageRangeError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        except (PDFNotCached, UnreadablePDF) as exc:
+            return _unavailable(exc)
+
+    def _get_readable_pdf(self, request, pk):
+        """
+        Fetch a PDF the caller may read, with the reader's user id: either a
+        view_pdf token in ?token= (for viewers that can't send headers) or an
+        enrolled, logged-in user (checked by IsEnrolled).
+        """
+        token = request.query_params.get('token')
+        if token:
+            try:
+                access = verify_pdf_token(token, pdf_id=pk, scope='view')
+            except InvalidToken as exc:
+                raise exceptions.PermissionDenied(str(exc))
+            return get_object_or_404(LessonPDF.objects.select_related('blob'), pk=pk), access.user_id
+        pdf = get_object_or_404(LessonPDF.objects.select_related('blob', 'lesson'), pk=pk)
+        self.check_object_permissions(request, pdf)
+        return pdf, request.user.id
+
+class EnrolledCoursesContextMixin:
+    """Share the user's enrolled course ids with serializers, so is_enrolled needs no query per course."""
+
+    def get_enrolled_course_ids(self):
+        if not hasattr(self, '_enrolled_course_ids'):
+            self._enrolled_course_ids = enrolled_course_ids(self.request.user)
+        return self._enrolled_course_ids
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # Lazy, so responses that don't include is_enrolled skip the query
+        context['enrolled_course_ids'] = SimpleLazyObject(self.get_enrolled_course_ids)
+        return context
+
+
+class FastListMixin:
+    """
+    List responses built from ``values()`` rows instead of model instances
+    and serializers when ``API_FAST_READ`` is on (see courses.fast_read).
+
+    Viewsets provide ``fast_rows(queryset, fields)`` and
+    ``fast_payload(rows, fields)``, plus ``for_output(queryset)`` for the
+    serializer path.
+    """
+
+    def list_response(self, queryset):
+        if settings.API_FAST_READ:
+            fields = self.get_output_fields()
+            rows = self.fast_rows(queryset, fields)
+            page = self.paginate_queryset(rows)
+            data = self.fast_payload(rows if page is None else page, fields)
+        else:
+            queryset = self.for_output(queryset)
+            page = self.paginate_queryset(queryset)
+            data = self.get_serializer(queryset if page is None else page, many=True).data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class CourseViewSet(EnrolledCoursesContextMixin, FastListMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+    sparse_always_loaded = ('id', 'created_at')
     
     def get_queryset(self):
         """Filter courses based on search query parameter"""
@@ -54,68 +198,204 @@ class CourseViewSet(viewsets.ModelViewSet):
         search = self.request.query_params.get('search', None)
         
         if search:
-            queryset = queryset.filter(
-                models.Q(title__icontains=search) |
-                models.Q(description__icontains=search)
-            )
+            # Uses the full-text index, so lesson titles match too
+            queryset = queryset.filter(pk__in=matching_course_ids(search))
         
+        if self.action == 'retrieve':
+            queryset = self.for_output(queryset)
+        return queryset
+
+    def for_output(self, queryset):
+        """Load only the columns, and lessons, that the requested fields need"""
+        queryset = self.sparse_queryset(queryset)
+        if 'lessons' in self.get_output_fields():
+            queryset = queryset.prefetch_related(
+                Prefetch('lessons', Lesson.objects.only('id', 'course', 'title', 'created_at').order_by('created_at', 'id'))
+            )
         return queryset
 
+    def fast_rows(self, queryset, fields):
+        return fast_read.course_rows(queryset, fields)
+
+    def fast_payload(self, rows, fields):
+        return fast_read.courses(rows, fields, SimpleLazyObject(self.get_enrolled_course_ids))
+
     def get_serializer_context(self):
         """Add request context to serializer"""
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
 
+    def _shared_data(self, view, *args, **kwargs):
+        """Payload of ``view`` with every is_enrolled flag false, for the shared cache"""
+        enrolled = self.__dict__.pop('_enrolled_course_ids', None)
+        self._enrolled_course_ids = frozenset()
+        try:
+            return view(self.request, *args, **kwargs).data
+        finally:
+            del self._enrolled_course_ids
+            if enrolled is not None:
+                self._enrolled_course_ids = enrolled
+
+    def uses_shared_cache(self):
+        """
+        Whether the shared cache can serve this request. Enrollment counts
+        change without bumping its versions, and is_enrolled flags are
+        overlaid by course id.
+        """
+        fields = self.get_output_fields()
+        if 'enrollment_count' in fields:
+            return False
+        return 'is_enrolled' not in fields or 'id' in fields
+
+    def _list(self, request):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+
+    def _shared_response(self, key, view, *args, **kwargs):
+        """The cached payload of ``view`` with the caller's is_enrolled flags, and its ETag"""
+        def build():
+            data = self._shared_data(view, *args, **kwargs)
+            return data, payload_digest(data)
+
+        data, digest = catalog_cache.get_or_build(key, build)
+        enrolled = SimpleLazyObject(self.get_enrolled_course_ids)
+        response = Response(catalog_cache.overlay_enrollment(data, enrolled))
+        # The flags are all the digest doesn't cover
+        flags = sorted(enrolled) if 'is_enrolled' in self.get_output_fields() else None
+        return set_etag(response, digest, flags)
+
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        if not self.uses_shared_cache():
+            return self._list(request)
+        return self._shared_response(catalog_cache.list_key(request), self._list)
+
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            course_id = int(kwargs[self.lookup_field])
+        except ValueError:
+            return super().retrieve(request, *args, **kwargs)
+        if not self.uses_shared_cache():
+            return super().retrieve(request, *args, **kwargs)
+        return self._shared_response(
+            catalog_cache.detail_key(request, course_id), super().retrieve, *args, **kwargs,
+        )
+
+    @action(detail=True, methods=['get'])
+    def bundle(self, request, pk=None):
+        """
+        The course page in one response: the course with the caller's
+        is_enrolled, its lessons in order and their PDFs' metadata. Enrolled
+        callers passing ?links=first also get view_pdf links for the first
+        lesson's PDFs, valid for expires_in seconds.
+        """
+        try:
+            course_id = int(pk)
+        except ValueError:
+            raise exceptions.NotFound()
+        enrolled = self.get_enrolled_course_ids()
+        linked = request.query_params.get('links') == 'first' and course_id in enrolled
+        view_url = (lambda pdf_id: _view_url(request, pdf_id)) if linked else None
+        data = course_bundle(course_id, enrolled, view_url)
+        if linked:
+            data.update(expires_in=settings.PDF_TOKEN_TTL, watermark=_client_watermark(request.user))
+        return Response(data)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
+    def suggest(self, request):
+        """Typeahead: courses and lessons with a title word starting with ?q=, served from memory"""
+        try:
+            limit = min(settings.SUGGEST_MAX_RESULTS, max(1, int(request.query_params.get('limit', 10))))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(suggest_titles(request.query_params.get('q', ''), limit))
+
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def enroll(self, request, pk=None):
         """Enroll the current user in this course"""
         course = self.get_object()
-        user = request.user
         
-        # Check if already enrolled
-        if Enrollment.objects.filter(user=user, course=course).exists():
+        # One INSERT ... ON CONFLICT DO NOTHING, so double clicks can't race
+        if not enroll(request.user.id, course.id):
             return Response({'message': 'Already enrolled in this course'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Create enrollment
-        Enrollment.objects.create(user=user, course=course)
         return Response({'message': f'Successfully enrolled in {course.title}'}, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def unenroll(self, request, pk=None):
         """Unenroll the current user from this course"""
         course = self.get_object()
-        user = request.user
         
-        try:
-            enrollment = Enrollment.objects.get(user=user, course=course)
-            enrollment.delete()
-            return Response({'message': f'Successfully unenrolled from {course.title}'}, status=status.HTTP_200_OK)
-        except Enrollment.DoesNotExist:
+        if not unenroll(request.user.id, course.id):
             return Response({'message': 'Not enrolled in this course'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'message': f'Successfully unenrolled from {course.title}'}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def bulk_enroll(self, request):
+        """
+        Enroll many users at once. Upload a CSV as ``file`` (user and course
+        columns, or a cohort's user column plus comma-separated ``courses``),
+        or send JSON ``{"enrollments": [{"user": ..., "course": ...}]}`` or
+        ``{"users": [...], "courses": [...]}``. Users are given by email or username.
+        """
+        upload = request.FILES.get('file')
+        try:
+            if upload is not None:
+                lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', errors='replace', newline='')
+                rows = read_csv(lines, parse_course_ids(request.data.get('courses', '')))
+            else:
+                rows = read_data(request.data)
+            result = bulk_enroll(rows)
+        except BulkEnrollError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result.as_dict())
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def my_courses(self, request):
         """Get all courses that the current user is enrolled in"""
-        user = request.user
-        enrollments = Enrollment.objects.filter(user=user)
-        courses = [enrollment.course for enrollment in enrollments]
-        serializer = self.get_serializer(courses, many=True, context={'request': request})
-        return Response(serializer.data)
+        return self.list_response(Course.objects.filter(enrollment__user=request.user))
 
-class LessonViewSet(viewsets.ModelViewSet):
+class LessonViewSet(EnrolledCoursesContextMixin, FastListMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Lesson.objects.all()
     serializer_class = LessonSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = LessonKeysetPagination
+    sparse_always_loaded = ('id', 'course', 'created_at')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            queryset = self.for_output(queryset)
+        return queryset
+
+    def for_output(self, queryset):
+        """Join and prefetch only what the requested fields embed"""
+        fields = self.get_output_fields()
+        queryset = self.sparse_queryset(queryset)
+        if 'course' in fields:
+            queryset = queryset.select_related('course')
+        if 'pdfs' in fields:
+            queryset = queryset.prefetch_related('pdfs')
+        return queryset
+
+    def fast_rows(self, queryset, fields):
+        return fast_read.lesson_rows(queryset, fields)
 
+    def fast_payload(self, rows, fields):
+        return fast_read.lessons(rows, fields, SimpleLazyObject(self.get_enrolled_course_ids))
+
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+
+    def get_permissions(self):
+        if self.action == 'retrieve':
+            # Lesson content is for enrolled users only
+            return [IsEnrolled()]
+        return super().get_permissions()
+
+    @conditional_get
     def retrieve(self, request, *args, **kwargs):
-        lesson = self.get_object()
-        user = request.user
-        if not user.is_authenticated:
-            raise exceptions.PermissionDenied("Authentication required.")
-        # Only allow access if user is enrolled in the course
-        if not Enrollment.objects.filter(user=user, course=lesson.course).exists():
-            raise exceptions.PermissionDenied("You are not enrolled in this course.")
         return super().retrieve(request, *args, **kwargs)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
@@ -124,9 +404,95 @@ class LessonViewSet(viewsets.ModelViewSet):
         serializer = PDFUploadSerializer(data=request.data)
         if serializer.is_valid():
             pdf_file = serializer.validated_data['pdf_file']
-            path_in_bucket = f"{lesson.course.id}/{lesson.title.replace(' ', '_')}.pdf"
-            upload_bytes(path_in_bucket, pdf_file.read())
-            lesson.pdf_path = path_in_bucket
-            lesson.save()
-            return Response({'status': 'PDF uploaded', 'pdf_path': path_in_bucket})
+            title = serializer.validated_data.get('title') or lesson.title
+            # Hashed while streaming; identical bytes are stored only once
+            blob = store_uploaded_file(pdf_file)
+            pdf = LessonPDF.objects.create(lesson=lesson, title=title, blob=blob, pdf_path=blob.path)
+            return Response({'status': 'PDF uploaded', 'pdf_id': pdf.id, 'pdf_path': blob.path})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable chunked PDF uploads.
+
+    POST /uploads/ starts a session, PUT /uploads/{id}/parts/{n}/ sends a raw
+    part with its SHA-256 in the X-Part-SHA256 header, GET /uploads/{id}/
+    lists the parts received so far, and POST /uploads/{id}/complete/
+    assembles them into a LessonPDF.
+    """
+    queryset = UploadSession.objects.prefetch_related('parts')
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+    @action(detail=True, methods=['put'], url_path=r'parts/(?P<number>\d+)')
+    def parts(self, request, pk=None, number=None):
+        session = self.get_object()
+        if session.status == 'complete':
+            return Response({'error': 'Upload already completed'}, status=status.HTTP_409_CONFLICT)
+        try:
+            part = write_part(session, int(number), request.stream, request.headers.get('X-Part-SHA256'))
+        except UploadError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'number': part.number, 'size': part.size, 'sha256': part.sha256})
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        session = self.get_object()
+        try:
+            pdf = complete_upload(session)
+        except UploadError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'PDF uploaded', 'pdf_id': pdf.id, 'pdf_path': pdf.pdf_path})
+
+
+class SearchViewSet(viewsets.ViewSet):
+    """
+    Ranked, highlighted full-text search: GET /search/?q=...&type=course,lesson,pdf&page=N
+
+    PDF text matches are only returned for courses the caller is enrolled in.
+    """
+    permission_classes = [permissions.AllowAny]
+    max_page_size = 50
+
+    def list(self, request):
+        query = request.query_params.get('q', '')
+        kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind]
+        if any(kind not in dict(SearchEntry.KIND_CHOICES) for kind in kinds):
+            return Response({'error': 'type must be course, lesson or pdf'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page = max(1, int(request.query_params.get('page', 1)))
+            page_size = min(self.max_page_size, max(1, int(request.query_params.get('page_size', settings.SEARCH_PAGE_SIZE))))
+        except ValueError:
+            return Response({'error': 'page and page_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        if user.is_staff:
+            pdf_course_ids = None
+        else:
+            pdf_course_ids = enrolled_course_ids(user)
+
+        total, hits = search(query, kinds=kinds, pdf_course_ids=pdf_course_ids,
+                             offset=(page - 1) * page_size, limit=page_size)
+        url = request.build_absolute_uri()
+        return Response({
+            'count': total,
+            'next': replace_query_param(url, 'page', page + 1) if page * page_size < total else None,
+            'previous': replace_query_param(url, 'page', page - 1) if page > 1 else None,
+            'results': [
+                {
+                    'type': hit.kind,
+                    'id': hit.object_id,
+                    'course_id': hit.course_id,
+                    'lesson_id': hit.lesson_id,
+                    'title': hit.title,
+                    'highlight': hit.highlight,
+                    'snippet': hit.snippet,
+                    'rank': hit.rank,
+                }
+                for hit in hits
+            ],
+        })
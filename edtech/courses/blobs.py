@@ -0,0 +1,93 @@
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import PDFBlob
+from .storage import upload_stream
+
+
+def _read_chunks(path, chunk_size):
+    with open(path, 'rb') as fh:
+        while True:
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def hash_chunks(chunks):
+    """Return (sha256 hexdigest, size) of an iterable of byte chunks."""
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in chunks:
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+@contextmanager
+def spooled(chunks):
+    """
+    Write ``chunks`` to a temporary file while hashing them.
+
+    Yields (path, sha256, size); the file is removed on exit.
+    """
+    os.makedirs(settings.UPLOAD_STAGING_ROOT, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.pdf', dir=settings.UPLOAD_STAGING_ROOT)
+    try:
+        digest = hashlib.sha256()
+        size = 0
+        with os.fdopen(fd, 'wb') as fh:
+            for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                fh.write(chunk)
+        yield path, digest.hexdigest(), size
+    finally:
+        os.remove(path)
+
+
+def store_blob(sha256, size, open_chunks):
+    """
+    Return the blob for ``sha256``, uploading ``open_chunks()`` only if it is new.
+
+    ``open_chunks`` is called lazily so identical re-uploads never touch the
+    network.
+    """
+    blob = PDFBlob.objects.filter(sha256=sha256).first()
+    if blob is not None:
+        return blob
+    path = PDFBlob.path_for(sha256)
+    upload_stream(path, open_chunks())
+    try:
+        with transaction.atomic():
+            return PDFBlob.objects.create(sha256=sha256, path=path, size=size)
+    except IntegrityError:
+        # Another request stored the same bytes concurrently
+        return PDFBlob.objects.get(sha256=sha256)
+
+
+def store_file(path):
+    """Store a local file as a content-addressed blob."""
+    chunk_size = settings.UPLOAD_CHUNK_SIZE
+    sha256, size = hash_chunks(_read_chunks(path, chunk_size))
+    return store_blob(sha256, size, lambda: _read_chunks(path, chunk_size))
+
+
+def store_chunks(chunks):
+    chunk_size = settings.UPLOAD_CHUNK_SIZE
+    with spooled(chunks) as (path, sha256, size):
+        return store_blob(sha256, size, lambda: _read_chunks(path, chunk_size))
+
+
+def store_uploaded_file(uploaded_file):
+    """Store a Django ``UploadedFile`` as a content-addressed blob."""
+    chunk_size = settings.UPLOAD_CHUNK_SIZE
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        # Already on disk: hash in place instead of spooling a second copy
+        return store_file(uploaded_file.temporary_file_path())
+    return store_chunks(uploaded_file.chunks(chunk_size))
@@ -0,0 +1,212 @@
+"""
+Bulk enrollment from user/course pairs or cohort CSV files.
+
+Input rows are ``(line, user, course)`` tuples, read lazily and handled in
+chunks of ``BULK_ENROLL_CHUNK_SIZE``: each chunk resolves its users (by
+email, then username, like courses.backends.EmailBackend) and courses in a
+few queries, looks up which pairs already exist and inserts the rest with
+one ``bulk_create(ignore_conflicts=True)``. bulk_create sends no signals,
+so the course enrollment counts, per-user enrollment versions and
+typeahead popularity that the receivers in courses.signals keep are
+updated here.
+"""
+import csv
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from . import counters, suggest
+from .enrollment import Enrollment, bump_enrollment_version
+from .models import Course
+
+USER_COLUMNS = ('user', 'email', 'username')
+MAX_ERRORS = 100
+
+# Marks an email shared by several accounts
+AMBIGUOUS = object()
+
+
+class BulkEnrollError(Exception):
+    """The input as a whole can't be used, e.g. a CSV without a user column."""
+
+
+@dataclass
+class BulkEnrollResult:
+    created: int = 0
+    # Already enrolled, or repeated in the input
+    skipped: int = 0
+    invalid: int = 0
+    # The first MAX_ERRORS invalid rows
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'line': line, 'error': message})
+
+    def as_dict(self):
+        return asdict(self)
+
+
+# --- Input ---
+
+def parse_course_ids(value):
+    """Course references from a list or a comma-separated string."""
+    if isinstance(value, str):
+        value = value.split(',')
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def read_csv(lines, course_ids=()):
+    """
+    Rows of a CSV file, read as it's iterated.
+
+    The header names a user column (``user``, ``email`` or ``username``) and,
+    in pair files, a ``course`` column holding course ids. Cohort files have
+    no course column; each of their users is paired with every id in
+    ``course_ids``.
+    """
+    reader = csv.reader(lines)
+    header = [name.strip().lower() for name in next(reader, [])]
+    user_column = next((header.index(name) for name in USER_COLUMNS if name in header), None)
+    if user_column is None:
+        raise BulkEnrollError('The CSV header needs a user, email or username column')
+    course_column = header.index('course') if 'course' in header else None
+    if course_column is None and not course_ids:
+        raise BulkEnrollError('Cohort files need the course ids to enroll in')
+
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        user = row[user_column].strip() if user_column < len(row) else ''
+        if course_column is None:
+            for course in course_ids:
+                yield reader.line_num, user, course
+        else:
+            yield reader.line_num, user, row[course_column].strip() if course_column < len(row) else ''
+
+
+def read_data(data):
+    """
+    Rows of a JSON body: ``{"enrollments": [{"user": ..., "course": ...}]}``
+    or a cohort, ``{"users": [...], "courses": [...]}``.
+
+    The whole body is checked before any row is read, so a malformed one is
+    rejected before anything is enrolled.
+    """
+    if not isinstance(data, dict):
+        raise BulkEnrollError('Send a JSON object')
+    if 'enrollments' in data:
+        items = data['enrollments']
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise BulkEnrollError('enrollments must be a list of {"user": ..., "course": ...} objects')
+        return (
+            (number, str(item.get('user') or '').strip(), item.get('course'))
+            for number, item in enumerate(items, start=1)
+        )
+    if 'users' in data:
+        users = data['users']
+        if not isinstance(users, list) or not all(isinstance(user, str) for user in users):
+            raise BulkEnrollError('users must be a list of emails or usernames')
+        courses = data.get('courses') or []
+        if not isinstance(courses, (list, str)):
+            raise BulkEnrollError('courses must be a list of course ids')
+        course_ids = parse_course_ids(courses)
+        if not course_ids:
+            raise BulkEnrollError('Cohorts need the course ids to enroll in')
+        return (
+            (number, user.strip(), course)
+            for number, user in enumerate(users, start=1)
+            for course in course_ids
+        )
+    raise BulkEnrollError('Send enrollments, or users and courses')
+
+
+# --- Enrolling ---
+
+def _resolve_users(refs):
+    """Map each reference to a user id, by email first and then by username."""
+    User = get_user_model()
+    users = {}
+    for email, pk in User.objects.filter(email__in=refs).values_list('email', 'id'):
+        users[email] = AMBIGUOUS if email in users else pk
+    rest = refs - users.keys()
+    if rest:
+        users.update(User.objects.filter(username__in=rest).values_list('username', 'id'))
+    return users
+
+
+def _course_id(ref):
+    try:
+        return int(ref)
+    except (TypeError, ValueError):
+        return None
+
+
+def _enrollments_added(pairs):
+    for user_id in {user_id for user_id, _ in pairs}:
+        bump_enrollment_version(user_id)
+    for course_id, count in Counter(course_id for _, course_id in pairs).items():
+        suggest.enrollment_changed(course_id, count)
+
+
+def _enroll_chunk(chunk, result, known_courses):
+    users = _resolve_users({user for _, user, _ in chunk if user})
+    unchecked = {_course_id(course) for _, _, course in chunk} - known_courses.keys() - {None}
+    if unchecked:
+        existing = set(Course.objects.filter(pk__in=unchecked).values_list('pk', flat=True))
+        known_courses.update((pk, pk in existing) for pk in unchecked)
+
+    pairs = set()
+    for line, user, course in chunk:
+        user_id = users.get(user)
+        course_id = _course_id(course)
+        if not user:
+            result.add_error(line, 'Missing user')
+        elif user_id is None:
+            result.add_error(line, f'Unknown user {user!r}')
+        elif user_id is AMBIGUOUS:
+            result.add_error(line, f'Several users have the email {user!r}')
+        elif not known_courses.get(course_id):
+            result.add_error(line, f'Unknown course {course!r}')
+        elif (user_id, course_id) in pairs:
+            result.skipped += 1
+        else:
+            pairs.add((user_id, course_id))
+    if not pairs:
+        return
+
+    enrolled = set(Enrollment.objects.filter(
+        user_id__in={user_id for user_id, _ in pairs},
+        course_id__in={course_id for _, course_id in pairs},
+    ).values_list('user_id', 'course_id'))
+    new = sorted(pairs - enrolled)
+    result.skipped += len(pairs) - len(new)
+    if not new:
+        return
+    with transaction.atomic():
+        # Pairs enrolled concurrently since the lookup above are ignored but counted
+        # as created, here and in the counters (reconcile_course_counters fixes those)
+        Enrollment.objects.bulk_create(
+            [Enrollment(user_id=user_id, course_id=course_id) for user_id, course_id in new],
+            ignore_conflicts=True,
+        )
+        for course_id, count in Counter(course_id for _, course_id in new).items():
+            counters.adjust(course_id, 'enrollment_count', count)
+        transaction.on_commit(lambda: _enrollments_added(new))
+    result.created += len(new)
+
+
+def bulk_enroll(rows, chunk_size=None):
+    """Enroll every valid ``(line, user, course)`` row; returns a ``BulkEnrollResult``."""
+    chunk_size = chunk_size or settings.BULK_ENROLL_CHUNK_SIZE
+    result = BulkEnrollResult()
+    known_courses = {}
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        _enroll_chunk(chunk, result, known_courses)
+    return result
@@ -0,0 +1,70 @@
+"""
+Everything the course page needs in one response: ``/api/courses/{id}/bundle/``.
+
+Opening a course used to take the course detail, the lesson list, each
+lesson and a view_pdf call per PDF, one round trip after another. The bundle
+holds the course and the caller's enrollment in it, the lessons in order and
+their PDFs' metadata, read with three queries (plus the enrolled course ids,
+which are cached when the cache is shared). Enrolled callers can also have the first lesson's
+PDFs linked, so the viewer can open without another request; those links
+are issued together, with one batch for the thumbnails.
+"""
+from django.http import Http404
+
+from .fast_read import to_datetime
+from .models import Course, Lesson, LessonPDF
+from .pdf_serializers import SIGNED_URL_TTL
+from .storage import signed_urls
+
+PDF_COLUMNS = (
+    'id', 'lesson_id', 'title', 'uploaded_at', 'page_count', 'file_size',
+    'processing_status', 'thumbnail_path',
+)
+
+
+def _link_pdfs(pdfs, rows, view_url):
+    thumbnails = signed_urls([row['thumbnail_path'] for row in rows], expires_sec=SIGNED_URL_TTL)
+    for pdf, row in zip(pdfs, rows):
+        pdf['signed_url'] = view_url(pdf['id'])
+        pdf['thumbnail_url'] = thumbnails.get(row['thumbnail_path'])
+
+
+def course_bundle(course_id, enrolled_course_ids, view_url=None):
+    """
+    The bundle of ``course_id``; raises Http404 when there's no such course.
+
+    ``view_url(pdf_id)``, passed for enrolled callers who asked for links,
+    adds a ``signed_url`` (as view_pdf returns) and a ``thumbnail_url`` to
+    each PDF of the first lesson.
+    """
+    course = Course.objects.filter(pk=course_id).values('id', 'title', 'description', 'created_at').first()
+    if course is None:
+        raise Http404('No Course matches the given query.')
+    course['created_at'] = to_datetime(course['created_at'])
+    course['is_enrolled'] = course_id in enrolled_course_ids
+
+    lessons = [
+        {'id': pk, 'title': title, 'created_at': to_datetime(created_at), 'pdfs': []}
+        for pk, title, created_at in Lesson.objects.filter(course_id=course_id)
+        .order_by('created_at', 'id').values_list('id', 'title', 'created_at')
+    ]
+    rows_by_lesson = {}
+    if lessons:
+        rows = (LessonPDF.objects.filter(lesson__course_id=course_id)
+                .order_by('uploaded_at', 'id').values(*PDF_COLUMNS))
+        for row in rows:
+            rows_by_lesson.setdefault(row['lesson_id'], []).append(row)
+    for lesson in lessons:
+        lesson['pdfs'] = [{
+            'id': row['id'],
+            'title': row['title'],
+            'uploaded_at': to_datetime(row['uploaded_at']),
+            'page_count': row['page_count'],
+            'file_size': row['file_size'],
+            'processing_status': row['processing_status'],
+        } for row in rows_by_lesson.get(lesson['id'], [])]
+
+    if view_url is not None and lessons:
+        first = lessons[0]
+        _link_pdfs(first['pdfs'], rows_by_lesson.get(first['id'], []), view_url)
+    return {'course': course, 'lessons': lessons}
@@ -0,0 +1,98 @@
+"""
+Shared cache for course catalog responses.
+
+``CourseViewSet`` list and retrieve payloads are the same for every user
+apart from the ``is_enrolled`` flags, so they are cached once with every
+flag false and the caller's flags are overlaid per request. Entries are
+``(payload, digest)`` pairs, the digest being what ETags are made from
+(courses.conditional).
+
+Keys carry version numbers that the receivers in courses.signals bump: a
+catalog-wide one for list responses and one per course for its detail
+response. Stale entries are never deleted, just no longer looked up. A
+short-lived lock key makes concurrent misses for one entry rebuild it only
+once.
+
+Versions and locks are only seen by every worker when the cache is shared
+(Redis, see REDIS_URL in settings). With the default local-memory cache each
+process keeps its own, so a change invalidates the process that made it and
+the others serve their copy until CATALOG_CACHE_TIMEOUT, which is kept short
+in that case.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .versions import bump_version, get_version
+
+LIST_VERSION_KEY = 'catalog:version'
+# Part of entry keys; change it with the shape of the entries
+ENTRY_FORMAT = 2
+
+
+def _version_key(course_id):
+    return f'catalog:course:{course_id}:version'
+
+
+def invalidate_course(course_id):
+    """Drop cached list responses and the detail response of ``course_id``."""
+    bump_version(LIST_VERSION_KEY)
+    if course_id is not None:
+        bump_version(_version_key(course_id))
+
+
+def list_version():
+    return get_version(LIST_VERSION_KEY)
+
+
+def course_version(course_id):
+    return get_version(_version_key(course_id))
+
+
+def list_key(request):
+    url = hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()
+    return f'catalog:{ENTRY_FORMAT}:list:{list_version()}:{url}'
+
+
+def detail_key(request, course_id):
+    url = hashlib.sha256(request.build_absolute_uri().encode()).hexdigest()
+    return f'catalog:{ENTRY_FORMAT}:course:{course_id}:{course_version(course_id)}:{url}'
+
+
+def get_or_build(key, build):
+    """
+    Return the cached payload for ``key``, calling ``build()`` on a miss.
+
+    Only one caller at a time rebuilds an entry; the others wait up to
+    ``CATALOG_CACHE_LOCK_WAIT`` seconds for it before building it themselves.
+    """
+    data = cache.get(key)
+    if data is not None:
+        return data
+    lock = f'{key}:lock'
+    if not cache.add(lock, 1, settings.CATALOG_CACHE_LOCK_TIMEOUT):
+        deadline = time.monotonic() + settings.CATALOG_CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            data = cache.get(key)
+            if data is not None:
+                return data
+    try:
+        data = build()
+        cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT)
+    finally:
+        cache.delete(lock)
+    return data
+
+
+def overlay_enrollment(data, enrolled_course_ids):
+    """Copy of a cached course payload (list, page or detail) with the caller's is_enrolled flags."""
+    if isinstance(data, list):
+        return [overlay_enrollment(item, enrolled_course_ids) for item in data]
+    if 'results' in data:
+        return {**data, 'results': overlay_enrollment(data['results'], enrolled_course_ids)}
+    if 'is_enrolled' not in data:
+        return data
+    return {**data, 'is_enrolled': data['id'] in enrolled_course_ids}
@@ -0,0 +1,46 @@
+"""
+ETags and conditional GETs for course and lesson resources.
+
+An ETag is a hash of the payload its response carries, so it always
+matches the body sent, however that body was built or cached. Payloads
+from the shared catalog cache (courses.catalog_cache) are hashed once, when
+cached, and their ETags add the caller's enrolled course ids that the
+is_enrolled flags are overlaid from: revalidating them runs no query.
+Other payloads are hashed as they are built, so a 304 saves rendering and
+sending them, not building them.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers, quote_etag
+
+
+def payload_digest(data):
+    return hashlib.sha256(repr(data).encode()).hexdigest()
+
+
+def set_etag(response, *parts):
+    """Give ``response`` the ETag of ``parts``: digests and whatever else its payload depends on."""
+    response['ETag'] = quote_etag(hashlib.sha256(repr(parts).encode()).hexdigest()[:32])
+    return response
+
+
+def conditional_get(method):
+    """
+    Decorate a viewset method to honour ``If-None-Match`` and send an ETag.
+
+    Responses the method already gave an ETag (see ``set_etag``) keep it;
+    others get one from their data.
+    """
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        response = method(self, request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        if not response.has_header('ETag'):
+            set_etag(response, payload_digest(response.data))
+        # Cached copies are per user and must be revalidated before reuse
+        patch_vary_headers(response, ['Authorization'])
+        patch_cache_control(response, private=True, no_cache=True)
+        return get_conditional_response(request, etag=response['ETag'], response=response)
+    return wrapper
@@ -0,0 +1,54 @@
+"""
+Denormalized per-course counts: ``Course.enrollment_count``, ``lesson_count``
+and ``pdf_count``.
+
+The receivers in courses.signals (and bulk enrollment, which sends no
+signals) adjust them with single ``UPDATE ... SET n = n + delta``
+statements in the writer's transaction, so concurrent writers never lose
+an update. Writes that bypass both, like raw SQL or moving rows with
+``QuerySet.update()``, can make them drift;
+``manage.py reconcile_course_counters`` recomputes them.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .enrollment import Enrollment
+from .models import Course, Lesson, LessonPDF
+
+COUNTERS = Course.COUNTER_FIELDS
+
+
+def adjust(course_id, field, delta):
+    """Add ``delta`` to one of ``course_id``'s counters."""
+    if course_id is None or not delta:
+        return
+    # Never below zero, even if the count had drifted
+    Course.objects.filter(pk=course_id).update(**{field: Greatest(F(field) + delta, Value(0))})
+
+
+def _actual_counts():
+    def count(queryset, course_field):
+        counted = (queryset.filter(**{course_field: OuterRef('pk')}).order_by()
+                   .values(course_field).annotate(n=Count('pk')).values('n'))
+        return Coalesce(Subquery(counted), Value(0))
+
+    return {
+        'enrollment_count': count(Enrollment.objects.all(), 'course'),
+        'lesson_count': count(Lesson.objects.all(), 'course'),
+        'pdf_count': count(LessonPDF.objects.all(), 'lesson__course'),
+    }
+
+
+def drifted_courses():
+    """Courses whose stored counts differ from the actual ones."""
+    actual = _actual_counts()
+    return (Course.objects.annotate(**{f'actual_{name}': expression for name, expression in actual.items()})
+            .exclude(**{name: F(f'actual_{name}') for name in COUNTERS}))
+
+
+def reconcile():
+    """Recompute the counters of every drifted course; returns how many were fixed."""
+    ids = list(drifted_courses().values_list('pk', flat=True))
+    if ids:
+        Course.objects.filter(pk__in=ids).update(**_actual_counts())
+    return len(ids)
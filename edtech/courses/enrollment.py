@@ -1,6 +1,11 @@
-from django.db import models
+from django.db import connection, models, transaction
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .versions import bump_version, get_version
 
 class Enrollment(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -12,3 +17,86 @@ class Enrollment(models.Model):
 
     def __str__(self):
         return f"{self.user} enrolled in {self.course}"
+
+
+def _columns(*fields):
+    """Quoted table name, then the quoted columns of ``fields``."""
+    qn = connection.ops.quote_name
+    meta = Enrollment._meta
+    return (qn(meta.db_table), *(qn(meta.get_field(name).column) for name in fields))
+
+
+def enroll(user_id, course_id):
+    """
+    Enroll a user with one ``INSERT ... ON CONFLICT DO NOTHING``; returns
+    whether a row was inserted.
+
+    Concurrent calls for the same pair can't both succeed or trip the unique
+    constraint. post_save is sent only for an inserted row, so the receivers
+    in courses.signals count each enrollment once. Needs PostgreSQL or
+    SQLite 3.35+ (for RETURNING).
+    """
+    table, pk, user, course, enrolled_at = _columns('id', 'user', 'course', 'enrolled_at')
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({user}, {course}, {enrolled_at}) VALUES (%s, %s, %s) '
+                f'ON CONFLICT ({user}, {course}) DO NOTHING RETURNING {pk}',
+                [user_id, course_id, connection.ops.adapt_datetimefield_value(timezone.now())],
+            )
+            row = cursor.fetchone()
+        if row is not None:
+            enrollment = Enrollment(pk=row[0], user_id=user_id, course_id=course_id)
+            post_save.send(sender=Enrollment, instance=enrollment, created=True, update_fields=None,
+                           raw=False, using=connection.alias)
+    return row is not None
+
+
+def unenroll(user_id, course_id):
+    """Delete an enrollment with one ``DELETE ... RETURNING``; returns whether there was one."""
+    table, pk, user, course = _columns('id', 'user', 'course')
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE {user} = %s AND {course} = %s RETURNING {pk}',
+                           [user_id, course_id])
+            row = cursor.fetchone()
+        if row is not None:
+            enrollment = Enrollment(pk=row[0], user_id=user_id, course_id=course_id)
+            post_delete.send(sender=Enrollment, instance=enrollment, using=connection.alias, origin=enrollment)
+    return row is not None
+
+
+def _version_key(user_id):
+    return f'enrollment:version:{user_id}'
+
+
+def enrolled_course_ids(user):
+    """
+    Ids of the courses ``user`` is enrolled in, as a frozenset (empty for
+    anonymous users).
+
+    Cached under the user's enrollment version, so it takes no query until
+    the user's enrollments change. With ENROLLMENT_CACHE_TIMEOUT at 0 (the
+    default without a shared cache) it's read from the database every time,
+    since the ids decide access and a per-process copy would go stale.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    if not settings.ENROLLMENT_CACHE_TIMEOUT:
+        return frozenset(Enrollment.objects.filter(user=user).values_list('course_id', flat=True))
+    key = f'enrollment:courses:{user.pk}:{enrollment_version(user)}'
+    course_ids = cache.get(key)
+    if course_ids is None:
+        course_ids = frozenset(Enrollment.objects.filter(user=user).values_list('course_id', flat=True))
+        cache.set(key, course_ids, settings.ENROLLMENT_CACHE_TIMEOUT)
+    return course_ids
+
+
+def enrollment_version(user):
+    """A number that changes whenever ``user`` enrolls or unenrolls."""
+    return get_version(_version_key(user.pk)) if user.is_authenticated else 0
+
+
+def bump_enrollment_version(user_id):
+    """Call whenever the user's enrollments change, including writes that send no signals."""
+    bump_version(_version_key(user_id))
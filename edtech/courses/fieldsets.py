@@ -0,0 +1,69 @@
+"""
+Sparse fieldsets (``?fields=``) and opt-in expansion (``?expand=``).
+
+Serializers using ``SparseFieldsetSerializerMixin`` take ``fields`` and
+``expand`` arguments: ``fields`` limits the output to the named fields, and
+``expand`` adds fields listed in ``Meta.expandable_fields``, which are left
+out by default. ``SparseFieldsetViewMixin`` passes the query parameters to
+the view's serializer on reads and trims the queryset to the columns the
+output needs.
+"""
+from rest_framework import permissions
+
+
+def _names(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsetSerializerMixin:
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self._requested_fields = fields
+        self._expand = set(expand)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        expandable = set(getattr(self.Meta, 'expandable_fields', ()))
+        if self._requested_fields is None:
+            keep = (set(fields) - expandable) | (self._expand & expandable)
+        else:
+            keep = set(self._requested_fields) | (self._expand & expandable)
+        return {name: field for name, field in fields.items() if name in keep}
+
+
+class SparseFieldsetViewMixin:
+    """
+    Viewset side of sparse fieldsets.
+
+    ``sparse_always_loaded`` lists model fields the view itself needs (for
+    ordering, permissions and the like) whatever the client asked for.
+    """
+    sparse_always_loaded = ('id',)
+
+    def get_fieldset(self):
+        if not hasattr(self, '_fieldset'):
+            params = self.request.query_params
+            fields = _names(params['fields']) if params.get('fields') else None
+            self._fieldset = (fields, _names(params.get('expand', '')))
+        return self._fieldset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method in permissions.SAFE_METHODS:
+            fields, expand = self.get_fieldset()
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_output_fields(self):
+        """Names of the fields the response will contain, in output order."""
+        return list(self.get_serializer().fields)
+
+    def sparse_queryset(self, queryset):
+        """``queryset`` loading only the columns behind the requested fields."""
+        serializer_class = self.get_serializer_class()
+        sources = getattr(serializer_class.Meta, 'field_sources', {})
+        model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+        needed = set(self.sparse_always_loaded)
+        for name in self.get_output_fields():
+            needed.update(source for source in sources.get(name, (name,)) if source in model_fields)
+        return queryset.only(*needed)
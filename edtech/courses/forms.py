@@ -1,6 +1,6 @@
 from django import forms
-from .models import Lesson, Course
-from .storage import upload_bytes
+from .models import Lesson, LessonPDF, Course
+from .blobs import store_uploaded_file
 
 class SupabasePDFUploadForm(forms.Form):
     course = forms.ModelChoiceField(queryset=Course.objects.all())
@@ -11,13 +11,30 @@ class SupabasePDFUploadForm(forms.Form):
         course = self.cleaned_data['course']
         title = self.cleaned_data['title']
         pdf_file = self.cleaned_data['pdf_file']
-        # Upload to Supabase Storage
-        path_in_bucket = f"{course.id}/{title.replace(' ', '_')}.pdf"
-        upload_bytes(path_in_bucket, pdf_file.read())
-        # Save lesson with Supabase path
-        lesson = Lesson.objects.create(
-            course=course,
-            title=title,
-            pdf_path=path_in_bucket
-        )
+        # Upload to Supabase Storage under a content-addressed key
+        blob = store_uploaded_file(pdf_file)
+        # Save lesson and attach the uploaded PDF
+        lesson = Lesson.objects.create(course=course, title=title)
+        LessonPDF.objects.create(lesson=lesson, title=title, blob=blob, pdf_path=blob.path)
         return lesson
+
+
+class LessonPDFAdminForm(forms.ModelForm):
+    """Admin form that sends uploaded files to PDF storage instead of MEDIA_ROOT."""
+
+    class Meta:
+        model = LessonPDF
+        fields = ('lesson', 'title', 'pdf_file')
+
+    def save(self, commit=True):
+        instance = super().save(commit=False)
+        pdf_file = self.cleaned_data.get('pdf_file')
+        if 'pdf_file' in self.changed_data and pdf_file:
+            blob = store_uploaded_file(pdf_file)
+            instance.blob = blob
+            instance.pdf_path = blob.path
+            instance.pdf_file = None
+        if commit:
+            instance.save()
+            self._save_m2m()
+        return instance
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from courses.pdf_tokens import issue_pdf_token, verify_pdf_token
+
+
+class Command(BaseCommand):
+    help = 'Measure PDF access token signing and verification throughput on one core'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200000)
+
+    def handle(self, *args, **options):
+        n = options['iterations']
+
+        start = time.perf_counter()
+        for i in range(n):
+            issue_pdf_token(i, 42)
+        issue_rate = n / (time.perf_counter() - start)
+
+        token = issue_pdf_token(1, 42)
+        start = time.perf_counter()
+        for _ in range(n):
+            verify_pdf_token(token, pdf_id=42)
+        verify_rate = n / (time.perf_counter() - start)
+
+        self.stdout.write(f'issue:  {issue_rate:,.0f} tokens/s')
+        self.stdout.write(f'verify: {verify_rate:,.0f} tokens/s')
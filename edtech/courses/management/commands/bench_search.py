@@ -0,0 +1,49 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.models import Course, SearchEntry
+from courses.search import search
+
+WORDS = (
+    'algebra calculus vectors matrices proof theorem derivative integral limit series graph '
+    'network protein enzyme cell membrane history empire revolution poetry sonnet grammar '
+    'syntax compiler database index query kernel memory thread process signal'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Measure search latency percentiles, optionally over synthetic lesson entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Add this many synthetic lesson entries for the run (rolled back afterwards)')
+        parser.add_argument('--queries', type=int, default=500)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with transaction.atomic():
+            if options['seed']:
+                course = Course.objects.create(title='Search benchmark')
+                start = time.perf_counter()
+                for offset in range(0, options['seed'], 5000):
+                    SearchEntry.objects.bulk_create(
+                        SearchEntry(kind='lesson', object_id=10 ** 9 + n, course=course,
+                                    title=' '.join(rng.choices(WORDS, k=4)))
+                        for n in range(offset, min(offset + 5000, options['seed']))
+                    )
+                self.stdout.write(f'seeded {options["seed"]:,} entries in {time.perf_counter() - start:.1f}s')
+
+            timings = []
+            for _ in range(options['queries']):
+                query = ' '.join(rng.choices(WORDS, k=rng.randint(1, 2)))
+                start = time.perf_counter()
+                search(query, limit=20)
+                timings.append((time.perf_counter() - start) * 1000)
+            transaction.set_rollback(True)
+
+        timings.sort()
+        pick = lambda p: timings[min(len(timings) - 1, int(len(timings) * p))]
+        self.stdout.write(f'p50 {pick(0.5):.1f} ms  p95 {pick(0.95):.1f} ms  p99 {pick(0.99):.1f} ms')
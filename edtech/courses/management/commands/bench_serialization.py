@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from courses import fast_read
+from courses.models import Course, Lesson, LessonPDF
+from courses.renderers import FastJSONRenderer
+from courses.serializers import CourseSerializer, LessonSerializer
+
+
+class Command(BaseCommand):
+    help = ('Compare serializer + JSONRenderer with the values() fast path + FastJSONRenderer '
+            'on synthetic course and lesson lists')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=500)
+        parser.add_argument('--lessons', type=int, default=10, help='Lessons per course')
+        parser.add_argument('--pdfs', type=int, default=2, help='PDFs per lesson')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['courses'], options['lessons'], options['pdfs'])
+            context = {'enrolled_course_ids': frozenset()}
+            course_fields = list(CourseSerializer().fields)
+            lesson_fields = list(LessonSerializer().fields)
+
+            cases = [
+                ('courses', Course.objects.count(),
+                 lambda: JSONRenderer().render(CourseSerializer(Course.objects.all(), many=True, context=context).data),
+                 lambda: FastJSONRenderer().render(fast_read.courses(
+                     fast_read.course_rows(Course.objects.all(), course_fields), course_fields, frozenset()))),
+                ('lessons', Lesson.objects.count(),
+                 lambda: JSONRenderer().render(LessonSerializer(
+                     Lesson.objects.select_related('course').prefetch_related('pdfs'), many=True, context=context).data),
+                 lambda: FastJSONRenderer().render(fast_read.lessons(
+                     fast_read.lesson_rows(Lesson.objects.all(), lesson_fields), lesson_fields, frozenset()))),
+            ]
+            for name, rows, before, after in cases:
+                if before() != after():
+                    raise CommandError(f'{name}: fast path output differs from the serializers')
+                before_rate = rows / self.best_time(before, options['repeat'])
+                after_rate = rows / self.best_time(after, options['repeat'])
+                self.stdout.write(
+                    f'{name:8} {rows:,} rows  serializers {before_rate:,.0f} rows/s  '
+                    f'fast path {after_rate:,.0f} rows/s  ({after_rate / before_rate:.1f}x)'
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, courses, lessons, pdfs):
+        # bulk_create skips the signal receivers (search index, caches); it's all rolled back
+        created = Course.objects.bulk_create(Course(title=f'Benchmark course {n}') for n in range(courses))
+        created = Lesson.objects.bulk_create(
+            Lesson(course=course, title=f'{course.title} lesson {n}') for course in created for n in range(lessons)
+        )
+        # No storage paths, so the run doesn't sign URLs against the storage backend
+        LessonPDF.objects.bulk_create(
+            LessonPDF(lesson=lesson, title=f'{lesson.title} pdf {n}', page_count=12, file_size=345678)
+            for lesson in created for n in range(pdfs)
+        )
+
+    def best_time(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from PyPDF2 import PdfWriter
+
+from courses.pdf_stamping import render_overlay, stamp_document
+from courses.watermark import run_stamp
+
+
+class Command(BaseCommand):
+    help = 'Measure watermark stamping throughput in pages per second'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=200)
+        parser.add_argument('--jobs', type=int, default=4, help='Documents stamped per run')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Override PDF_WATERMARK_WORKERS (0 = inline)')
+
+    def handle(self, *args, **options):
+        pages = options['pages']
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, 'source.pdf')
+            writer = PdfWriter()
+            for _ in range(pages):
+                writer.add_blank_page(width=612, height=792)
+            with open(src, 'wb') as fh:
+                writer.write(fh)
+
+            start = time.perf_counter()
+            for n in range(100):
+                render_overlay(f"bench-user-{n} • #{n}", 612, 792)
+            overlay_ms = (time.perf_counter() - start) * 10
+
+            # Stamped copies land in a throwaway disk cache
+            overrides = {'PDF_CACHE_ROOT': os.path.join(tmp, 'cache'), 'PDF_CACHE_MAX_BYTES': 2 ** 62}
+            if options['workers'] is not None:
+                overrides['PDF_WATERMARK_WORKERS'] = options['workers']
+            with override_settings(**overrides):
+                # Start every pool process before timing
+                with ThreadPoolExecutor(max_workers=options['jobs']) as requests:
+                    list(requests.map(
+                        lambda job: run_stamp(f'bench:warmup-{job}', stamp_document, src, f'warmup {job}'),
+                        range(options['jobs']),
+                    ))
+                start = time.perf_counter()
+                # Submit concurrently, as parallel requests would
+                with ThreadPoolExecutor(max_workers=options['jobs']) as requests:
+                    list(requests.map(
+                        lambda job: run_stamp(f'bench:{job}', stamp_document, src, f"bench-user • #{job}"),
+                        range(options['jobs']),
+                    ))
+                elapsed = time.perf_counter() - start
+
+        stamped = pages * options['jobs']
+        self.stdout.write(f'overlay render: {overlay_ms:.2f} ms each (cached afterwards)')
+        self.stdout.write(f'stamped {stamped} pages in {elapsed:.2f}s: {stamped / elapsed:,.0f} pages/s')
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.bulk_enroll import BulkEnrollError, bulk_enroll, parse_course_ids, read_csv
+
+
+class Command(BaseCommand):
+    help = ('Enroll users from a CSV file: user/course pairs, or a cohort (one user per row) '
+            'enrolled in every course given with --courses')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file, or - for stdin")
+        parser.add_argument('--courses', default='', help='Comma-separated course ids, for cohort files')
+        parser.add_argument('--chunk-size', type=int, default=None)
+
+    def handle(self, *args, **options):
+        course_ids = parse_course_ids(options['courses'])
+        try:
+            if options['path'] == '-':
+                result = bulk_enroll(read_csv(sys.stdin, course_ids), options['chunk_size'])
+            else:
+                with open(options['path'], encoding='utf-8-sig', errors='replace', newline='') as lines:
+                    result = bulk_enroll(read_csv(lines, course_ids), options['chunk_size'])
+        except (BulkEnrollError, OSError) as exc:
+            raise CommandError(str(exc))
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        if result.invalid > len(result.errors):
+            self.stderr.write(f'... and {result.invalid - len(result.errors):,} more invalid rows')
+        self.stdout.write(f'created {result.created:,}  skipped {result.skipped:,}  invalid {result.invalid:,}')
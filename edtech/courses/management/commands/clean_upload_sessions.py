@@ -0,0 +1,43 @@
+import os
+import shutil
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from courses.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Delete resumable uploads that were never completed, and leftover staging directories'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-hours', type=float, default=settings.UPLOAD_SESSION_MAX_AGE_HOURS,
+                            help='Only delete uploads started (and staging directories last written) before this')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        max_age = timedelta(hours=options['max_age_hours'])
+        abandoned = UploadSession.objects.filter(status='pending', created_at__lt=timezone.now() - max_age)
+        sessions = abandoned.count()
+        if not options['dry_run']:
+            # Their staging directories go with them (courses.signals)
+            for session in abandoned.iterator():
+                session.delete()
+
+        # Directories no pending session owns: completed uploads whose
+        # cleanup failed, or sessions deleted along with their lesson
+        pending = {str(pk) for pk in UploadSession.objects.filter(status='pending').values_list('pk', flat=True)}
+        cutoff = time.time() - max_age.total_seconds()
+        directories = 0
+        root = settings.UPLOAD_STAGING_ROOT
+        for entry in os.scandir(root) if os.path.isdir(root) else ():
+            if entry.is_dir() and entry.name not in pending and entry.stat().st_mtime < cutoff:
+                directories += 1
+                if not options['dry_run']:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {sessions} uploads and {directories} staging directories'))
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from courses.models import PDFBlob
+from courses.storage import delete
+
+
+class Command(BaseCommand):
+    help = 'Delete stored PDF blobs that no LessonPDF references anymore'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-hours', type=float, default=24,
+                            help='Only collect blobs older than this, so in-flight uploads are safe')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        candidates = (
+            PDFBlob.objects
+            .filter(ref_count=0, created_at__lt=cutoff)
+            # Originals stay while an optimised rewrite of them exists
+            .filter(optimized_versions__isnull=True)
+            .annotate(refs=Count('pdfs'))
+            .filter(refs=0)
+            .order_by('pk')
+        )
+        reclaimed = freed = 0
+        batch_size = options['batch_size']
+        last_pk = 0
+        while True:
+            batch = list(candidates.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            if not options['dry_run']:
+                with transaction.atomic():
+                    # Re-check under the transaction in case a blob was just reused
+                    ids = list(
+                        PDFBlob.objects.select_for_update(of=('self',))
+                        .filter(pk__in=[blob.pk for blob in batch], ref_count=0, pdfs__isnull=True,
+                                optimized_versions__isnull=True)
+                        .values_list('pk', flat=True)
+                    )
+                    batch = [blob for blob in batch if blob.pk in ids]
+                    if batch:
+                        delete([blob.path for blob in batch])
+                        PDFBlob.objects.filter(pk__in=ids).delete()
+            reclaimed += len(batch)
+            freed += sum(blob.size for blob in batch)
+
+        verb = 'Would reclaim' if options['dry_run'] else 'Reclaimed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {reclaimed} blobs ({freed} bytes)'))
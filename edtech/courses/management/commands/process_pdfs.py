@@ -0,0 +1,42 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from courses.models import LessonPDF
+from courses.pdf_processing import process_pdf, process_pdf_in_thread
+
+
+class Command(BaseCommand):
+    help = 'Extract page count, text and thumbnails for lesson PDFs that have not been processed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Re-process every PDF, including ones already done')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Parallel workers (0 = process inline, one at a time)')
+
+    def handle(self, *args, **options):
+        pdfs = LessonPDF.objects.exclude(pdf_path='').order_by('pk')
+        if not options['force']:
+            pdfs = pdfs.exclude(processing_status='done')
+        ids = list(pdfs.values_list('pk', flat=True))
+        workers = options['workers']
+
+        if workers == 0:
+            results = [process_pdf(pdf_id, force=options['force']) for pdf_id in ids]
+        else:
+            # Threads download and write to the DB; text extraction is CPU-bound
+            # and runs in a process pool so it isn't serialised by the GIL
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool, \
+                    ThreadPoolExecutor(max_workers=workers) as threads:
+                results = list(threads.map(
+                    lambda pdf_id: process_pdf_in_thread(pdf_id, force=options['force'], pool=pool),
+                    ids,
+                ))
+
+        failed = [pdf.pk for pdf in results if pdf is not None and pdf.processing_status == 'failed']
+        self.stdout.write(self.style.SUCCESS(f'Processed {len(ids) - len(failed)} PDFs'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{len(failed)} failed: {", ".join(map(str, failed))}'))
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Prefetch
+
+from courses.models import Course, Lesson, LessonPDF, LessonPDFPage, SearchEntry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from courses, lessons and processed PDF text'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_body = settings.SEARCH_MAX_BODY_CHARS
+
+        def course_entries():
+            for course in Course.objects.only('title', 'description').iterator(chunk_size=batch_size):
+                yield SearchEntry(kind='course', object_id=course.pk, course_id=course.pk,
+                                  title=course.title, body=course.description)
+
+        def lesson_entries():
+            for lesson in Lesson.objects.only('title', 'course_id').iterator(chunk_size=batch_size):
+                yield SearchEntry(kind='lesson', object_id=lesson.pk, course_id=lesson.course_id,
+                                  lesson_id=lesson.pk, title=lesson.title)
+
+        def pdf_entries():
+            pdfs = (
+                LessonPDF.objects.select_related('lesson').only('title', 'lesson__course_id')
+                .prefetch_related(Prefetch('pages', LessonPDFPage.objects.only('pdf_id', 'text')))
+            )
+            for pdf in pdfs.iterator(chunk_size=batch_size):
+                text = '\n'.join(page.text for page in pdf.pages.all())
+                yield SearchEntry(kind='pdf', object_id=pdf.pk, course_id=pdf.lesson.course_id,
+                                  lesson_id=pdf.lesson_id, title=pdf.title, body=text[:max_body])
+
+        counts = {}
+        with transaction.atomic():
+            SearchEntry.objects.all().delete()
+            for kind, entries in (('course', course_entries()), ('lesson', lesson_entries()), ('pdf', pdf_entries())):
+                batch = []
+                counts[kind] = 0
+                for entry in entries:
+                    batch.append(entry)
+                    if len(batch) >= batch_size:
+                        SearchEntry.objects.bulk_create(batch)
+                        counts[kind] += len(batch)
+                        batch = []
+                SearchEntry.objects.bulk_create(batch)
+                counts[kind] += len(batch)
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # Re-derive the FTS5 table from its content table and merge its segments
+                cursor.execute("INSERT INTO courses_searchentry_fts(courses_searchentry_fts) VALUES ('rebuild')")
+                cursor.execute("INSERT INTO courses_searchentry_fts(courses_searchentry_fts) VALUES ('optimize')")
+            elif connection.vendor == 'postgresql':
+                cursor.execute("ANALYZE courses_searchentry")
+
+        summary = ', '.join(f'{count} {kind}s' for kind, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Indexed {summary}'))
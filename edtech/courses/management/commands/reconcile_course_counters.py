@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from courses.counters import drifted_courses, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recompute Course.enrollment_count, lesson_count and pdf_count where they have drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only list the drifted courses')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            for course in drifted_courses():
+                self.stdout.write(
+                    f'{course.pk} {course.title}: enrollments {course.enrollment_count} -> '
+                    f'{course.actual_enrollment_count}, lessons {course.lesson_count} -> '
+                    f'{course.actual_lesson_count}, pdfs {course.pdf_count} -> {course.actual_pdf_count}'
+                )
+            return
+        self.stdout.write(f'fixed the counters of {reconcile():,} courses')
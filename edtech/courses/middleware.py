@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/')
+
+
+class LargeResponseGZipMiddleware(GZipMiddleware):
+    """
+    Gzip JSON and text responses of at least ``GZIP_MIN_LENGTH`` bytes.
+
+    Small bodies aren't worth the CPU, and PDF responses pass through
+    untouched: their bytes are already compressed, and compressing a
+    streamed or byte-range response would break ``Range`` requests.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        if len(response.content) < settings.GZIP_MIN_LENGTH:
+            return response
+        return super().process_response(request, response)
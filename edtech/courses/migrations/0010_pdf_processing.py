@@ -0,0 +1,65 @@
+# Generated by Django 4.2.23 on 2026-10-16 20:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_pdf_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonpdf',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='lessonpdf',
+            name='page_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='lessonpdf',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='lessonpdf',
+            name='processed_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='lessonpdf',
+            name='processing_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='lessonpdf',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='lessonpdf',
+            name='thumbnail_path',
+            field=models.CharField(blank=True, max_length=500),
+        ),
+        migrations.CreateModel(
+            name='LessonPDFPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('width', models.FloatField()),
+                ('height', models.FloatField()),
+                ('rotation', models.IntegerField(default=0)),
+                ('text', models.TextField(blank=True)),
+                ('pdf', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pages', to='courses.lessonpdf')),
+            ],
+            options={
+                'ordering': ['number'],
+                'unique_together': {('pdf', 'number')},
+            },
+        ),
+    ]
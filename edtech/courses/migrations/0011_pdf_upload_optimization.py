@@ -0,0 +1,29 @@
+# Generated by Django 4.2.23 on 2026-10-16 20:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_pdf_processing'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lessonpdf',
+            name='serve_original',
+            field=models.BooleanField(default=False, help_text='Skip upload optimisation for this PDF'),
+        ),
+        migrations.AddField(
+            model_name='pdfblob',
+            name='linearized',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='pdfblob',
+            name='original',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='optimized_versions', to='courses.pdfblob'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.23 on 2026-10-16 22:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_search_entries'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['created_at', 'id'], name='course_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lesson',
+            index=models.Index(fields=['created_at', 'id'], name='lesson_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonpdf',
+            index=models.Index(fields=['uploaded_at', 'id'], name='lessonpdf_uploaded_id_idx'),
+        ),
+    ]
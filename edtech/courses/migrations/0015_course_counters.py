@@ -0,0 +1,46 @@
+# Generated by Django 4.2.23 on 2026-10-16 22:50
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_existing_rows(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+
+    def count(model, course_field):
+        counted = (apps.get_model('courses', model).objects.filter(**{course_field: OuterRef('pk')})
+                   .order_by().values(course_field).annotate(n=Count('pk')).values('n'))
+        return Coalesce(Subquery(counted), Value(0))
+
+    Course.objects.update(
+        enrollment_count=count('Enrollment', 'course'),
+        lesson_count=count('Lesson', 'course'),
+        pdf_count=count('LessonPDF', 'lesson__course'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_lesson_lessonpdf_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='enrollment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='lesson_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='pdf_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing_rows, migrations.RunPython.noop),
+    ]
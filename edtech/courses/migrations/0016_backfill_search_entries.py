@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_search_entries(apps, schema_editor):
+    """
+    Index the courses, lessons and PDFs that existed before 0012, which only
+    created the (empty) index; signals keep it in sync from then on. Rows
+    that already have an entry are left alone, so this is safe to re-run.
+    """
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+    LessonPDF = apps.get_model('courses', 'LessonPDF')
+    LessonPDFPage = apps.get_model('courses', 'LessonPDFPage')
+    SearchEntry = apps.get_model('courses', 'SearchEntry')
+    max_body = getattr(settings, 'SEARCH_MAX_BODY_CHARS', 200000)
+
+    def indexed(kind):
+        return SearchEntry.objects.filter(kind=kind).values('object_id')
+
+    def course_entries():
+        for course in Course.objects.exclude(pk__in=indexed('course')).iterator(chunk_size=BATCH_SIZE):
+            yield SearchEntry(kind='course', object_id=course.pk, course_id=course.pk,
+                              title=course.title, body=course.description)
+
+    def lesson_entries():
+        for lesson in Lesson.objects.exclude(pk__in=indexed('lesson')).iterator(chunk_size=BATCH_SIZE):
+            yield SearchEntry(kind='lesson', object_id=lesson.pk, course_id=lesson.course_id,
+                              lesson_id=lesson.pk, title=lesson.title)
+
+    def pdf_entries():
+        pdfs = LessonPDF.objects.exclude(pk__in=indexed('pdf')).select_related('lesson')
+        for pdf in pdfs.iterator(chunk_size=BATCH_SIZE):
+            text = '\n'.join(LessonPDFPage.objects.filter(pdf=pdf).order_by('number').values_list('text', flat=True))
+            yield SearchEntry(kind='pdf', object_id=pdf.pk, course_id=pdf.lesson.course_id,
+                              lesson_id=pdf.lesson_id, title=pdf.title, body=text[:max_body])
+
+    for entries in (course_entries(), lesson_entries(), pdf_entries()):
+        batch = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= BATCH_SIZE:
+                SearchEntry.objects.bulk_create(batch)
+                batch = []
+        SearchEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_course_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_entries, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,6 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
 class PDFDocument(models.Model):
@@ -13,12 +16,32 @@ class Course(models.Model):
     description = models.TextField(blank=True, help_text="Brief description of the course")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counts, kept by courses.counters
+    enrollment_count = models.PositiveIntegerField(default=0, editable=False)
+    lesson_count = models.PositiveIntegerField(default=0, editable=False)
+    pdf_count = models.PositiveIntegerField(default=0, editable=False)
+
+    COUNTER_FIELDS = ('enrollment_count', 'lesson_count', 'pdf_count')
 
     def __str__(self): 
         return self.title
 
+    def save(self, *args, **kwargs):
+        """
+        Saving an existing course leaves the counters alone: they are only
+        written with F() updates, and this instance's copies may be stale.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created_at']
+        # Keyset pagination walks (created_at, id)
+        indexes = [models.Index(fields=['created_at', 'id'], name='course_created_id_idx')]
         verbose_name = "Course"
         verbose_name_plural = "Courses"
 
@@ -28,17 +51,160 @@ class Lesson(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="lessons")
     title = models.CharField(max_length=200)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['created_at', 'id'], name='lesson_created_id_idx')]
 
     def __str__(self):
         return f"{self.course} — {self.title}"
 
 
+class PDFBlob(models.Model):
+    """
+    A stored PDF identified by the SHA-256 of its bytes.
+
+    Identical uploads share one blob; ``ref_count`` tracks how many
+    ``LessonPDF`` rows point at it so unreferenced blobs can be collected.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=500)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set on optimised rewrites; the original is kept as a fallback
+    original = models.ForeignKey(
+        'self', on_delete=models.PROTECT, null=True, blank=True, related_name="optimized_versions"
+    )
+    linearized = models.BooleanField(default=False)
+
+    @property
+    def bytes_saved(self):
+        return self.original.size - self.size if self.original_id else 0
+
+    @staticmethod
+    def path_for(sha256):
+        return f"blobs/{sha256[:2]}/{sha256}.pdf"
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} bytes, {self.ref_count} refs)"
+
+
 class LessonPDF(models.Model):
+    PROCESSING_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name="pdfs")
     title = models.CharField(max_length=200)
     pdf_file = models.FileField(upload_to='lesson_pdfs/', blank=True, null=True)
     pdf_path = models.CharField(max_length=500, blank=True)  # Supabase path, auto-filled
+    blob = models.ForeignKey(PDFBlob, on_delete=models.PROTECT, null=True, blank=True, related_name="pdfs")
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Filled in by the post-upload processing pipeline (courses.pdf_processing)
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    file_size = models.BigIntegerField(null=True, blank=True)
+    thumbnail_path = models.CharField(max_length=500, blank=True)
+    processing_status = models.CharField(max_length=10, choices=PROCESSING_CHOICES, default='pending')
+    processing_error = models.TextField(blank=True)
+    processed_key = models.CharField(max_length=64, blank=True)  # content key the metadata was extracted from
+    processed_at = models.DateTimeField(null=True, blank=True)
+    serve_original = models.BooleanField(default=False, help_text="Skip upload optimisation for this PDF")
+
+    class Meta:
+        indexes = [models.Index(fields=['uploaded_at', 'id'], name='lessonpdf_uploaded_id_idx')]
+
+    def __str__(self):
+        return f"{self.lesson} — {self.title}"
+
+
+class LessonPDFPage(models.Model):
+    """Per-page geometry and extracted text of a processed ``LessonPDF``."""
+    pdf = models.ForeignKey(LessonPDF, on_delete=models.CASCADE, related_name="pages")
+    number = models.PositiveIntegerField()
+    width = models.FloatField()
+    height = models.FloatField()
+    rotation = models.IntegerField(default=0)
+    text = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = ('pdf', 'number')
+        ordering = ['number']
+
+    def __str__(self):
+        return f"{self.pdf_id} page {self.number}"
+
+
+class UploadSession(models.Model):
+    """A resumable, chunked PDF upload that is assembled once every part arrives."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('complete', 'Complete'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name="upload_sessions")
+    title = models.CharField(max_length=200)
+    total_size = models.BigIntegerField()
+    part_size = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    pdf = models.ForeignKey(LessonPDF, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def part_count(self):
+        return max(1, -(-self.total_size // self.part_size))
+
+    def expected_part_size(self, number):
+        """Size in bytes that part ``number`` (1-based) must have."""
+        if number < self.part_count:
+            return self.part_size
+        return self.total_size - self.part_size * (self.part_count - 1)
+
+    def __str__(self):
+        return f"{self.title} ({self.status})"
+
+
+class UploadPart(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name="parts")
+    number = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('session', 'number')
+        ordering = ['number']
+
+    def __str__(self):
+        return f"{self.session_id} part {self.number}"
+
+
+class SearchEntry(models.Model):
+    """
+    One searchable document (a course, lesson or lesson PDF), kept in sync by
+    signals in courses.signals. The full-text index over it is backend
+    specific and created in migrations; see courses.search.
+    """
+    KIND_CHOICES = [
+        ('course', 'Course'),
+        ('lesson', 'Lesson'),
+        ('pdf', 'PDF'),
+    ]
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="+")
+    lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+        verbose_name_plural = "Search entries"
 
     def __str__(self):
-        return f"{self.lesson} — {self.title}"
\ No newline at end of file
+        return f"{self.kind} {self.object_id}: {self.title}"
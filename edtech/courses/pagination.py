@@ -0,0 +1,145 @@
+"""
+Keyset (cursor) pagination over a ``(timestamp, id)`` key.
+
+Each page is a range scan that starts right after the last row of the
+previous one, so deep pages cost the same as the first, unlike OFFSET
+pagination. It is opt-in: requests without ``?cursor=`` or ``?page_size=``
+still get the plain, unpaginated list existing clients expect.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate on ``ordering``, a ``(timestamp field, 'id')`` pair sorted in
+    one direction, e.g. ``('-created_at', '-id')``.
+
+    The cursor holds the key of the row it continues from and whether it
+    walks backwards (for ``previous`` links).
+    """
+    ordering = ('-created_at', '-id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def is_requested(self, request):
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, settings.API_PAGE_SIZE))
+        except ValueError:
+            size = settings.API_PAGE_SIZE
+        return min(max(size, 1), settings.API_MAX_PAGE_SIZE)
+
+    # --- Cursors ---
+
+    def encode_cursor(self, row, reverse):
+        field = self.ordering[0].lstrip('-')
+        # Rows are model instances, or dicts on the values() fast path
+        if isinstance(row, dict):
+            key = [row[field].isoformat(), row['id']]
+        else:
+            key = [getattr(row, field).isoformat(), row.pk]
+        data = {'k': key, 'r': int(reverse)}
+        return base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            timestamp, pk = data['k']
+            timestamp, pk, reverse = parse_datetime(timestamp), int(pk), bool(data.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+        return timestamp, pk, reverse
+
+    # --- Paging ---
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[2]
+
+        field = self.ordering[0].lstrip('-')
+        descending = self.ordering[0].startswith('-')
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            timestamp, pk, _ = cursor
+            # Rows after the cursor in the walking direction: one index range scan
+            after = 'lt' if descending != reverse else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field}__{after}': timestamp}) | Q(**{field: timestamp, f'id__{after}': pk})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = bool(rows), has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1], False))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        url = self.request.build_absolute_uri()
+        if not self.page:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[0], True))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class LessonKeysetPagination(KeysetPagination):
+    """Oldest first, so lessons page through in the order they were added."""
+    ordering = ('created_at', 'id')
+
+
+class LessonPDFKeysetPagination(KeysetPagination):
+    ordering = ('uploaded_at', 'id')
@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .storage import download
+from .storage_backends import StorageError
+
+logger = logging.getLogger(__name__)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Temporary files older than this are left over from crashed fills
+STALE_TMP_SECONDS = 3600
+
+
+class PDFDiskCache:
+    """
+    Bounded on-disk LRU cache of stored PDFs, keyed by storage path.
+
+    Entries are filled from storage on a small background thread pool and
+    the least recently used files are deleted once ``max_bytes`` is exceeded.
+    Recency is kept in file mtimes, so the order survives restarts.
+
+    The directory is shared by every worker process: files another worker
+    filled are adopted on lookup. Fills update a running size and LRU index
+    in memory; the directory is only rescanned (outside the lock) once that
+    index goes over ``max_bytes`` or is ``rescan_interval`` seconds old, so
+    the cap covers the whole disk cache rather than one process's share of
+    it without every fill walking the directory.
+    """
+
+    def __init__(self, root, max_bytes, fill_workers=2, rescan_interval=60):
+        self.root = os.path.abspath(root)
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # local file -> size, least recent first
+        self._total = 0
+        self._scanned_at = 0
+        self._filling = set()
+        self._executor = ThreadPoolExecutor(max_workers=fill_workers, thread_name_prefix='pdf-cache-fill')
+        os.makedirs(self.root, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Rebuild the index from the files on disk, least recently used first."""
+        scanned_at = time.monotonic()
+        found = []
+        stale = time.time() - STALE_TMP_SECONDS
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                full = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(full)
+                    if not name.endswith('.tmp'):
+                        found.append((stat.st_mtime, full, stat.st_size))
+                    elif stat.st_mtime < stale:
+                        # Other workers' fills in progress are left alone
+                        os.remove(full)
+                except FileNotFoundError:
+                    continue
+        entries = OrderedDict((full, size) for _, full, size in sorted(found))
+        with self._lock:
+            self._entries = entries
+            self._total = sum(entries.values())
+            self._scanned_at = scanned_at
+
+    def file_for(self, path):
+        key = hashlib.sha256(path.encode()).hexdigest()
+        return os.path.join(self.root, key[:2], f"{key}.pdf")
+
+    def get(self, path):
+        """Return the local file caching ``path`` and mark it recently used, or None."""
+        local = self.file_for(path)
+        with self._lock:
+            try:
+                size = os.path.getsize(local)
+            except FileNotFoundError:
+                # Never filled, or evicted by another worker process sharing this directory
+                self._total -= self._entries.pop(local, 0)
+                return None
+            # Possibly filled by another worker: adopt it
+            self._total += size - self._entries.pop(local, 0)
+            self._entries[local] = size
+        try:
+            os.utime(local)
+        except OSError:
+            pass
+        return local
+
+    def fill(self, path):
+        """Download ``path`` into the cache, returning the local file."""
+        local = self.file_for(path)
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(local))
+        try:
+            size = 0
+            with os.fdopen(fd, 'wb') as fh:
+                for chunk in download(path):
+                    fh.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp, local)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self._add(local, size)
+        return local
+
+    def get_or_fill(self, path):
+        """Return the local file for ``path``, downloading it now on a miss."""
+        return self.get(path) or self.fill(path)
+
+    def get_or_build(self, key, build):
+        """
+        Return a cached file derived from stored PDFs (pages, stamped copies).
+
+        ``build(tmp_path)`` writes the file on a miss; it shares the LRU and
+        size cap with the cached originals.
+        """
+        local = self.get_derived(key)
+        if local is not None:
+            return local
+        tmp = self.derived_tmp(key)
+        try:
+            build(tmp)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        return self.publish_derived(key, tmp)
+
+    def get_derived(self, key):
+        return self.get(f"derived:{key}")
+
+    def derived_tmp(self, key):
+        """A new empty file to build the derived file ``key`` in, for ``publish_derived``."""
+        local = self.file_for(f"derived:{key}")
+        os.makedirs(os.path.dirname(local), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(local))
+        os.close(fd)
+        return tmp
+
+    def publish_derived(self, key, tmp):
+        """Move a file built by ``derived_tmp``'s caller into the cache as ``key``."""
+        local = self.file_for(f"derived:{key}")
+        os.replace(tmp, local)
+        self._add(local, os.path.getsize(local))
+        return local
+
+    def _fill_in_background(self, path):
+        try:
+            self.fill(path)
+        except StorageError:
+            logger.warning("Could not fill PDF cache for %s", path, exc_info=True)
+        except Exception:
+            # Nothing waits on the future, so this is the only trace of the failure
+            logger.exception("PDF cache fill failed for %s", path)
+        finally:
+            with self._lock:
+                self._filling.discard(path)
+
+    def fill_async(self, path):
+        """Schedule a background fill unless one is already running for ``path``."""
+        with self._lock:
+            if path in self._filling:
+                return
+            self._filling.add(path)
+        self._executor.submit(self._fill_in_background, path)
+
+    def _add(self, local, size):
+        with self._lock:
+            self._total += size - self._entries.pop(local, 0)
+            self._entries[local] = size
+            rescan = (self._total > self.max_bytes
+                      or time.monotonic() - self._scanned_at >= self.rescan_interval)
+        if rescan:
+            # Other workers fill and evict too; count what's actually on disk
+            self._scan()
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            local, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(local)
+            except FileNotFoundError:
+                pass
+
+    @property
+    def total_bytes(self):
+        return self._total
+
+
+def get_pdf_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PDFDiskCache(
+                    settings.PDF_CACHE_ROOT,
+                    settings.PDF_CACHE_MAX_BYTES,
+                    fill_workers=settings.PDF_CACHE_FILL_WORKERS,
+                    rescan_interval=settings.PDF_CACHE_RESCAN_INTERVAL,
+                )
+    return _cache
+
+
+@receiver(setting_changed)
+def _reset_cache(setting, **kwargs):
+    global _cache
+    if setting.startswith('PDF_CACHE') or setting.startswith('PDF_STORAGE'):
+        _cache = None
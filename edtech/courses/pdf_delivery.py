@@ -0,0 +1,135 @@
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .pdf_cache import get_pdf_cache
+from .storage import signed_url
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def pdf_etag(pdf):
+    if pdf.blob_id:
+        # Content-addressed: the hash of the bytes is the perfect strong validator
+        return f'"{pdf.blob.sha256}"'
+    key = f"{pdf.pdf_path}:{pdf.uploaded_at.isoformat()}"
+    return f'"{hashlib.sha256(key.encode()).hexdigest()[:32]}"'
+
+
+def parse_range(header, size):
+    """
+    Return (start, end) inclusive for a single byte range, None to serve the
+    whole file, or False if the range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        # Absent, malformed or multi-range requests get the full body
+        return None
+    first, last = match.groups()
+    if first == '':
+        if last == '' or int(last) == 0:
+            return False
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _iter_range(local, start, length, chunk_size):
+    with open(local, 'rb') as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _set_common_headers(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = 'private, max-age=300'
+    return response
+
+
+def serve_pdf(request, pdf):
+    """
+    Serve a LessonPDF's bytes from the local disk cache with Range support.
+
+    A cache miss starts a background fill and redirects this one request to
+    storage, so no request waits for the whole file to be fetched.
+    """
+    etag = pdf_etag(pdf)
+    last_modified = pdf.uploaded_at.timestamp()
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if not_modified is not None:
+        return _set_common_headers(not_modified, etag, last_modified)
+
+    cache = get_pdf_cache()
+    local = cache.get(pdf.pdf_path)
+    if local is None:
+        cache.fill_async(pdf.pdf_path)
+        response = HttpResponseRedirect(signed_url(pdf.pdf_path, expires_sec=60))
+        response['Cache-Control'] = 'private, no-store'
+        return response
+
+    return _serve_local_file(request, local, etag, last_modified)
+
+
+def serve_cached_file(request, get_local, etag, last_modified):
+    """
+    Serve a file from the PDF disk cache with conditional GET and Range support.
+
+    ``get_local()`` is only called when the client's copy is stale, so a 304
+    never pays for building the file.
+    """
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if not_modified is not None:
+        return _set_common_headers(not_modified, etag, last_modified)
+    return _serve_local_file(request, get_local(), etag, last_modified)
+
+
+def _serve_local_file(request, local, etag, last_modified):
+    size = os.path.getsize(local)
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range == etag:
+        byte_range = parse_range(request.headers.get('Range'), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{size}"
+        return _set_common_headers(response, etag, last_modified)
+
+    if byte_range is None:
+        if settings.PDF_SENDFILE_HEADER:
+            # Let the front-end server (nginx X-Accel-Redirect, Apache X-Sendfile)
+            # send the file itself; it handles Range requests natively
+            response = HttpResponse(content_type='application/pdf')
+            relative = os.path.relpath(local, get_pdf_cache().root)
+            response[settings.PDF_SENDFILE_HEADER] = settings.PDF_SENDFILE_PREFIX + relative
+        else:
+            # FileResponse hands real files to wsgi.file_wrapper, which gunicorn
+            # serves with sendfile()
+            response = FileResponse(open(local, 'rb'), content_type='application/pdf')
+        return _set_common_headers(response, etag, last_modified)
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        _iter_range(local, start, length, settings.UPLOAD_CHUNK_SIZE),
+        status=206,
+        content_type='application/pdf',
+    )
+    response['Content-Length'] = str(length)
+    response['Content-Range'] = f"bytes {start}-{end}/{size}"
+    return _set_common_headers(response, etag, last_modified)
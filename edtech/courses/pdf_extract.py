@@ -0,0 +1,62 @@
+"""
+Pure PyPDF2/Pillow metadata extraction, kept free of Django imports so it
+can run inside worker processes during backfills.
+"""
+import io
+import logging
+
+from PIL import Image, UnidentifiedImageError
+from PyPDF2 import PdfReader
+
+logger = logging.getLogger(__name__)
+
+
+def _thumbnail(page, size):
+    """
+    JPEG thumbnail of the largest image embedded in ``page``, or None.
+
+    There is no PDF rasteriser in our dependencies, so scanned and
+    image-heavy first pages get a preview and text-only ones don't.
+    """
+    try:
+        images = sorted(page.images, key=lambda image: len(image.data), reverse=True)
+    except Exception:
+        # Unsupported filters or broken XObjects; a preview isn't worth failing for
+        logger.debug("Could not read page images", exc_info=True)
+        return None
+    for image in images:
+        try:
+            picture = Image.open(io.BytesIO(image.data))
+            picture.thumbnail((size, size))
+            out = io.BytesIO()
+            picture.convert('RGB').save(out, 'JPEG', quality=80)
+            return out.getvalue()
+        except (UnidentifiedImageError, OSError, ValueError):
+            continue
+    return None
+
+
+def extract_pdf(path, thumbnail_size=320):
+    """
+    Return the page count, per-page geometry and text, and a first-page
+    thumbnail (JPEG bytes or None) for the PDF at ``path``.
+    """
+    reader = PdfReader(path)
+    pages = []
+    for number, page in enumerate(reader.pages, start=1):
+        box = page.mediabox
+        try:
+            text = page.extract_text()
+        except Exception:
+            logger.debug("Could not extract text from page %s", number, exc_info=True)
+            text = ''
+        pages.append({
+            'number': number,
+            'width': float(box.width),
+            'height': float(box.height),
+            'rotation': int(page.get('/Rotate', 0)),
+            # Postgres text columns reject NUL bytes, which some fonts produce
+            'text': text.replace('\x00', ''),
+        })
+    thumbnail = _thumbnail(reader.pages[0], thumbnail_size) if pages else None
+    return {'page_count': len(pages), 'pages': pages, 'thumbnail': thumbnail}
@@ -0,0 +1,116 @@
+"""
+Pure PyPDF2 size optimisation of uploaded PDFs, kept free of Django imports
+like the other PDF helpers so it can run in worker processes.
+
+The PyPDF2 pass compresses content streams and other unfiltered streams,
+points duplicate fonts and images at one shared copy and drops objects that
+nothing references. Linearization ("fast web view") needs qpdf, which is
+used as a final pass when a binary is configured and installed.
+"""
+import hashlib
+import shutil
+import subprocess
+
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, StreamObject
+
+DEDUPE_RESOURCES = ('/Font', '/XObject', '/ExtGState', '/ColorSpace', '/Pattern', '/Shading')
+
+
+class _Deduper:
+    """Hash resolved object trees so identical resources can share one object."""
+
+    def __init__(self):
+        self._digests = {}
+        self.canonical = {}
+
+    def digest(self, obj):
+        if isinstance(obj, IndirectObject):
+            key = obj.idnum, obj.generation
+            if key not in self._digests:
+                # Placeholder guards against reference cycles
+                self._digests[key] = b'cycle'
+                self._digests[key] = self.digest(obj.get_object())
+            return self._digests[key]
+        h = hashlib.sha256(type(obj).__name__.encode())
+        if isinstance(obj, DictionaryObject):
+            for name in sorted(obj):
+                if name in ('/Length', '/Parent'):
+                    continue
+                h.update(name.encode())
+                h.update(self.digest(obj.raw_get(name)))
+            if isinstance(obj, StreamObject):
+                h.update(obj._data)
+        elif isinstance(obj, ArrayObject):
+            for item in obj:
+                h.update(self.digest(item))
+        else:
+            h.update(repr(obj).encode())
+        return h.digest()
+
+    def dedupe(self, resources):
+        """Point each indirect resource in ``resources`` at its canonical copy."""
+        replaced = 0
+        for category in DEDUPE_RESOURCES:
+            entries = resources.get(category)
+            if not isinstance(entries, DictionaryObject):
+                continue
+            for name in list(entries):
+                ref = entries.raw_get(name)
+                if not isinstance(ref, IndirectObject):
+                    continue
+                canonical = self.canonical.setdefault(self.digest(ref), ref)
+                if canonical.idnum != ref.idnum:
+                    entries[NameObject(name)] = canonical
+                    replaced += 1
+        return replaced
+
+
+def _compress_streams(writer):
+    for index, obj in enumerate(writer._objects):
+        if isinstance(obj, StreamObject) and '/Filter' not in obj and len(obj._data) > 64:
+            compressed = obj.flate_encode()
+            if len(compressed._data) < len(obj._data):
+                writer._objects[index] = compressed
+
+
+def optimize_pdf(src_path, dst_path, qpdf=None):
+    """
+    Write an optimised copy of ``src_path`` to ``dst_path``.
+
+    Returns whether the output is linearized, which requires the ``qpdf``
+    executable named by ``qpdf``.
+    """
+    reader = PdfReader(src_path)
+    deduper = _Deduper()
+    for page in reader.pages:
+        resources = page.get('/Resources')
+        if isinstance(resources, (DictionaryObject, IndirectObject)):
+            deduper.dedupe(resources.get_object())
+
+    writer = PdfWriter()
+    # append() copies what the pages, outline and named destinations
+    # reference, so unreferenced objects in the upload are left behind
+    writer.append(reader)
+    for page in writer.pages:
+        page.compress_content_streams()
+    _compress_streams(writer)
+    if reader.metadata:
+        writer.add_metadata(reader.metadata)
+    with open(dst_path, 'wb') as fh:
+        writer.write(fh)
+
+    binary = shutil.which(qpdf) if qpdf else None
+    if binary is None:
+        return False
+    linearized = dst_path + '.lin'
+    result = subprocess.run(
+        [binary, '--linearize', '--object-streams=generate', '--compress-streams=y',
+         '--recompress-flate', dst_path, linearized],
+        capture_output=True, timeout=300,
+    )
+    # Exit status 3 means qpdf succeeded with warnings
+    if result.returncode not in (0, 3):
+        raise subprocess.CalledProcessError(result.returncode, binary, result.stdout, result.stderr)
+    shutil.move(linearized, dst_path)
+    return True
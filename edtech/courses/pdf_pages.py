@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.errors import PyPdfError
+
+from .models import LessonPDF
+from .pdf_cache import get_pdf_cache
+from .pdf_delivery import pdf_etag
+
+# What PyPDF2 raises for malformed files besides its own errors
+READ_ERRORS = (PyPdfError, ValueError, KeyError, TypeError, AttributeError, IndexError)
+
+
+class PageRangeError(ValueError):
+    """Raised for page numbers outside the document or oversized ranges."""
+
+
+class PDFNotCached(Exception):
+    """Raised while the PDF is still being copied from storage to the local cache."""
+
+
+class UnreadablePDF(Exception):
+    """Raised for PDFs that can't be parsed, or that need a password (``encrypted``)."""
+
+    def __init__(self, message, encrypted=False):
+        super().__init__(message)
+        self.encrypted = encrypted
+
+
+def content_key(pdf):
+    return pdf_etag(pdf).strip('"')
+
+
+def _mark_failed(pdf, error):
+    LessonPDF.objects.filter(pk=pdf.pk).update(
+        processing_status='failed', processing_error=error[:1000], updated_at=timezone.now(),
+    )
+
+
+def _unreadable(pdf, exc):
+    """Mark ``pdf`` failed and return the UnreadablePDF to raise for ``exc``."""
+    _mark_failed(pdf, f"Unreadable PDF: {exc}")
+    return UnreadablePDF("The PDF file is damaged or not a PDF.")
+
+
+def open_pdf(pdf):
+    """
+    A ``PdfReader`` over the locally cached copy of ``pdf``.
+
+    A cache miss starts a background fill and raises ``PDFNotCached`` rather
+    than downloading the whole file inside the request. Files PyPDF2 can't
+    read raise ``UnreadablePDF`` and mark the PDF's processing as failed.
+    """
+    pdf_cache = get_pdf_cache()
+    local = pdf_cache.get(pdf.pdf_path)
+    if local is None:
+        pdf_cache.fill_async(pdf.pdf_path)
+        raise PDFNotCached(pdf.pdf_path)
+    try:
+        reader = PdfReader(local)
+        encrypted = reader.is_encrypted and not reader.decrypt('')
+    except READ_ERRORS as exc:
+        raise _unreadable(pdf, exc) from exc
+    if encrypted:
+        message = "The PDF is password-protected."
+        _mark_failed(pdf, message)
+        raise UnreadablePDF(message, encrypted=True)
+    return reader
+
+
+def read_pages(pdf, reader, first=1, last=None):
+    """
+    Pages ``first``..``last`` (1-based, inclusive; default all) of ``reader``.
+
+    PyPDF2 parses pages as they're accessed, so damage can surface here too;
+    it's reported like in ``open_pdf``.
+    """
+    try:
+        pages = reader.pages
+        last = len(pages) if last is None else last
+        return [pages[index] for index in range(first - 1, last)]
+    except READ_ERRORS as exc:
+        raise _unreadable(pdf, exc) from exc
+
+
+def _page_size(pdf, number, page):
+    try:
+        box = page.mediabox
+        return {
+            'number': number,
+            'width': float(box.width),
+            'height': float(box.height),
+            'rotation': int(page.get('/Rotate', 0)),
+        }
+    except READ_ERRORS as exc:
+        raise _unreadable(pdf, exc) from exc
+
+
+def page_manifest(pdf):
+    """Return the page count and per-page sizes, extracted once per PDF content."""
+    pdf_key = content_key(pdf)
+    key = f"pdf-manifest:{pdf_key}"
+    manifest = cache.get(key)
+    if manifest is None and pdf.processed_key == pdf_key:
+        # Already extracted by the processing pipeline; no need to open the file
+        pages = list(pdf.pages.values('number', 'width', 'height', 'rotation'))
+        manifest = {'page_count': len(pages), 'pages': pages}
+        cache.set(key, manifest, None)
+    if manifest is None:
+        pages = read_pages(pdf, open_pdf(pdf))
+        pages = [_page_size(pdf, number, page) for number, page in enumerate(pages, start=1)]
+        manifest = {'page_count': len(pages), 'pages': pages}
+        cache.set(key, manifest, None)
+    return manifest
+
+
+def parse_page_range(value, page_count):
+    """Turn '3' or '3-7' into an inclusive (first, last) tuple, validating it."""
+    first, _, last = value.partition('-')
+    first = int(first)
+    last = int(last) if last else first
+    if not 1 <= first <= last <= page_count:
+        raise PageRangeError(f"Pages must be within 1-{page_count}.")
+    if last - first + 1 > settings.PDF_PAGE_RANGE_MAX:
+        raise PageRangeError(f"At most {settings.PDF_PAGE_RANGE_MAX} pages per request.")
+    return first, last
+
+
+def extract_pages(pdf, first, last):
+    """Return a local file holding pages ``first``..``last`` as their own PDF."""
+    pdf_cache = get_pdf_cache()
+
+    def build(tmp_path):
+        writer = PdfWriter()
+        for page in read_pages(pdf, open_pdf(pdf), first, last):
+            writer.add_page(page)
+        with open(tmp_path, 'wb') as fh:
+            writer.write(fh)
+
+    return pdf_cache.get_or_build(f"pages:{content_key(pdf)}:{first}-{last}", build)
@@ -0,0 +1,195 @@
+"""
+Post-upload processing of lesson PDFs, off the request path: an optional
+size optimisation pass, then page count, size, per-page text and a
+first-page thumbnail.
+
+New uploads are queued from a ``post_save`` receiver once the transaction
+commits. Processing is keyed on the PDF's content, so re-running it for
+unchanged bytes is a no-op unless forced.
+"""
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .blobs import store_file
+from .models import LessonPDF, LessonPDFPage, PDFBlob
+from .pdf_cache import get_pdf_cache
+from .pdf_extract import extract_pdf
+from .pdf_optimize import optimize_pdf
+from .pdf_pages import content_key
+from .search import index_pdf
+from .storage import upload_stream
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PDF_PROCESSING_WORKERS,
+                    thread_name_prefix='pdf-processing',
+                )
+    return _executor
+
+
+@receiver(setting_changed)
+def _reset_executor(setting, **kwargs):
+    global _executor
+    if setting == 'PDF_PROCESSING_WORKERS' and _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+def thumbnail_path_for(key):
+    return f"thumbnails/{key[:2]}/{key}.jpg"
+
+
+def _run(pool, func, *args):
+    return pool.submit(func, *args).result() if pool is not None else func(*args)
+
+
+def _optimized_blob(blob, local, pool):
+    """
+    Return an optimised version of ``blob``, or None when the rewrite isn't
+    worth serving (not smaller and not linearized, or unreadable).
+    """
+    existing = PDFBlob.objects.filter(original=blob).first()
+    if existing is not None:
+        return existing
+    staging = settings.UPLOAD_STAGING_ROOT
+    os.makedirs(staging, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix='.pdf', dir=staging)
+    os.close(fd)
+    try:
+        linearized = _run(pool, optimize_pdf, local, tmp, settings.PDF_QPDF_BINARY)
+        if os.path.getsize(tmp) >= blob.size and not linearized:
+            return None
+        optimized = store_file(tmp)
+    finally:
+        os.remove(tmp)
+    if optimized.pk == blob.pk:
+        return None
+    PDFBlob.objects.filter(pk=optimized.pk, original__isnull=True).update(
+        original=blob, linearized=linearized,
+    )
+    optimized.refresh_from_db()
+    return optimized
+
+
+def optimize_stored_pdf(pdf, pool=None):
+    """
+    Switch ``pdf`` to an optimised rewrite of its blob when that saves bytes.
+
+    The original blob stays in storage (``PDFBlob.original``) so it can be
+    restored with ``restore_original_pdf``.
+    """
+    if pdf.serve_original or pdf.blob is None or pdf.blob.original_id is not None:
+        return pdf
+    try:
+        local = get_pdf_cache().get_or_fill(pdf.pdf_path)
+        optimized = _optimized_blob(pdf.blob, local, pool)
+    except Exception:
+        logger.warning("Optimizing LessonPDF %s failed; keeping the original", pdf.pk, exc_info=True)
+        return pdf
+    if optimized is not None:
+        pdf.blob = optimized
+        pdf.pdf_path = optimized.path
+        pdf.save(update_fields=['blob', 'pdf_path', 'updated_at'])
+    return pdf
+
+
+def restore_original_pdf(pdf):
+    """Serve the original upload again instead of its optimised rewrite."""
+    pdf.serve_original = True
+    if pdf.blob is not None and pdf.blob.original_id is not None:
+        pdf.blob = pdf.blob.original
+        pdf.pdf_path = pdf.blob.path
+    pdf.save(update_fields=['blob', 'pdf_path', 'serve_original', 'updated_at'])
+    return pdf
+
+
+def process_pdf(pdf_id, force=False, pool=None):
+    """
+    Extract and store metadata for one LessonPDF, returning it (or None if
+    it was deleted meanwhile).
+
+    ``pool`` is an optional process pool to run the CPU-bound extraction in.
+    Failures are recorded on the row rather than raised.
+    """
+    pdf = LessonPDF.objects.select_related('blob').filter(pk=pdf_id).first()
+    if pdf is None or not pdf.pdf_path:
+        return pdf
+    key = content_key(pdf)
+    if not force and pdf.processing_status == 'done' and pdf.processed_key == key:
+        return pdf
+
+    rows = LessonPDF.objects.filter(pk=pdf.pk)
+    rows.update(processing_status='processing', updated_at=timezone.now())
+    if settings.PDF_OPTIMIZE_UPLOADS:
+        pdf = optimize_stored_pdf(pdf, pool)
+        key = content_key(pdf)
+    try:
+        local = get_pdf_cache().get_or_fill(pdf.pdf_path)
+        size = os.path.getsize(local)
+        result = _run(pool, extract_pdf, local, settings.PDF_THUMBNAIL_SIZE)
+        thumbnail_path = ''
+        if result['thumbnail']:
+            thumbnail_path = upload_stream(thumbnail_path_for(key), [result['thumbnail']], content_type='image/jpeg')
+    except Exception as exc:
+        logger.warning("Processing LessonPDF %s failed", pdf.pk, exc_info=True)
+        rows.update(processing_status='failed', processing_error=str(exc)[:1000], updated_at=timezone.now())
+        pdf.refresh_from_db()
+        return pdf
+
+    with transaction.atomic():
+        LessonPDFPage.objects.filter(pdf=pdf).delete()
+        LessonPDFPage.objects.bulk_create(
+            [LessonPDFPage(pdf=pdf, **page) for page in result['pages']],
+            batch_size=500,
+        )
+        rows.update(
+            page_count=result['page_count'],
+            file_size=size,
+            thumbnail_path=thumbnail_path,
+            processing_status='done',
+            processing_error='',
+            processed_key=key,
+            processed_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+    # The page manifest can now be rebuilt from the stored pages
+    cache.delete(f"pdf-manifest:{key}")
+    pdf.refresh_from_db()
+    index_pdf(pdf)
+    return pdf
+
+
+def process_pdf_in_thread(pdf_id, force=False, pool=None):
+    """``process_pdf`` for worker threads, closing the thread's DB connections afterwards."""
+    try:
+        return process_pdf(pdf_id, force=force, pool=pool)
+    finally:
+        connections.close_all()
+
+
+def queue_pdf_processing(pdf_id, force=False):
+    """Process ``pdf_id`` once the current transaction commits."""
+    if settings.PDF_PROCESSING_WORKERS == 0:
+        transaction.on_commit(lambda: process_pdf(pdf_id, force=force))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(process_pdf_in_thread, pdf_id, force))
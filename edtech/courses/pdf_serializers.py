@@ -1,16 +1,72 @@
+from django.db import models
 from rest_framework import serializers
 from .models import LessonPDF
-from .storage import signed_url
+from .storage import signed_url, signed_urls
+from .fieldsets import SparseFieldsetSerializerMixin
+from .watermark import server_watermarks_enabled
 
-class LessonPDFSerializer(serializers.ModelSerializer):
+# Lifetime of the storage links embedded in PDF payloads
+SIGNED_URL_TTL = 60
+
+
+class SignedURLListSerializer(serializers.ListSerializer):
+    """
+    List serializer that signs every PDF in the response up front.
+
+    The child serializer's ``collect_pdf_paths`` lists the paths it will need;
+    they are signed in batched storage calls and shared through the
+    ``signed_urls`` context entry, which ``LessonPDFSerializer`` reads from.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        paths = self.child.collect_pdf_paths(items)
+        if paths:
+            urls = self.context.setdefault('signed_urls', {})
+            missing = [path for path in paths if path not in urls]
+            if missing:
+                urls.update(signed_urls(missing, expires_sec=SIGNED_URL_TTL))
+        return super().to_representation(items)
+
+
+class LessonPDFSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     signed_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
     
     class Meta:
         model = LessonPDF
-        fields = ['id', 'title', 'pdf_path', 'signed_url', 'uploaded_at']
+        fields = [
+            'id', 'title', 'pdf_path', 'signed_url', 'uploaded_at',
+            'page_count', 'file_size', 'thumbnail_url', 'processing_status',
+        ]
+        list_serializer_class = SignedURLListSerializer
+        # Model columns behind computed fields, for sparse querysets
+        field_sources = {'signed_url': ['pdf_path'], 'thumbnail_url': ['thumbnail_path']}
+
+    def collect_pdf_paths(self, pdfs):
+        # Only sign what the response includes
+        paths = []
+        if 'thumbnail_url' in self.fields:
+            paths += [pdf.thumbnail_path for pdf in pdfs if pdf.thumbnail_path]
+        if 'signed_url' in self.fields and not server_watermarks_enabled():
+            paths += [pdf.pdf_path for pdf in pdfs if pdf.pdf_path]
+        return paths
     
     def get_signed_url(self, obj):
         """Generate signed URL for PDF access"""
-        if obj.pdf_path:
-            return signed_url(obj.pdf_path, expires_sec=60)
+        # With server-side watermarks the unstamped original is never linked;
+        # clients go through view_pdf instead
+        if obj.pdf_path and not server_watermarks_enabled():
+            presigned = self.context.get('signed_urls', {})
+            if obj.pdf_path in presigned:
+                return presigned[obj.pdf_path]
+            return signed_url(obj.pdf_path, expires_sec=SIGNED_URL_TTL)
         return None
+
+    def get_thumbnail_url(self, obj):
+        if not obj.thumbnail_path:
+            return None
+        presigned = self.context.get('signed_urls', {})
+        if obj.thumbnail_path in presigned:
+            return presigned[obj.thumbnail_path]
+        return signed_url(obj.thumbnail_path, expires_sec=SIGNED_URL_TTL)
@@ -0,0 +1,223 @@
+"""
+Pure PyPDF2 watermark stamping, kept free of Django imports so it can run
+inside worker processes of the watermark process pool.
+"""
+import io
+import math
+import os
+import re
+import shutil
+from functools import lru_cache
+
+from PyPDF2 import PageObject, PdfReader, PdfWriter
+from PyPDF2.generic import (
+    ArrayObject, DecodedStreamObject, DictionaryObject, FloatObject, IndirectObject, NameObject, NumberObject,
+)
+
+STARTXREF_RE = re.compile(rb'startxref\s+(\d+)')
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _pdf_string(text):
+    # The overlay uses a standard Type1 font with WinAnsiEncoding (cp1252)
+    raw = text.encode('cp1252', errors='replace')
+    return raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+# Resources of the overlay: a standard font and a translucent graphics state
+OVERLAY_RESOURCES = (
+    b"<< /Font << /WMF << /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >> >>"
+    b" /ExtGState << /WMG << /Type /ExtGState /ca 0.15 /CA 0.15 >> >> >>"
+)
+
+
+@lru_cache(maxsize=256)
+def overlay_content(text, width, height):
+    """Content stream drawing ``text`` over a ``width`` x ``height`` page, using OVERLAY_RESOURCES."""
+    label = _pdf_string(text)
+    size = max(12.0, min(width, height) / 16)
+    # Helvetica averages about half an em per glyph; centre the diagonal line
+    text_width = 0.5 * size * len(label)
+    angle = math.atan2(height, width)
+    cos, sin = math.cos(angle), math.sin(angle)
+    x = width / 2 - cos * text_width / 2 + sin * size / 3
+    y = height / 2 - sin * text_width / 2 - cos * size / 3
+    return (
+        b"q /WMG gs 0.35 g BT /WMF %.1f Tf %.4f %.4f %.4f %.4f %.1f %.1f Tm (%s) Tj ET Q\n"
+        b"q 0.45 g BT /WMF 7 Tf 1 0 0 1 18 12 Tm (%s) Tj ET Q\n"
+    ) % (size, cos, sin, -sin, cos, x, y, label, label)
+
+
+@lru_cache(maxsize=256)
+def render_overlay(text, width, height):
+    """Render a transparent one-page PDF carrying ``text``, returned as bytes."""
+    writer = PdfWriter()
+    page = PageObject.create_blank_page(width=width, height=height)
+    font = DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+        NameObject('/Encoding'): NameObject('/WinAnsiEncoding'),
+    })
+    alpha = DictionaryObject({
+        NameObject('/Type'): NameObject('/ExtGState'),
+        NameObject('/ca'): FloatObject(0.15),
+        NameObject('/CA'): FloatObject(0.15),
+    })
+    page[NameObject('/Resources')] = DictionaryObject({
+        NameObject('/Font'): DictionaryObject({NameObject('/WMF'): writer._add_object(font)}),
+        NameObject('/ExtGState'): DictionaryObject({NameObject('/WMG'): writer._add_object(alpha)}),
+    })
+    stream = DecodedStreamObject()
+    stream.set_data(overlay_content(text, width, height))
+    page[NameObject('/Contents')] = writer._add_object(stream)
+    writer.add_page(page)
+
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+@lru_cache(maxsize=256)
+def _overlay_page(text, width, height):
+    return PdfReader(io.BytesIO(render_overlay(text, width, height))).pages[0]
+
+
+def stamp_pages(src_path, dst_path, first, last, text):
+    """
+    Write pages ``first``..``last`` of ``src_path`` to ``dst_path`` with the
+    watermark merged onto each one. Returns the number of pages stamped.
+
+    Pages are read lazily from the source and the overlay for each distinct
+    page size is rendered once per process. The output is built in memory,
+    which suits page ranges; whole documents go through ``stamp_document``.
+    """
+    reader = PdfReader(src_path)
+    writer = PdfWriter()
+    for index in range(first - 1, last):
+        page = reader.pages[index]
+        box = page.mediabox
+        overlay = _overlay_page(text, round(float(box.width)), round(float(box.height)))
+        left, bottom = float(box.left), float(box.bottom)
+        if left or bottom:
+            page.merge_translated_page(overlay, left, bottom)
+        else:
+            page.merge_page(overlay)
+        writer.add_page(page)
+    with open(dst_path, 'wb') as fh:
+        writer.write(fh)
+    return last - first + 1
+
+
+def _stream(data, extra=b""):
+    return b"<< %s/Length %d >>\nstream\n%s\nendstream" % (extra, len(data), data)
+
+
+def _serialize(obj):
+    out = io.BytesIO()
+    obj.write_to_stream(out, None)
+    return out.getvalue()
+
+
+def _startxref(fh):
+    """Offset of the last cross-reference section, from the file's tail."""
+    fh.seek(0, os.SEEK_END)
+    fh.seek(max(0, fh.tell() - 2048))
+    tail = fh.read()
+    match = STARTXREF_RE.findall(tail)
+    if not match:
+        raise ValueError("startxref not found")
+    return int(match[-1])
+
+
+def _contents(page):
+    """The page's content stream references, as a list."""
+    contents = page.raw_get('/Contents') if '/Contents' in page else None
+    if contents is None:
+        return []
+    resolved = contents.get_object()
+    if isinstance(resolved, ArrayObject):
+        return list(resolved)
+    return [contents]
+
+
+def stamp_document(src_path, dst_path, text):
+    """
+    Write all of ``src_path`` to ``dst_path`` with the watermark on every
+    page, as an incremental update. Returns the number of pages stamped.
+
+    The original bytes are copied through in chunks, then each page's
+    dictionary is written again, one page at a time, drawing a shared
+    overlay form (one per page size) after its own content. Only the page
+    dictionaries are ever parsed: content streams, fonts and images stay
+    in the copied original, so memory doesn't grow with the document.
+    """
+    with open(src_path, 'rb') as src:
+        reader = PdfReader(src)
+        if reader.is_encrypted:
+            # New objects would have to be encrypted like the rest
+            return stamp_pages(src_path, dst_path, 1, len(reader.pages), text)
+        prev = _startxref(src)
+        trailer = reader.trailer
+        next_number = int(trailer['/Size'])
+        offsets = {}
+
+        with open(dst_path, 'wb') as out:
+            src.seek(0)
+            shutil.copyfileobj(src, out, COPY_CHUNK_SIZE)
+            out.write(b"\n")
+
+            def add_object(data, number=None, generation=0):
+                nonlocal next_number
+                if number is None:
+                    number, next_number = next_number, next_number + 1
+                offsets[number] = (out.tell(), generation)
+                out.write(b"%d %d obj\n%s\nendobj\n" % (number, generation, data))
+                return IndirectObject(number, generation, reader)
+
+            save = add_object(_stream(b"q"))
+            forms = {}
+            count = 0
+            for page in reader.pages:
+                box = page.mediabox
+                size = round(float(box.width)), round(float(box.height))
+                if size not in forms:
+                    forms[size] = add_object(_stream(
+                        overlay_content(text, *size),
+                        b"/Type /XObject /Subtype /Form /BBox [0 0 %d %d] /Resources %s " % (*size, OVERLAY_RESOURCES),
+                    ))
+
+                resources = page.get('/Resources')
+                resources = DictionaryObject(resources.get_object() if resources is not None else {})
+                xobjects = resources.get('/XObject')
+                xobjects = DictionaryObject(xobjects.get_object() if xobjects is not None else {})
+                name = '/WMStamp'
+                while name in xobjects:
+                    name += 'X'
+                xobjects[NameObject(name)] = forms[size]
+                resources[NameObject('/XObject')] = xobjects
+
+                draw = add_object(_stream(b"Q q 1 0 0 1 %.4f %.4f cm %s Do Q" % (
+                    float(box.left), float(box.bottom), name.encode())))
+                stamped = DictionaryObject(page)
+                stamped[NameObject('/Resources')] = resources
+                stamped[NameObject('/Contents')] = ArrayObject([save, *_contents(page), draw])
+                ref = page.indirect_ref
+                add_object(_serialize(stamped), ref.idnum, ref.generation)
+                count += 1
+
+            xref = out.tell()
+            # Object 0 heads the free list; readers expect a section to start with it
+            out.write(b"xref\n0 1\n0000000000 65535 f \n")
+            for number in sorted(offsets):
+                offset, generation = offsets[number]
+                out.write(b"%d 1\n%010d %05d n \n" % (number, offset, generation))
+            new_trailer = DictionaryObject({
+                NameObject('/Size'): NumberObject(next_number),
+                NameObject('/Prev'): NumberObject(prev),
+            })
+            for key in ('/Root', '/Info', '/ID'):
+                if key in trailer:
+                    new_trailer[NameObject(key)] = trailer.raw_get(key)
+            out.write(b"trailer\n%s\nstartxref\n%d\n%%%%EOF\n" % (_serialize(new_trailer), xref))
+    return count
@@ -0,0 +1,31 @@
+from rest_framework import exceptions, permissions
+
+from .enrollment import enrolled_course_ids
+from .models import Course, Lesson
+
+
+def course_id_of(obj):
+    """Course a Course, Lesson or LessonPDF belongs to."""
+    if isinstance(obj, Course):
+        return obj.pk
+    if isinstance(obj, Lesson):
+        return obj.course_id
+    return obj.lesson.course_id
+
+
+class IsEnrolled(permissions.BasePermission):
+    """
+    Object access for users enrolled in the object's course.
+
+    The check reads the enrolled course ids from courses.enrollment (through
+    the view's per-request copy when it has one), which are cached when the
+    cache is shared. Anonymous callers get a 403, not a login challenge.
+    """
+    message = "You are not enrolled in this course."
+
+    def has_object_permission(self, request, view, obj):
+        if not request.user.is_authenticated:
+            raise exceptions.PermissionDenied("Authentication required.")
+        get_enrolled = getattr(view, 'get_enrolled_course_ids', None)
+        enrolled = get_enrolled() if get_enrolled else enrolled_course_ids(request.user)
+        return course_id_of(obj) in enrolled
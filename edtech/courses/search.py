@@ -0,0 +1,245 @@
+"""
+Full-text search over courses, lessons and extracted PDF text.
+
+Every searchable object has a ``SearchEntry`` row, kept up to date by the
+receivers in courses.signals. Migration 0012 builds the index over those
+rows: a weighted ``tsvector`` column with a GIN index plus a trigram index
+on titles on PostgreSQL, or an FTS5 table on SQLite. Other databases fall
+back to ``icontains``.
+
+Migration 0016 indexes the rows that existed before the index did;
+``manage.py rebuild_search_index`` rebuilds it from scratch.
+"""
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+
+from .models import LessonPDFPage, SearchEntry
+
+# Private-use characters mark matches, so they survive HTML escaping of the
+# surrounding text and can't be forged by indexed content
+MARK_START, MARK_END = '\ue000', '\ue001'
+WORD_RE = re.compile(r'\w+')
+# Snippets come from the start of long PDF texts; ts_headline parses all it's given
+HEADLINE_CHARS = 20000
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    object_id: int
+    course_id: int
+    lesson_id: Optional[int]
+    title: str
+    rank: float
+    highlight: str = ''
+    snippet: str = ''
+
+
+def _mark(text):
+    return escape(text or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+# --- Keeping entries in sync ---
+
+def _index(kind, object_id, **fields):
+    SearchEntry.objects.update_or_create(kind=kind, object_id=object_id, defaults=fields)
+
+
+def index_course(course):
+    _index('course', course.pk, course_id=course.pk, title=course.title, body=course.description)
+
+
+def index_lesson(lesson):
+    _index('lesson', lesson.pk, course_id=lesson.course_id, lesson_id=lesson.pk, title=lesson.title, body='')
+    # Follow the lesson if it moved to another course
+    SearchEntry.objects.filter(kind='pdf', lesson=lesson).exclude(course_id=lesson.course_id).update(
+        course_id=lesson.course_id,
+    )
+
+
+def index_pdf(pdf):
+    text = '\n'.join(LessonPDFPage.objects.filter(pdf=pdf).values_list('text', flat=True))
+    _index(
+        'pdf', pdf.pk,
+        course_id=pdf.lesson.course_id, lesson_id=pdf.lesson_id, title=pdf.title,
+        # Caps the work per document (and PostgreSQL's 1MB tsvector limit)
+        body=text[:settings.SEARCH_MAX_BODY_CHARS],
+    )
+
+
+def unindex(kind, object_id):
+    SearchEntry.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+# --- Querying ---
+
+def _filters(kinds, pdf_course_ids):
+    """SQL conditions on ``e`` (the entry table) for the kinds and PDF visibility."""
+    clauses, params = [], []
+    if kinds:
+        clauses.append(f"e.kind IN ({', '.join(['%s'] * len(kinds))})")
+        params += list(kinds)
+    if pdf_course_ids is not None:
+        ids = [int(pk) for pk in pdf_course_ids]
+        visible = f"e.course_id IN ({', '.join(map(str, ids))})" if ids else "0 = 1"
+        clauses.append(f"(e.kind <> 'pdf' OR {visible})")
+    return ''.join(f" AND {clause}" for clause in clauses), params
+
+
+def _fts5_query(query):
+    """Quote each word so user input can't use FTS5 syntax; the last one matches as a prefix."""
+    words = WORD_RE.findall(query)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"' for word in words) + '*'
+
+
+def _sqlite_available():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'courses_searchentry_fts'")
+        return cursor.fetchone() is not None
+
+
+def _search_sqlite(query, where, params, offset, limit):
+    match = _fts5_query(query)
+    if match is None:
+        return 0, []
+    base = (
+        " FROM courses_searchentry_fts f JOIN courses_searchentry e ON e.id = f.rowid"
+        f" WHERE courses_searchentry_fts MATCH %s{where}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*)" + base, [match, *params])
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT e.kind, e.object_id, e.course_id, e.lesson_id, e.title,"
+            " bm25(courses_searchentry_fts, 10.0, 1.0) AS rank,"
+            " highlight(courses_searchentry_fts, 0, %s, %s),"
+            " snippet(courses_searchentry_fts, 1, %s, %s, '…', 16)"
+            + base + " ORDER BY rank LIMIT %s OFFSET %s",
+            [MARK_START, MARK_END, MARK_START, MARK_END, match, *params, limit, offset],
+        )
+        rows = cursor.fetchall()
+    # bm25() is lower-is-better; flip it so every backend ranks descending
+    return total, [
+        SearchHit(kind, object_id, course_id, lesson_id, title, -rank, _mark(highlight), _mark(snippet))
+        for kind, object_id, course_id, lesson_id, title, rank, highlight, snippet in rows
+    ]
+
+
+def _search_postgres(query, where, params, offset, limit):
+    headline = f"StartSel={MARK_START}, StopSel={MARK_END}"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "WITH q AS (SELECT websearch_to_tsquery('english', %s) AS tsq)"
+            " SELECT e.id, e.kind, e.object_id, e.course_id, e.lesson_id, e.title,"
+            " ts_rank_cd(e.search_vector, q.tsq) + similarity(e.title, %s) AS rank,"
+            " COUNT(*) OVER () AS total"
+            " FROM courses_searchentry e, q"
+            # GIN full-text match, or a trigram match on titles for typos and partial words
+            f" WHERE (e.search_vector @@ q.tsq OR e.title %% %s){where}"
+            " ORDER BY rank DESC, e.id LIMIT %s OFFSET %s",
+            [query, query, query, *params, limit, offset],
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return 0, []
+        # Headlines are costly, so only build them for the page being returned
+        cursor.execute(
+            "SELECT e.id, ts_headline('english', e.title, q.tsq, %s),"
+            " ts_headline('english', left(e.body, %s), q.tsq, %s)"
+            " FROM courses_searchentry e, (SELECT websearch_to_tsquery('english', %s) AS tsq) q"
+            " WHERE e.id = ANY(%s)",
+            [
+                headline + ', HighlightAll=true', HEADLINE_CHARS,
+                headline + ', MaxFragments=2, MaxWords=20, MinWords=5', query, [row[0] for row in rows],
+            ],
+        )
+        headlines = {pk: (title, body) for pk, title, body in cursor.fetchall()}
+    return rows[0][-1], [
+        SearchHit(kind, object_id, course_id, lesson_id, title, rank,
+                  _mark(headlines[pk][0]), _mark(headlines[pk][1]))
+        for pk, kind, object_id, course_id, lesson_id, title, rank, _ in rows
+    ]
+
+
+def _search_basic(query, kinds, pdf_course_ids, offset, limit):
+    entries = SearchEntry.objects.filter(Q(title__icontains=query) | Q(body__icontains=query))
+    if kinds:
+        entries = entries.filter(kind__in=kinds)
+    if pdf_course_ids is not None:
+        entries = entries.filter(~Q(kind='pdf') | Q(course_id__in=pdf_course_ids))
+    entries = entries.order_by('kind', 'id')
+    return entries.count(), [
+        SearchHit(e.kind, e.object_id, e.course_id, e.lesson_id, e.title, 0.0, escape(e.title))
+        for e in entries[offset:offset + limit]
+    ]
+
+
+def search(query, kinds=None, pdf_course_ids=None, offset=0, limit=20):
+    """
+    Return ``(total, hits)`` for ``query``, best match first.
+
+    ``kinds`` limits the entry kinds searched; ``pdf_course_ids``, when given,
+    limits PDF text matches to those courses.
+    """
+    query = query.strip()
+    if not query:
+        return 0, []
+    if connection.vendor == 'postgresql':
+        backend = _search_postgres
+    elif connection.vendor == 'sqlite' and _sqlite_available():
+        backend = _search_sqlite
+    else:
+        return _search_basic(query, kinds, pdf_course_ids, offset, limit)
+    where, params = _filters(kinds, pdf_course_ids)
+    return backend(query, where, params, offset, limit)
+
+
+def _like_pattern(query):
+    return '%' + re.sub(r'([\\%_])', r'\\\1', query) + '%'
+
+
+def matching_course_ids(query, kinds=('course', 'lesson')):
+    """
+    Ids of all courses whose own entry or lessons match ``query``.
+
+    Besides full-text matches, titles containing ``query`` anywhere match too,
+    as with the course list's old ``icontains`` filter: "gebra" still finds
+    "Linear Algebra". On PostgreSQL the title trigram index serves that ILIKE
+    and the GIN index the full-text match, so neither leg scans the table.
+    """
+    query = query.strip()
+    if not query:
+        return set()
+    kind_list = ', '.join(['%s'] * len(kinds))
+    if connection.vendor == 'postgresql':
+        sql = (
+            "SELECT DISTINCT e.course_id FROM courses_searchentry e"
+            f" WHERE e.kind IN ({kind_list})"
+            " AND (e.search_vector @@ websearch_to_tsquery('english', %s) OR e.title ILIKE %s)"
+        )
+        params = [*kinds, query, _like_pattern(query)]
+    elif connection.vendor == 'sqlite' and _sqlite_available():
+        match = _fts5_query(query)
+        sql = (
+            "SELECT DISTINCT e.course_id FROM courses_searchentry e"
+            f" WHERE e.kind IN ({kind_list}) AND (e.title LIKE %s ESCAPE '\\'"
+            + (" OR e.id IN (SELECT rowid FROM courses_searchentry_fts"
+               " WHERE courses_searchentry_fts MATCH %s))" if match else ")")
+        )
+        params = [*kinds, _like_pattern(query), *([match] if match else [])]
+    else:
+        return set(
+            SearchEntry.objects.filter(Q(title__icontains=query) | Q(body__icontains=query), kind__in=kinds)
+            .values_list('course_id', flat=True)
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {course_id for course_id, in cursor.fetchall()}
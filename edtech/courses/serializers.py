@@ -1,32 +1,58 @@
 from rest_framework import serializers
 from .models import Course, Lesson
-from .enrollment import Enrollment
+from .enrollment import enrolled_course_ids
+from .fieldsets import SparseFieldsetSerializerMixin
+from .pdf_serializers import LessonPDFSerializer, SignedURLListSerializer
 
-class CourseSerializer(serializers.ModelSerializer):
+
+class LessonSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Lesson
+        fields = ['id', 'title', 'created_at']
+
+
+class CourseSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     is_enrolled = serializers.SerializerMethodField()
+    lessons = LessonSummarySerializer(many=True, read_only=True)
     
     class Meta:
         model = Course
-        fields = ['id', 'title', 'is_enrolled']
+        fields = ['id', 'title', 'is_enrolled', 'lessons', 'enrollment_count', 'lesson_count', 'pdf_count']
+        # Only included when expanded (?expand=lessons) or asked for in ?fields=
+        expandable_fields = ['lessons', 'enrollment_count', 'lesson_count', 'pdf_count']
     
     def get_is_enrolled(self, obj):
         """Check if the current user is enrolled in this course"""
+        # Viewsets load the user's enrolled course ids once per request
+        enrolled = self.context.get('enrolled_course_ids')
+        if enrolled is not None:
+            return obj.id in enrolled
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Enrollment.objects.filter(user=request.user, course=obj).exists()
+        if request:
+            return obj.id in enrolled_course_ids(request.user)
         return False
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     course = CourseSerializer(read_only=True)
     pdfs = serializers.SerializerMethodField()
     
     class Meta:
         model = Lesson
         fields = ['id', 'course', 'title', 'pdfs', 'created_at']
+        list_serializer_class = SignedURLListSerializer
+
+    def collect_pdf_paths(self, lessons):
+        if 'pdfs' not in self.fields:
+            return []
+        return [
+            pdf.pdf_path
+            for lesson in lessons
+            for pdf in lesson.pdfs.all()
+            if pdf.pdf_path
+        ]
     
     def get_pdfs(self, obj):
         """Get PDFs for this lesson"""
-        from .pdf_serializers import LessonPDFSerializer
         pdfs = obj.pdfs.all()
-        serializer = LessonPDFSerializer(pdfs, many=True)
+        serializer = LessonPDFSerializer(pdfs, many=True, context=self.context)
         return serializer.data
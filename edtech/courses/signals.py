@@ -1,7 +1,255 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from .enrollment import Enrollment, bump_enrollment_version
+from .models import Course, Lesson, LessonPDF, PDFBlob, UploadSession
+from .pdf_processing import queue_pdf_processing
 from .profile import Profile, create_user_profile
+from .search import index_course, index_lesson, index_pdf, unindex
+from .uploads import discard_parts
+from . import catalog_cache, counters, suggest
 
 # The profile creation is already handled in profile.py
-# This file is kept for future signal implementations if needed
+
+
+# --- PDFBlob reference counting ---
+
+@receiver(pre_save, sender=LessonPDF)
+def remember_previous_blob(sender, instance, update_fields=None, **kwargs):
+    # Saves that don't touch the blob leave the reference where it was
+    instance._previous_blob_id = instance.blob_id if instance.pk else None
+    if instance.pk and (update_fields is None or 'blob' in update_fields):
+        instance._previous_blob_id = (
+            LessonPDF.objects.filter(pk=instance.pk).values_list('blob_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=LessonPDF)
+def count_blob_reference(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_blob_id', None)
+    if previous == instance.blob_id:
+        return
+    if previous:
+        PDFBlob.objects.filter(pk=previous, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    if instance.blob_id:
+        PDFBlob.objects.filter(pk=instance.blob_id).update(ref_count=F('ref_count') + 1)
+
+
+@receiver(post_delete, sender=LessonPDF)
+def release_blob_reference(sender, instance, **kwargs):
+    if instance.blob_id:
+        PDFBlob.objects.filter(pk=instance.blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+
+
+# --- Post-upload processing ---
+
+@receiver(post_save, sender=LessonPDF)
+def process_uploaded_pdf(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_blob_id', None)
+    if not instance.pdf_path or not (created or previous != instance.blob_id):
+        return
+    if previous and instance.blob and instance.blob.original_id == previous:
+        # Switched to an optimised rewrite by the pipeline, which processes it itself
+        return
+    queue_pdf_processing(instance.pk)
+
+
+# --- Search index ---
+
+@receiver(post_save, sender=Course)
+def index_saved_course(sender, instance, **kwargs):
+    index_course(instance)
+
+
+@receiver(post_save, sender=Lesson)
+def index_saved_lesson(sender, instance, **kwargs):
+    index_lesson(instance)
+
+
+@receiver(post_save, sender=LessonPDF)
+def index_saved_pdf(sender, instance, **kwargs):
+    # Text arrives later, when processing finishes (see pdf_processing)
+    index_pdf(instance)
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=LessonPDF)
+def unindex_deleted(sender, instance, **kwargs):
+    kind = {Course: 'course', Lesson: 'lesson', LessonPDF: 'pdf'}[sender]
+    unindex(kind, instance.pk)
+
+
+# --- Typeahead suggestions ---
+# Applied on commit so rolled-back changes never reach the in-memory index
+
+@receiver(post_save, sender=Course)
+def suggest_saved_course(sender, instance, **kwargs):
+    transaction.on_commit(lambda: suggest.title_changed('course', instance.pk, instance.pk, instance.title))
+
+
+@receiver(post_save, sender=Lesson)
+def suggest_saved_lesson(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: suggest.title_changed('lesson', instance.pk, instance.course_id, instance.title)
+    )
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Lesson)
+def suggest_deleted(sender, instance, **kwargs):
+    kind, pk = ('course' if sender is Course else 'lesson'), instance.pk
+    transaction.on_commit(lambda: suggest.title_removed(kind, pk))
+
+
+@receiver(post_save, sender=Enrollment)
+def suggest_enrollment_added(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: suggest.enrollment_changed(instance.course_id, 1))
+
+
+@receiver(post_delete, sender=Enrollment)
+def suggest_enrollment_removed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: suggest.enrollment_changed(instance.course_id, -1))
+
+
+# --- Course catalog response cache ---
+
+def _invalidate_catalog(course_id):
+    catalog_cache.invalidate_course(course_id)
+    # Again once committed: a rebuild in between may have cached the old
+    # rows under the new version
+    transaction.on_commit(lambda: catalog_cache.invalidate_course(course_id))
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_cached_course(sender, instance, **kwargs):
+    _invalidate_catalog(instance.pk)
+
+
+@receiver(post_save, sender=Lesson)
+@receiver(post_delete, sender=Lesson)
+def invalidate_cached_lesson_course(sender, instance, **kwargs):
+    # Lesson titles change what ?search= matches
+    _invalidate_catalog(instance.course_id)
+
+
+def _pdf_course_id(pdf):
+    if LessonPDF.lesson.is_cached(pdf):
+        return pdf.lesson.course_id
+    if not hasattr(pdf, '_course_id'):
+        pdf._course_id = Lesson.objects.filter(pk=pdf.lesson_id).values_list('course_id', flat=True).first()
+    return pdf._course_id
+
+
+@receiver(post_save, sender=LessonPDF)
+@receiver(post_delete, sender=LessonPDF)
+def invalidate_cached_pdf_course(sender, instance, **kwargs):
+    _invalidate_catalog(_pdf_course_id(instance))
+
+
+# --- Per-user enrollment version (cached enrolled course ids) ---
+
+@receiver(pre_save, sender=Enrollment)
+def remember_previous_enrollment(sender, instance, **kwargs):
+    # An edit (e.g. in the admin) can move an enrollment to another user or course
+    previous = Enrollment.objects.filter(pk=instance.pk).values_list('user_id', 'course_id').first() if instance.pk else None
+    instance._previous_user_id, instance._previous_course_id = previous or (None, None)
+
+
+def _bump_enrollment_versions(user_ids):
+    for user_id in user_ids:
+        bump_enrollment_version(user_id)
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def bump_user_enrollment_version(sender, instance, **kwargs):
+    user_ids = {instance.user_id, getattr(instance, '_previous_user_id', None)} - {None}
+    _bump_enrollment_versions(user_ids)
+    # Again once committed: a read in between may have cached the old ids
+    # under the new version
+    transaction.on_commit(lambda: _bump_enrollment_versions(user_ids))
+
+
+# --- Course counters (courses/counters.py) ---
+
+@receiver(pre_save, sender=Lesson)
+def remember_previous_lesson_course(sender, instance, **kwargs):
+    # Lessons can be moved to another course in the admin
+    instance._previous_course_id = (
+        Lesson.objects.filter(pk=instance.pk).values_list('course_id', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=Lesson)
+def count_saved_lesson(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_course_id', None)
+    if created:
+        counters.adjust(instance.course_id, 'lesson_count', 1)
+    elif previous is not None and previous != instance.course_id:
+        pdfs = instance.pdfs.count()
+        counters.adjust(previous, 'lesson_count', -1)
+        counters.adjust(previous, 'pdf_count', -pdfs)
+        counters.adjust(instance.course_id, 'lesson_count', 1)
+        counters.adjust(instance.course_id, 'pdf_count', pdfs)
+
+
+@receiver(post_delete, sender=Lesson)
+def count_deleted_lesson(sender, instance, **kwargs):
+    # Its PDFs were deleted (and counted) first
+    counters.adjust(instance.course_id, 'lesson_count', -1)
+
+
+@receiver(pre_save, sender=LessonPDF)
+def remember_previous_pdf_lesson(sender, instance, update_fields=None, **kwargs):
+    instance._previous_lesson_id = None
+    if instance.pk and (update_fields is None or 'lesson' in update_fields):
+        instance._previous_lesson_id = (
+            LessonPDF.objects.filter(pk=instance.pk).values_list('lesson_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=LessonPDF)
+def count_saved_pdf(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_lesson_id', None)
+    if created:
+        counters.adjust(_pdf_course_id(instance), 'pdf_count', 1)
+    elif previous is not None and previous != instance.lesson_id:
+        previous_course = Lesson.objects.filter(pk=previous).values_list('course_id', flat=True).first()
+        if previous_course != _pdf_course_id(instance):
+            counters.adjust(previous_course, 'pdf_count', -1)
+            counters.adjust(_pdf_course_id(instance), 'pdf_count', 1)
+
+
+@receiver(post_delete, sender=LessonPDF)
+def count_deleted_pdf(sender, instance, **kwargs):
+    counters.adjust(_pdf_course_id(instance), 'pdf_count', -1)
+
+
+@receiver(post_save, sender=Enrollment)
+def count_saved_enrollment(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_course_id', None)
+    if created:
+        counters.adjust(instance.course_id, 'enrollment_count', 1)
+    elif previous is not None and previous != instance.course_id:
+        counters.adjust(previous, 'enrollment_count', -1)
+        counters.adjust(instance.course_id, 'enrollment_count', 1)
+
+
+@receiver(post_delete, sender=Enrollment)
+def count_deleted_enrollment(sender, instance, **kwargs):
+    counters.adjust(instance.course_id, 'enrollment_count', -1)
+
+
+# --- Upload staging ---
+
+@receiver(post_delete, sender=UploadSession)
+def discard_deleted_upload_parts(sender, instance, **kwargs):
+    # Bound now: the deletion clears instance.pk before the commit
+    session_id = instance.pk
+    transaction.on_commit(lambda: discard_parts(session_id))
@@ -1,47 +1,224 @@
-import os, time
-from supabase import create_client
+import threading
+import time
+from collections import OrderedDict
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide storage backend configured by PDF_STORAGE_BACKEND."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = import_string(settings.PDF_STORAGE_BACKEND)()
+    return _backend
+
+
+@receiver(setting_changed)
+def _reset_backend(setting, **kwargs):
+    global _backend
+    if setting.startswith(('PDF_STORAGE', 'SUPABASE_')):
+        _backend = None
+        signed_url_cache.clear()
+
+
+class _Flight:
+    """An in-progress upstream signing call that concurrent callers wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SignedURLCache:
+    """
+    Thread-safe LRU cache of signed URLs keyed by (bucket, path, expiry).
+
+    A URL is handed out only while at least ``min_validity`` of its lifetime is
+    left, so callers always receive a link that stays usable for a while.
+    Concurrent misses for the same key share a single upstream call.
+    """
+
+    def __init__(self, max_entries=1024, min_validity=0.5, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.min_validity = min_validity
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (url, reuse_until)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _reuse_window(self, expires_sec):
+        # Stop serving an entry once less than min_validity of its lifetime remains
+        return expires_sec * (1 - self.min_validity)
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        url, reuse_until = entry
+        if self._clock() >= reuse_until:
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return url
+
+    def _store(self, key, url, issued_at):
+        expires_sec = key[2]
+        self._entries[key] = (url, issued_at + self._reuse_window(expires_sec))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """Return a cached URL for ``key`` or None, counting the hit or miss."""
+        with self._lock:
+            url = self._lookup(key)
+            if url is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return url
+
+    def now(self):
+        """The cache's clock; take it before signing and pass it on as ``issued_at``."""
+        return self._clock()
+
+    def put(self, key, url, issued_at=None):
+        with self._lock:
+            self._store(key, url, self._clock() if issued_at is None else issued_at)
+
+    def put_many(self, items, issued_at=None):
+        """Store ``{key: url}`` pairs signed at the same moment."""
+        with self._lock:
+            issued_at = self._clock() if issued_at is None else issued_at
+            for key, url in items.items():
+                self._store(key, url, issued_at)
+
+    def get_or_sign(self, key, sign):
+        """Return a cached URL for ``key``, calling ``sign()`` at most once per miss."""
+        with self._lock:
+            url = self._lookup(key)
+            if url is not None:
+                self.hits += 1
+                return url
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        issued_at = self._clock()
+        try:
+            flight.result = sign()
+        except Exception as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None and flight.result:
+                    self._store(key, flight.result, issued_at)
+                del self._flights[key]
+            flight.event.set()
+        return flight.result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+            }
+
+
+signed_url_cache = SignedURLCache(
+    max_entries=getattr(settings, 'SIGNED_URL_CACHE_SIZE', 1024),
+    min_validity=getattr(settings, 'SIGNED_URL_CACHE_MIN_VALIDITY', 0.5),
+)
 
-_client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE)
 
 def upload_bytes(path_in_bucket: str, data: bytes, bucket: str = None):
     bucket = bucket or settings.SUPABASE_BUCKET
     # overwrite if exists
-    _client.storage.from_(bucket).upload(path_in_bucket, data, {"upsert": True})
+    get_backend().upload(bucket, path_in_bucket, [data])
+    return path_in_bucket
+
+def upload_stream(path_in_bucket: str, chunks, bucket: str = None, content_type: str = "application/pdf"):
+    """Upload an iterable of byte chunks without holding the whole file in memory."""
+    bucket = bucket or settings.SUPABASE_BUCKET
+    get_backend().upload(bucket, path_in_bucket, chunks, content_type=content_type)
     return path_in_bucket
 
+def upload_file(path_in_bucket: str, uploaded_file, bucket: str = None):
+    """Stream a Django ``UploadedFile`` to storage chunk by chunk."""
+    chunk_size = getattr(settings, 'UPLOAD_CHUNK_SIZE', 64 * 1024)
+    return upload_stream(path_in_bucket, uploaded_file.chunks(chunk_size), bucket=bucket)
+
+def download(path_in_bucket: str, bucket: str = None):
+    """Iterate over the stored object's bytes in chunks."""
+    bucket = bucket or settings.SUPABASE_BUCKET
+    return get_backend().download(bucket, path_in_bucket, chunk_size=getattr(settings, 'UPLOAD_CHUNK_SIZE', 64 * 1024))
+
+def delete(paths, bucket: str = None):
+    bucket = bucket or settings.SUPABASE_BUCKET
+    get_backend().delete(bucket, list(paths))
+
+def exists(path_in_bucket: str, bucket: str = None) -> bool:
+    bucket = bucket or settings.SUPABASE_BUCKET
+    return get_backend().exists(bucket, path_in_bucket)
+
 def signed_url(path_in_bucket: str, expires_sec: int = 60, bucket: str = None) -> str:
     bucket = bucket or settings.SUPABASE_BUCKET
-    res = _client.storage.from_(bucket).create_signed_url(path_in_bucket, expires_sec)
-    return res.get("signedURL") or res.get("signed_url")
+    return signed_url_cache.get_or_sign(
+        (bucket, path_in_bucket, expires_sec),
+        lambda: get_backend().sign(bucket, path_in_bucket, expires_sec),
+    )
 
-def generate_secure_pdf_url(path_in_bucket: str, user_id: int, expires_sec: int = 300, bucket: str = None) -> str:
+def signed_urls(paths, expires_sec: int = 60, bucket: str = None) -> dict:
     """
-    Generate a secure PDF URL with user-specific validation
+    Sign many paths at once, returning {path: url}.
+
+    Cached URLs are reused; the rest are signed with one backend sign_many
+    call per SIGNED_URL_BATCH_SIZE paths. Paths that fail to sign are omitted.
     """
     bucket = bucket or settings.SUPABASE_BUCKET
-    # Create signed URL with longer expiration for better UX
-    res = _client.storage.from_(bucket).create_signed_url(path_in_bucket, expires_sec)
-    signed_url = res.get("signedURL") or res.get("signed_url")
-    
-    # Add user-specific token for validation
-    import hashlib
-    import json
-    from datetime import datetime
-    
-    # Create a validation token
-    validation_data = {
-        'user_id': user_id,
-        'path': path_in_bucket,
-        'timestamp': datetime.utcnow().isoformat(),
-        'expires': expires_sec
-    }
-    token = hashlib.sha256(json.dumps(validation_data, sort_keys=True).encode()).hexdigest()[:16]
-    
-    # Append validation token to URL (this would need server-side validation)
-    if '?' in signed_url:
-        signed_url += f"&validation_token={token}"
-    else:
-        signed_url += f"?validation_token={token}"
-    
-    return signed_url
+    urls = {}
+    missing = []
+    for path in dict.fromkeys(p for p in paths if p):
+        url = signed_url_cache.get((bucket, path, expires_sec))
+        if url is None:
+            missing.append(path)
+        else:
+            urls[path] = url
+
+    batch_size = getattr(settings, 'SIGNED_URL_BATCH_SIZE', 100)
+    for start in range(0, len(missing), batch_size):
+        batch = missing[start:start + batch_size]
+        issued_at = signed_url_cache.now()
+        signed = get_backend().sign_many(bucket, batch, expires_sec)
+        signed_url_cache.put_many({(bucket, path, expires_sec): url for path, url in signed.items()}, issued_at)
+        urls.update(signed)
+    return urls
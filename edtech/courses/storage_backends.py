@@ -0,0 +1,223 @@
+import os
+import shutil
+import threading
+import time
+import urllib.parse
+
+import httpx
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+
+class StorageError(Exception):
+    """Raised when a storage backend operation fails."""
+
+
+class NotFound(StorageError):
+    """Raised when the requested object does not exist."""
+
+
+class StorageBackend:
+    """
+    Interface every PDF storage backend implements.
+
+    ``upload`` takes an iterable of byte chunks and ``download`` returns one,
+    so neither side ever needs the whole file in memory.
+    """
+
+    def upload(self, bucket, path, chunks, content_type='application/pdf'):
+        raise NotImplementedError
+
+    def sign(self, bucket, path, expires_sec):
+        raise NotImplementedError
+
+    def sign_many(self, bucket, paths, expires_sec):
+        """Return {path: url} for every path that could be signed."""
+        urls = {}
+        for path in paths:
+            try:
+                urls[path] = self.sign(bucket, path, expires_sec)
+            except NotFound:
+                pass
+        return urls
+
+    def download(self, bucket, path, chunk_size=64 * 1024):
+        raise NotImplementedError
+
+    def delete(self, bucket, paths):
+        raise NotImplementedError
+
+    def exists(self, bucket, path):
+        raise NotImplementedError
+
+
+class SupabaseStorageBackend(StorageBackend):
+    """
+    Talks to the Supabase Storage REST API over one shared, pooled httpx client.
+
+    Connections are kept alive between requests; pool size and timeouts come
+    from the SUPABASE_HTTP_* settings.
+    """
+
+    def __init__(self, url=None, key=None, pool_size=None, timeout=None,
+                 connect_timeout=None, keepalive_expiry=None):
+        self.url = (url or settings.SUPABASE_URL or '').rstrip('/')
+        self.key = key or settings.SUPABASE_SERVICE_ROLE
+        if not self.url or not self.key:
+            raise StorageError("SUPABASE_URL and SUPABASE_SERVICE_ROLE are required for Supabase storage.")
+        self.pool_size = pool_size or settings.SUPABASE_HTTP_POOL_SIZE
+        self.timeout = timeout or settings.SUPABASE_HTTP_TIMEOUT
+        self.connect_timeout = connect_timeout or settings.SUPABASE_HTTP_CONNECT_TIMEOUT
+        self.keepalive_expiry = keepalive_expiry or settings.SUPABASE_HTTP_KEEPALIVE_EXPIRY
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Created lazily so each forked worker process gets its own pool
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        base_url=f"{self.url}/storage/v1/",
+                        headers={'apikey': self.key, 'Authorization': f"Bearer {self.key}"},
+                        limits=httpx.Limits(
+                            max_connections=self.pool_size,
+                            max_keepalive_connections=self.pool_size,
+                            keepalive_expiry=self.keepalive_expiry,
+                        ),
+                        timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                    )
+        return self._client
+
+    @staticmethod
+    def _object_url(bucket, path):
+        return f"object/{bucket}/{urllib.parse.quote(path)}"
+
+    def _absolute(self, signed_path):
+        return f"{self.url}/storage/v1{signed_path}"
+
+    @staticmethod
+    def _check(response):
+        if response.status_code == 404 or (
+            response.status_code == 400 and 'not found' in response.text.lower()
+        ):
+            raise NotFound(response.text)
+        if response.is_error:
+            raise StorageError(f"Supabase storage returned {response.status_code}: {response.text}")
+        return response
+
+    def upload(self, bucket, path, chunks, content_type='application/pdf'):
+        response = self.client.post(
+            self._object_url(bucket, path),
+            content=(chunk for chunk in chunks),
+            headers={'content-type': content_type, 'x-upsert': 'true'},
+        )
+        self._check(response)
+        return path
+
+    def sign(self, bucket, path, expires_sec):
+        response = self._check(self.client.post(
+            f"object/sign/{bucket}/{urllib.parse.quote(path)}",
+            json={'expiresIn': expires_sec},
+        ))
+        return self._absolute(response.json()['signedURL'])
+
+    def sign_many(self, bucket, paths, expires_sec):
+        response = self._check(self.client.post(
+            f"object/sign/{bucket}",
+            json={'expiresIn': expires_sec, 'paths': list(paths)},
+        ))
+        return {
+            item['path']: self._absolute(item['signedURL'])
+            for item in response.json()
+            if not item.get('error') and item.get('signedURL')
+        }
+
+    def download(self, bucket, path, chunk_size=64 * 1024):
+        with self.client.stream('GET', self._object_url(bucket, path)) as response:
+            if response.is_error:
+                response.read()
+                self._check(response)
+            yield from response.iter_bytes(chunk_size)
+
+    def delete(self, bucket, paths):
+        self._check(self.client.request('DELETE', f"object/{bucket}", json={'prefixes': list(paths)}))
+
+    def exists(self, bucket, path):
+        response = self.client.head(self._object_url(bucket, path))
+        if response.status_code in (400, 404):
+            return False
+        self._check(response)
+        return True
+
+
+class LocalFileSystemStorageBackend(StorageBackend):
+    """
+    Stores objects under PDF_STORAGE_ROOT/<bucket>/<path>.
+
+    Meant for tests, load tests and air-gapped deployments. Signed URLs point
+    at the ``local-storage`` view and carry a timestamped signature.
+    """
+    salt = 'courses.storage.local'
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or settings.PDF_STORAGE_ROOT)
+
+    def _full_path(self, bucket, path):
+        full = os.path.abspath(os.path.join(self.root, bucket, path))
+        if not full.startswith(os.path.join(self.root, bucket) + os.sep):
+            raise StorageError(f"Invalid storage path: {path}")
+        return full
+
+    def upload(self, bucket, path, chunks, content_type='application/pdf'):
+        full = self._full_path(bucket, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        tmp = f"{full}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as fh:
+            for chunk in chunks:
+                fh.write(chunk)
+        os.replace(tmp, full)
+        return path
+
+    def sign(self, bucket, path, expires_sec):
+        if not self.exists(bucket, path):
+            raise NotFound(path)
+        token = signing.dumps({'b': bucket, 'p': path, 'x': int(time.time()) + expires_sec}, salt=self.salt)
+        return f"{reverse('local-storage')}?token={token}"
+
+    def verify(self, token):
+        """Return (bucket, path) for a valid, unexpired token, or raise StorageError."""
+        try:
+            data = signing.loads(token, salt=self.salt)
+            if data['x'] < time.time():
+                raise StorageError("Storage token has expired.")
+            return data['b'], data['p']
+        except (signing.BadSignature, KeyError, TypeError) as exc:
+            raise StorageError("Invalid storage token.") from exc
+
+    def open(self, bucket, path):
+        try:
+            return open(self._full_path(bucket, path), 'rb')
+        except FileNotFoundError as exc:
+            raise NotFound(path) from exc
+
+    def download(self, bucket, path, chunk_size=64 * 1024):
+        with self.open(bucket, path) as fh:
+            while True:
+                chunk = fh.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def delete(self, bucket, paths):
+        for path in paths:
+            full = self._full_path(bucket, path)
+            if os.path.isdir(full):
+                shutil.rmtree(full, ignore_errors=True)
+            elif os.path.exists(full):
+                os.remove(full)
+
+    def exists(self, bucket, path):
+        return os.path.isfile(self._full_path(bucket, path))
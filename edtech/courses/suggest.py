@@ -0,0 +1,227 @@
+"""
+In-process typeahead over course and lesson titles.
+
+Titles are normalised (case-folded, accents stripped, whitespace collapsed)
+and every word-start suffix goes into one sorted list, so a prefix lookup is
+a ``bisect`` plus a short scan and matches any word of a title. Results are
+ranked by the course's enrollment count (``Course.enrollment_count``), which
+is also held in memory.
+
+The index is built on first use and kept current by the receivers in
+courses.signals. Title changes bump a generation number in the Django cache
+so other processes notice and rebuild in the background; enrollment counts
+are refreshed by the periodic rebuild after ``SUGGEST_MAX_AGE`` seconds.
+"""
+import heapq
+import logging
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .models import Course, Lesson
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'suggest:generation'
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.casefold().split())
+
+
+def _suffixes(title):
+    """``title`` starting from each of its words."""
+    words = normalize(title).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class SuggestionIndex:
+    """
+    Sorted array of ``(suffix, kind, id)`` keys over course and lesson titles.
+
+    Reads don't take the lock: they scan a slice copy of the list, so a
+    concurrent update at worst makes them miss or repeat one match.
+    """
+
+    def __init__(self, scan_limit=2000):
+        self.scan_limit = scan_limit
+        self._keys = []
+        self._entries = {}  # (kind, id) -> (course_id, title)
+        self._popularity = Counter()  # course_id -> enrollments
+        self._lock = threading.Lock()
+        self.generation = None
+        self.built_at = time.monotonic()
+        self.checked_at = self.built_at
+
+    @classmethod
+    def build(cls, scan_limit=2000):
+        index = cls(scan_limit)
+        index.generation = cache.get_or_set(GENERATION_KEY, 0, None)
+        keys = []
+        for pk, title, enrollments in Course.objects.values_list('id', 'title', 'enrollment_count').iterator():
+            index._entries[('course', pk)] = (pk, title)
+            index._popularity[pk] = enrollments
+            keys += [(suffix, 'course', pk) for suffix in _suffixes(title)]
+        for pk, course_id, title in Lesson.objects.values_list('id', 'course_id', 'title').iterator():
+            index._entries[('lesson', pk)] = (course_id, title)
+            keys += [(suffix, 'lesson', pk) for suffix in _suffixes(title)]
+        keys.sort()
+        index._keys = keys
+        return index
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --- Updates ---
+
+    def _remove_keys(self, kind, pk, title):
+        for suffix in _suffixes(title):
+            key = (suffix, kind, pk)
+            i = bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+
+    def put(self, kind, pk, course_id, title):
+        """Add or update an entry; returns False when nothing changed."""
+        with self._lock:
+            old = self._entries.get((kind, pk))
+            if old == (course_id, title):
+                return False
+            if old is not None and old[1] != title:
+                self._remove_keys(kind, pk, old[1])
+            if old is None or old[1] != title:
+                for suffix in _suffixes(title):
+                    insort(self._keys, (suffix, kind, pk))
+            self._entries[(kind, pk)] = (course_id, title)
+            return True
+
+    def remove(self, kind, pk):
+        with self._lock:
+            old = self._entries.pop((kind, pk), None)
+            if old is None:
+                return False
+            self._remove_keys(kind, pk, old[1])
+            if kind == 'course':
+                self._popularity.pop(pk, None)
+            return True
+
+    def add_enrollments(self, course_id, delta):
+        with self._lock:
+            if ('course', course_id) in self._entries:
+                self._popularity[course_id] = max(0, self._popularity[course_id] + delta)
+
+    # --- Lookup ---
+
+    def suggest(self, query, limit=10):
+        """Up to ``limit`` entries whose title has a word starting with ``query``, most popular first."""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        start = bisect_left(self._keys, (prefix,))
+        matches = set()
+        for suffix, kind, pk in self._keys[start:start + self.scan_limit]:
+            if not suffix.startswith(prefix):
+                break
+            matches.add((kind, pk))
+
+        def rank(match):
+            kind, pk = match
+            course_id, title = self._entries.get(match, (None, ''))
+            # Courses before their lessons, then shorter (closer) titles
+            return (-self._popularity.get(course_id, 0), kind != 'course', len(title), title, pk)
+
+        results = []
+        for kind, pk in heapq.nsmallest(limit, matches, key=rank):
+            entry = self._entries.get((kind, pk))
+            if entry is not None:
+                results.append({'type': kind, 'id': pk, 'course_id': entry[0], 'title': entry[1]})
+        return results
+
+
+# --- Process-wide index ---
+
+def _rebuild_in_thread():
+    global _index
+    try:
+        index = SuggestionIndex.build(settings.SUGGEST_SCAN_LIMIT)
+        with _index_lock:
+            _index = index
+    except Exception:
+        logger.warning("Rebuilding the suggestion index failed", exc_info=True)
+    finally:
+        connections.close_all()
+
+
+def _check_freshness(index):
+    """Rebuild in the background when another process changed titles, or the index is old."""
+    now = time.monotonic()
+    if now - index.checked_at < settings.SUGGEST_SYNC_INTERVAL:
+        return
+    index.checked_at = now
+    stale = cache.get(GENERATION_KEY, 0) != index.generation
+    if stale or now - index.built_at > settings.SUGGEST_MAX_AGE:
+        # Keep serving the current index meanwhile; the next check is a full interval away
+        threading.Thread(target=_rebuild_in_thread, name='suggest-rebuild', daemon=True).start()
+
+
+def get_suggestion_index():
+    """Return the process-wide index, building it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SuggestionIndex.build(settings.SUGGEST_SCAN_LIMIT)
+                return _index
+    _check_freshness(_index)
+    return _index
+
+
+def reset_suggestion_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def suggest(query, limit=10):
+    return get_suggestion_index().suggest(query, limit)
+
+
+def _bump_generation(index=None):
+    """Tell other processes their index is stale; ``index`` is ours, if built, and already updated."""
+    try:
+        generation = cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 1, None)
+        generation = cache.get(GENERATION_KEY)
+    if index is not None and generation == (index.generation or 0) + 1:
+        # Only our own change happened since the last sync, so we're current
+        index.generation = generation
+
+
+def title_changed(kind, pk, course_id, title):
+    """Record a saved course or lesson, in our index if this process has built it."""
+    index = _index
+    if index is None or index.put(kind, pk, course_id, title):
+        _bump_generation(index)
+
+
+def title_removed(kind, pk):
+    index = _index
+    if index is None or index.remove(kind, pk):
+        _bump_generation(index)
+
+
+def enrollment_changed(course_id, delta):
+    if _index is not None:
+        _index.add_enrollments(course_id, delta)
@@ -1,3 +1,1827 @@
-from django.test import TestCase
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.cache import cache as django_cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from PyPDF2 import PdfReader, PdfWriter
+from rest_framework.test import APIClient
+
+from . import catalog_cache, storage, suggest
+from .bulk_enroll import bulk_enroll
+from .enrollment import Enrollment, enrollment_version
+from .blobs import store_chunks
+from .models import Course, Lesson, LessonPDF, PDFBlob, SearchEntry, UploadSession
+from .pdf_processing import process_pdf, restore_original_pdf
+from .pdf_cache import PDFDiskCache, get_pdf_cache
+from .pdf_pages import extract_pages, page_manifest
+from .pdf_stamping import render_overlay, stamp_document
+from .pdf_tokens import InvalidToken, issue_pdf_token, verify_pdf_token
+from .pdf_serializers import LessonPDFSerializer
+from .serializers import LessonSerializer
+from .storage import SignedURLCache, signed_url_cache
+from .storage_backends import StorageError, SupabaseStorageBackend
+from .suggest import SuggestionIndex, reset_suggestion_index
+from .watermark import run_stamp
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class SignedURLCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = SignedURLCache(max_entries=2, min_validity=0.5, clock=self.clock)
+        self.calls = 0
+
+    def sign(self, url='https://storage/a?token=1'):
+        def _sign():
+            self.calls += 1
+            return url
+        return _sign
+
+    def test_reuses_url_while_enough_validity_left(self):
+        key = ('courses', '1/a.pdf', 60)
+        self.cache.get_or_sign(key, self.sign())
+        self.clock.now += 29
+        self.cache.get_or_sign(key, self.sign())
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_resigns_before_expiry(self):
+        key = ('courses', '1/a.pdf', 60)
+        self.cache.get_or_sign(key, self.sign())
+        self.clock.now += 30
+        self.cache.get_or_sign(key, self.sign())
+        self.assertEqual(self.calls, 2)
+
+    def test_expiry_is_part_of_the_key(self):
+        self.cache.get_or_sign(('courses', '1/a.pdf', 60), self.sign())
+        self.cache.get_or_sign(('courses', '1/a.pdf', 300), self.sign())
+        self.assertEqual(self.calls, 2)
+
+    def test_lru_eviction(self):
+        a, b, c = (('courses', name, 60) for name in ('a', 'b', 'c'))
+        self.cache.get_or_sign(a, self.sign())
+        self.cache.get_or_sign(b, self.sign())
+        self.cache.get_or_sign(a, self.sign())  # a is now most recently used
+        self.cache.get_or_sign(c, self.sign())  # evicts b
+        self.assertIsNotNone(self.cache.get(a))
+        self.assertIsNone(self.cache.get(b))
+        self.assertEqual(self.cache.stats()['size'], 2)
+
+    def test_concurrent_misses_share_one_upstream_call(self):
+        release = threading.Event()
+
+        def slow_sign():
+            release.wait(5)
+            self.calls += 1
+            return 'https://storage/slow'
+
+        key = ('courses', 'slow.pdf', 60)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.cache.get_or_sign(key, slow_sign)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['https://storage/slow'] * 8)
+
+    def test_failed_sign_is_not_cached(self):
+        key = ('courses', 'bad.pdf', 60)
+
+        def boom():
+            raise RuntimeError('upstream down')
+
+        with self.assertRaises(RuntimeError):
+            self.cache.get_or_sign(key, boom)
+        self.assertEqual(self.cache.get_or_sign(key, self.sign()), 'https://storage/a?token=1')
+
+    def test_put_many_uses_the_issue_time(self):
+        a, b = (('courses', name, 60) for name in ('a', 'b'))
+        issued_at = self.cache.now()
+        self.clock.now += 20
+        self.cache.put_many({a: 'https://storage/a', b: 'https://storage/b'}, issued_at)
+        self.assertEqual(self.cache.get(b), 'https://storage/b')
+        # Reusable for 30s from signing, not from storing
+        self.clock.now += 10
+        self.assertIsNone(self.cache.get(a))
+
+
+class TempStorageMixin:
+    """Point the storage layer at a throwaway local filesystem backend."""
+
+    def setUp(self):
+        super().setUp()
+        self.storage_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.storage_root, ignore_errors=True)
+        override = override_settings(
+            PDF_STORAGE_BACKEND='courses.storage_backends.LocalFileSystemStorageBackend',
+            PDF_STORAGE_ROOT=self.storage_root,
+            SECURE_SSL_REDIRECT=False,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def store(self, path, data=b'%PDF-1.4 test'):
+        storage.upload_bytes(path, data)
+        return path
+
+
+class BatchSignedURLTests(TempStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        course = Course.objects.create(title='Algebra')
+        for n in range(3):
+            lesson = Lesson.objects.create(course=course, title=f'Lesson {n}')
+            for m in range(4):
+                path = self.store(f'{course.id}/{n}-{m}.pdf')
+                LessonPDF.objects.create(lesson=lesson, title=f'PDF {m}', pdf_path=path)
+
+    def spy(self, name):
+        backend = storage.get_backend()
+        return mock.patch.object(backend, name, wraps=getattr(backend, name))
+
+    def test_lesson_list_signs_all_pdfs_in_one_call(self):
+        with self.spy('sign_many') as sign_many:
+            data = LessonSerializer(Lesson.objects.prefetch_related('pdfs'), many=True).data
+        self.assertEqual(sign_many.call_count, 1)
+        self.assertEqual(len(sign_many.call_args[0][1]), 12)
+        for lesson in data:
+            for pdf in lesson['pdfs']:
+                self.assertTrue(pdf['signed_url'].startswith('/api/storage/?token='))
+
+    @override_settings(SIGNED_URL_BATCH_SIZE=5)
+    def test_batches_are_bounded_and_cached(self):
+        with self.spy('sign_many') as sign_many:
+            LessonPDFSerializer(LessonPDF.objects.all(), many=True).data
+            LessonPDFSerializer(LessonPDF.objects.all(), many=True).data
+        self.assertEqual(sign_many.call_count, 3)
+
+
+class LocalStorageBackendTests(TempStorageMixin, TestCase):
+    def test_roundtrip(self):
+        storage.upload_stream('1/notes.pdf', iter([b'%PDF-', b'1.4 body']))
+        self.assertTrue(storage.exists('1/notes.pdf'))
+        self.assertEqual(b''.join(storage.download('1/notes.pdf')), b'%PDF-1.4 body')
+        storage.delete(['1/notes.pdf'])
+        self.assertFalse(storage.exists('1/notes.pdf'))
+
+    def test_signed_url_is_served_by_local_view(self):
+        self.store('1/notes.pdf', b'%PDF-1.4 body')
+        url = storage.signed_url('1/notes.pdf')
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), b'%PDF-1.4 body')
+        self.assertEqual(self.client.get(url + 'x').status_code, 404)
+
+    def test_rejects_paths_outside_root(self):
+        with self.assertRaises(StorageError):
+            storage.upload_bytes('../escape.pdf', b'x')
+
+
+class SupabaseStorageBackendTests(SimpleTestCase):
+    def test_sign_many_builds_absolute_urls(self):
+        def handler(request):
+            self.assertEqual(request.url.path, '/storage/v1/object/sign/courses')
+            self.assertEqual(request.headers['apikey'], 'key')
+            return httpx.Response(200, json=[
+                {'path': 'a.pdf', 'signedURL': '/object/sign/courses/a.pdf?token=t', 'error': None},
+                {'path': 'b.pdf', 'signedURL': None, 'error': 'Either the object does not exist'},
+            ])
+
+        backend = SupabaseStorageBackend(url='https://x.supabase.co', key='key', pool_size=2)
+        backend._client = httpx.Client(
+            base_url='https://x.supabase.co/storage/v1/',
+            headers={'apikey': 'key'},
+            transport=httpx.MockTransport(handler),
+        )
+        self.assertEqual(
+            backend.sign_many('courses', ['a.pdf', 'b.pdf'], 60),
+            {'a.pdf': 'https://x.supabase.co/storage/v1/object/sign/courses/a.pdf?token=t'},
+        )
+
+
+class ResumableUploadTests(TempStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.staging = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.staging, ignore_errors=True)
+        override = override_settings(UPLOAD_STAGING_ROOT=self.staging, UPLOAD_CHUNK_SIZE=1024)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        course = Course.objects.create(title='Physics')
+        self.lesson = Lesson.objects.create(course=course, title='Optics')
+        self.data = bytes(range(256)) * 1000  # 256000 bytes
+
+    def put_part(self, upload_id, number, body, sha=None):
+        return self.client.put(
+            f'/api/uploads/{upload_id}/parts/{number}/', body,
+            content_type='application/octet-stream',
+            HTTP_X_PART_SHA256=sha or hashlib.sha256(body).hexdigest(),
+        )
+
+    def test_init_parts_complete(self):
+        res = self.client.post('/api/uploads/', {
+            'lesson_id': self.lesson.id, 'title': 'Optics notes',
+            'total_size': len(self.data), 'part_size': 100000,
+        }, format='json')
+        self.assertEqual(res.status_code, 201)
+        upload_id = res.data['id']
+        self.assertEqual(res.data['part_count'], 3)
+
+        parts = [self.data[i:i + 100000] for i in range(0, len(self.data), 100000)]
+        self.assertEqual(self.put_part(upload_id, 1, parts[0], sha='0' * 64).status_code, 400)
+        for number, body in enumerate(parts, start=1):
+            self.assertEqual(self.put_part(upload_id, number, body).status_code, 200)
+        # Re-sending a part after a dropped connection is harmless
+        self.assertEqual(self.put_part(upload_id, 2, parts[1]).status_code, 200)
+        self.assertEqual(len(self.client.get(f'/api/uploads/{upload_id}/').data['received_parts']), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(res.status_code, 200)
+        # Completing again returns the same PDF rather than a second one
+        again = self.client.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(again.data['pdf_id'], res.data['pdf_id'])
+        self.assertEqual(LessonPDF.objects.filter(lesson=self.lesson).count(), 1)
+        pdf = LessonPDF.objects.get(id=res.data['pdf_id'])
+        self.assertEqual(pdf.blob.sha256, hashlib.sha256(self.data).hexdigest())
+        self.assertEqual(b''.join(storage.download(pdf.pdf_path)), self.data)
+        self.assertEqual(os.listdir(self.staging), [])
+
+    def start(self, part_size=100000):
+        res = self.client.post('/api/uploads/', {
+            'lesson_id': self.lesson.id, 'title': 'Optics notes', 'total_size': len(self.data), 'part_size': part_size,
+        }, format='json')
+        parts = [self.data[i:i + part_size] for i in range(0, len(self.data), part_size)]
+        for number, body in enumerate(parts, start=1):
+            self.assertEqual(self.put_part(res.data['id'], number, body).status_code, 200)
+        return res.data['id'], parts
+
+    def test_storage_transfer_runs_outside_the_transaction(self):
+        from . import uploads
+
+        upload_id, _ = self.start()
+        depth = len(connection.atomic_blocks)
+        store_blob = uploads.store_blob
+
+        def checked_store_blob(*args):
+            self.assertEqual(len(connection.atomic_blocks), depth)
+            return store_blob(*args)
+
+        with mock.patch('courses.uploads.store_blob', side_effect=checked_store_blob) as spy:
+            self.assertEqual(self.client.post(f'/api/uploads/{upload_id}/complete/').status_code, 200)
+        spy.assert_called_once()
+
+    def test_parts_staged_elsewhere_are_asked_for_again(self):
+        upload_id, parts = self.start()
+        # As if part 2 had been sent to another server
+        os.remove(os.path.join(self.staging, upload_id, '000002.part'))
+        res = self.client.post(f'/api/uploads/{upload_id}/complete/')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('send them again: 2', res.data['error'])
+        received = self.client.get(f'/api/uploads/{upload_id}/').data['received_parts']
+        self.assertEqual([part['number'] for part in received], [1, 3])
+        self.put_part(upload_id, 2, parts[1])
+        self.assertEqual(self.client.post(f'/api/uploads/{upload_id}/complete/').status_code, 200)
+
+    def test_abandoned_uploads_are_cleaned_up(self):
+        old, _ = self.start()
+        recent, _ = self.start()
+        UploadSession.objects.filter(pk=old).update(created_at=timezone.now() - timedelta(days=2))
+        orphan = os.path.join(self.staging, 'orphan')
+        os.makedirs(orphan)
+        os.utime(orphan, (0, 0))
+        out = io.StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('clean_upload_sessions', stdout=out)
+        self.assertIn('Deleted 1 uploads and 1 staging directories', out.getvalue())
+        self.assertEqual(list(UploadSession.objects.values_list('pk', flat=True)), [uuid.UUID(recent)])
+        self.assertEqual(os.listdir(self.staging), [recent])
+
+    def test_complete_requires_every_part(self):
+        session = UploadSession.objects.create(lesson=self.lesson, title='x', total_size=10, part_size=65536)
+        res = self.client.post(f'/api/uploads/{session.id}/complete/')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('Missing parts: 1', res.data['error'])
+
+    @override_settings(UPLOAD_PART_SIZE=100000)
+    def test_oversized_part_size_rejected(self):
+        res = self.client.post('/api/uploads/', {
+            'lesson_id': self.lesson.id, 'title': 'x', 'total_size': 10, 'part_size': 100001,
+        }, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('part_size', res.data)
+
+    def test_wrong_part_size_rejected(self):
+        session = UploadSession.objects.create(lesson=self.lesson, title='x', total_size=10, part_size=65536)
+        self.assertEqual(self.put_part(session.id, 1, b'123').status_code, 400)
+        self.assertFalse(session.parts.exists())
+
+
+class ContentAddressedUploadTests(TempStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        override = override_settings(UPLOAD_STAGING_ROOT=os.path.join(self.storage_root, 'staging'))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        course = Course.objects.create(title='Chemistry')
+        self.lessons = [Lesson.objects.create(course=course, title='Same title') for _ in range(2)]
+
+    def upload(self, lesson, data):
+        pdf_file = SimpleUploadedFile('handout.pdf', data, content_type='application/pdf')
+        return self.client.post(f'/api/lessons/{lesson.id}/upload_pdf/', {'lesson_id': lesson.id, 'pdf_file': pdf_file})
+
+    def test_identical_uploads_share_one_blob(self):
+        with mock.patch('courses.blobs.upload_stream', wraps=storage.upload_stream) as upload:
+            first = self.upload(self.lessons[0], b'%PDF-1.4 handout')
+            second = self.upload(self.lessons[1], b'%PDF-1.4 handout')
+        self.assertEqual(upload.call_count, 1)
+        self.assertEqual(first.data['pdf_path'], second.data['pdf_path'])
+        blob = PDFBlob.objects.get()
+        self.assertEqual(blob.sha256, hashlib.sha256(b'%PDF-1.4 handout').hexdigest())
+        self.assertEqual(blob.ref_count, 2)
+
+    def test_same_title_different_bytes_do_not_overwrite(self):
+        first = self.upload(self.lessons[0], b'%PDF-1.4 one')
+        second = self.upload(self.lessons[1], b'%PDF-1.4 two')
+        self.assertNotEqual(first.data['pdf_path'], second.data['pdf_path'])
+        self.assertEqual(b''.join(storage.download(first.data['pdf_path'])), b'%PDF-1.4 one')
+
+    def test_gc_reclaims_unreferenced_blobs(self):
+        self.upload(self.lessons[0], b'%PDF-1.4 one')
+        self.upload(self.lessons[1], b'%PDF-1.4 two')
+        kept, dropped = LessonPDF.objects.order_by('id')
+        dropped.lesson.delete()
+        self.assertEqual(PDFBlob.objects.get(pk=dropped.blob_id).ref_count, 0)
+
+        call_command('gc_pdf_blobs', '--grace-hours', '0', stdout=io.StringIO())
+        self.assertEqual(list(PDFBlob.objects.values_list('pk', flat=True)), [kept.blob_id])
+        self.assertFalse(storage.exists(dropped.pdf_path))
+        self.assertTrue(storage.exists(kept.pdf_path))
+
+
+class PDFTokenTests(SimpleTestCase):
+    def test_roundtrip(self):
+        token = issue_pdf_token(5, 9, expires_sec=60, now=1000)
+        access = verify_pdf_token(token, pdf_id=9, scope='view', now=1030)
+        self.assertEqual((access.user_id, access.pdf_id, access.expires), (5, 9, 1060))
+
+    def test_rejects_expired_forged_and_mismatched_tokens(self):
+        token = issue_pdf_token(5, 9, expires_sec=60, now=1000)
+        user_id, pdf_id, expires, scope, signature = token.split('.')
+        bad_tokens = [
+            (token, {'now': 1061}),
+            ('.'.join([user_id, '10', expires, scope, signature]), {'now': 1000}),
+            ('.'.join(['6', pdf_id, expires, scope, signature]), {'now': 1000}),
+            (token, {'now': 1000, 'pdf_id': 10}),
+            (token, {'now': 1000, 'scope': 'download'}),
+            ('garbage', {}),
+        ]
+        for bad, kwargs in bad_tokens:
+            with self.assertRaises(InvalidToken):
+                verify_pdf_token(bad, **kwargs)
+
+
+class ViewPDFTests(TempStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user('student', 'student@example.com', 'pw')
+        course = Course.objects.create(title='Biology')
+        lesson = Lesson.objects.create(course=course, title='Cells')
+        self.pdf = LessonPDF.objects.create(lesson=lesson, title='Cells', pdf_path=self.store('cells.pdf', b'%PDF-cells'))
+        Enrollment.objects.create(user=self.user, course=course)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_view_pdf_link_redirects_to_storage(self):
+        with mock.patch.object(storage.get_backend(), 'sign', wraps=storage.get_backend().sign) as sign:
+            res = self.api.get(f'/api/lessonpdfs/{self.pdf.id}/view_pdf/')
+            sign.assert_not_called()
+        self.assertEqual(res.status_code, 200)
+        link = res.data['signed_url']
+        self.assertIn(f'/api/lessonpdfs/{self.pdf.id}/content/?token=', link)
+
+        res = self.client.get(link)
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(b''.join(self.client.get(res['Location']).streaming_content), b'%PDF-cells')
+
+    def test_content_rejects_bad_tokens(self):
+        token = issue_pdf_token(self.user.id, self.pdf.id + 1)
+        res = self.client.get(f'/api/lessonpdfs/{self.pdf.id}/content/?token={token}')
+        self.assertEqual(res.status_code, 403)
+        res = self.client.get(f'/api/lessonpdfs/{self.pdf.id}/content/')
+        self.assertEqual(res.status_code, 403)
+
+    def test_unenrolled_user_gets_no_link(self):
+        self.api.force_authenticate(User.objects.create_user('other', 'other@example.com', 'pw'))
+        self.assertEqual(self.api.get(f'/api/lessonpdfs/{self.pdf.id}/view_pdf/').status_code, 403)
+
+
+class PDFStreamTests(TempStorageMixin, TestCase):
+    body = b'%PDF-1.4 ' + bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        override = override_settings(
+            PDF_CACHE_ROOT=os.path.join(self.storage_root, 'cache'),
+            UPLOAD_STAGING_ROOT=os.path.join(self.storage_root, 'staging'),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        user = User.objects.create_user('student', 'student@example.com', 'pw')
+        course = Course.objects.create(title='Biology')
+        Enrollment.objects.create(user=user, course=course)
+        lesson = Lesson.objects.create(course=course, title='Cells')
+        blob = store_chunks([self.body])
+        self.pdf = LessonPDF.objects.create(lesson=lesson, title='Cells', blob=blob, pdf_path=blob.path)
+        self.url = f'/api/lessonpdfs/{self.pdf.id}/stream/?token={issue_pdf_token(user.id, self.pdf.id)}'
+
+    def test_miss_redirects_and_fills_in_background(self):
+        cache = get_pdf_cache()
+        with mock.patch.object(cache, 'fill_async') as fill_async:
+            res = self.client.get(self.url)
+        self.assertEqual(res.status_code, 302)
+        fill_async.assert_called_once_with(self.pdf.pdf_path)
+
+    def test_full_range_and_conditional_requests(self):
+        get_pdf_cache().fill(self.pdf.pdf_path)
+
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), self.body)
+        self.assertEqual(res['ETag'], f'"{self.pdf.blob.sha256}"')
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+
+        res = self.client.get(self.url, HTTP_RANGE='bytes=5-9')
+        self.assertEqual(res.status_code, 206)
+        self.assertEqual(res['Content-Range'], f'bytes 5-9/{len(self.body)}')
+        self.assertEqual(b''.join(res.streaming_content), self.body[5:10])
+
+        res = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(res.streaming_content), self.body[-4:])
+
+        res = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.body)}-')
+        self.assertEqual(res.status_code, 416)
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{self.pdf.blob.sha256}"')
+        self.assertEqual(res.status_code, 304)
+
+    def test_rejects_missing_token(self):
+        self.assertEqual(self.client.get(f'/api/lessonpdfs/{self.pdf.id}/stream/').status_code, 403)
+
+    def test_lru_eviction_respects_size_cap(self):
+        cache = PDFDiskCache(os.path.join(self.storage_root, 'lru'), max_bytes=25)
+        for name in ('a', 'b', 'c'):
+            self.store(f'{name}.pdf', name.encode() * 10)
+        cache.fill('a.pdf')
+        cache.fill('b.pdf')
+        cache.get('a.pdf')
+        cache.fill('c.pdf')
+        self.assertIsNotNone(cache.get('a.pdf'))
+        self.assertIsNone(cache.get('b.pdf'))
+        self.assertEqual(cache.total_bytes, 20)
+
+    def test_workers_share_the_directory_and_the_cap(self):
+        root = os.path.join(self.storage_root, 'shared')
+        first, second = (PDFDiskCache(root, max_bytes=25, rescan_interval=0),
+                         PDFDiskCache(root, max_bytes=25, rescan_interval=0))
+        for name in ('a', 'b', 'c'):
+            self.store(f'{name}.pdf', name.encode() * 10)
+        first.fill('a.pdf')
+        # Filled by the other worker, so no download is needed
+        self.assertEqual(second.get('a.pdf'), first.file_for('a.pdf'))
+        os.utime(first.file_for('a.pdf'), (1, 1))
+        second.fill('b.pdf')
+        first.fill('c.pdf')
+        # 30 bytes on disk across both workers: the least recently used goes
+        self.assertIsNone(second.get('a.pdf'))
+        self.assertEqual(first.total_bytes, 20)
+
+    def test_fills_under_the_cap_dont_rescan(self):
+        cache = PDFDiskCache(os.path.join(self.storage_root, 'index'), max_bytes=25)
+        for name in ('a', 'b', 'c'):
+            self.store(f'{name}.pdf', name.encode() * 10)
+        with mock.patch('courses.pdf_cache.os.walk', wraps=os.walk) as walk:
+            cache.fill('a.pdf')
+            cache.fill('b.pdf')
+            walk.assert_not_called()
+            # Over the cap: recount the shared directory, then evict
+            cache.fill('c.pdf')
+            walk.assert_called_once()
+        self.assertIsNone(cache.get('a.pdf'))
+        self.assertEqual(cache.total_bytes, 20)
+
+    def test_background_fill_logs_unexpected_errors(self):
+        cache = PDFDiskCache(os.path.join(self.storage_root, 'bg'), max_bytes=100)
+        with mock.patch.object(cache, 'fill', side_effect=ValueError('boom')), \
+                self.assertLogs('courses.pdf_cache', 'ERROR'):
+            cache._fill_in_background('a.pdf')
+        self.assertNotIn('a.pdf', cache._filling)
+
+
+def make_pdf(sizes):
+    writer = PdfWriter()
+    for width, height in sizes:
+        writer.add_blank_page(width=width, height=height)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+class PDFPageTests(TempStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        override = override_settings(
+            PDF_CACHE_ROOT=os.path.join(self.storage_root, 'cache'),
+            UPLOAD_STAGING_ROOT=os.path.join(self.storage_root, 'staging'),
+            PDF_PAGE_RANGE_MAX=2,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        django_cache.clear()
+        self.user = User.objects.create_user('student', 'student@example.com', 'pw')
+        course = Course.objects.create(title='Geometry')
+        Enrollment.objects.create(user=self.user, course=course)
+        lesson = Lesson.objects.create(course=course, title='Shapes')
+        blob = store_chunks([make_pdf([(612, 792), (792, 612), (300, 300)])])
+        self.pdf = LessonPDF.objects.create(lesson=lesson, title='Shapes', blob=blob, pdf_path=blob.path)
+        get_pdf_cache().fill(self.pdf.pdf_path)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_manifest(self):
+        res = self.api.get(f'/api/lessonpdfs/{self.pdf.id}/pages/')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['page_count'], 3)
+        self.assertEqual([(p['width'], p['height']) for p in res.data['pages']], [(612, 792), (792, 612), (300, 300)])
+
+    def test_single_page_and_range(self):
+        res = self.api.get(f'/api/lessonpdfs/{self.pdf.id}/pages/2/')
+        self.assertEqual(res.status_code, 200)
+        reader = PdfReader(io.BytesIO(b''.join(res.streaming_content)))
+        self.assertEqual(len(reader.pages), 1)
+        self.assertEqual(float(reader.pages[0].mediabox.width), 792)
+
+        res = self.api.get(f'/api/lessonpdfs/{self.pdf.id}/pages/2-3/')
+        self.assertEqual(len(PdfReader(io.BytesIO(b''.join(res.streaming_content))).pages), 2)
+
+        with mock.patch('courses.pdf_pages.PdfWriter') as writer:
+            res = self.api.get(f'/api/lessonpdfs/{self.pdf.id}/pages/2/')
+            writer.assert_not_called()  # served from the page cache
+        self.assertEqual(self.api.get(f'/api/lessonpdfs/{self.pdf.id}/pages/2/', HTTP_IF_NONE_MATCH=res['ETag']).status_code, 304)
+
+    def test_invalid_ranges(self):
+        for pages in ('0', '4', '3-2', '1-3'):
+            self.assertEqual(self.api.get(f'/api/lessonpdfs/{self.pdf.id}/pages/{pages}/').status_code, 400)
+
+    def test_requires_enrollment(self):
+        self.api.force_authenticate(User.objects.create_user('other', 'other@example.com', 'pw'))
+        self.assertEqual(self.api.get(f'/api/lessonpdfs/{self.pdf.id}/pages/').status_code, 403)
+
+    def test_cold_cache_is_filled_in_the_background(self):
+        blob = store_chunks([make_pdf([(612, 792)])])
+        LessonPDF.objects.filter(pk=self.pdf.pk).update(blob=blob, pdf_path=blob.path)
+        with mock.patch.object(PDFDiskCache, 'fill_async') as fill_async:
+            res = self.api.get(f'/api/lessonpdfs/{self.pdf.id}/pages/')
+        self.assertEqual((res.status_code, res['Retry-After']), (503, '2'))
+        fill_async.assert_called_once_with(blob.path)
+
+    def test_unreadable_pdfs(self):
+        writer = PdfWriter()
+        writer.add_blank_page(width=100, height=100)
+        writer.encrypt('secret')
+        encrypted = io.BytesIO()
+        writer.write(encrypted)
+        for data, code in ((b'%PDF-1.4 not really', 422), (encrypted.getvalue(), 409)):
+            blob = store_chunks([data])
+            LessonPDF.objects.filter(pk=self.pdf.pk).update(blob=blob, pdf_path=blob.path, processing_status='done')
+            get_pdf_cache().fill(blob.path)
+            res = self.api.get(f'/api/lessonpdfs/{self.pdf.id}/pages/1/')
+            self.assertEqual(res.status_code, code)
+            self.pdf.refresh_from_db()
+            self.assertEqual(self.pdf.processing_status, 'failed')
+
+    def test_errors_writing_pages_are_not_blamed_on_the_pdf(self):
+        status_before = LessonPDF.objects.get(pk=self.pdf.pk).processing_status
+        with mock.patch('courses.pdf_pages.PdfWriter.write', side_effect=ValueError('disk trouble')):
+            with self.assertRaisesMessage(ValueError, 'disk trouble'):
+                extract_pages(self.pdf, 1, 1)
+        self.assertEqual(LessonPDF.objects.get(pk=self.pdf.pk).processing_status, status_before)
+
+
+class WatermarkTests(TempStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        override = override_settings(
+            PDF_CACHE_ROOT=os.path.join(self.storage_root, 'cache'),
+            UPLOAD_STAGING_ROOT=os.path.join(self.storage_root, 'staging'),
+            PDF_WATERMARK_MODE='server',
+            PDF_WATERMARK_WORKERS=0,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        django_cache.clear()
+        self.user = User.objects.create_user('stamped', 'stamped@example.com', 'pw')
+        course = Course.objects.create(title='History')
+        Enrollment.objects.create(user=self.user, course=course)
+        lesson = Lesson.objects.create(course=course, title='Rome')
+        blob = store_chunks([make_pdf([(612, 792), (612, 792)])])
+        self.pdf = LessonPDF.objects.create(lesson=lesson, title='Rome', blob=blob, pdf_path=blob.path)
+        get_pdf_cache().fill(self.pdf.pdf_path)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def read(self, response):
+        return PdfReader(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_stream_is_stamped_for_the_user(self):
+        res = self.api.get(f'/api/lessonpdfs/{self.pdf.id}/stream/')
+        self.assertEqual(res.status_code, 200)
+        reader = self.read(res)
+        self.assertEqual(len(reader.pages), 2)
+        for page in reader.pages:
+            self.assertIn('stamped', page.extract_text())
+
+    def test_pages_are_stamped_on_demand_and_overlays_cached(self):
+        render_overlay.cache_clear()
+        for number in (1, 2):
+            res = self.api.get(f'/api/lessonpdfs/{self.pdf.id}/pages/{number}/')
+            self.assertIn('#%d' % self.user.id, self.read(res).pages[0].extract_text())
+        self.assertEqual(render_overlay.cache_info().misses, 1)
+
+    def test_listings_do_not_link_unstamped_originals(self):
+        res = self.api.get(f'/api/lessonpdfs/{self.pdf.id}/')
+        self.assertIsNone(res.data['signed_url'])
+
+    def test_token_of_a_deleted_user(self):
+        token = issue_pdf_token(self.user.id, self.pdf.id)
+        self.user.delete()
+        self.assertEqual(APIClient().get(f'/api/lessonpdfs/{self.pdf.id}/stream/?token={token}').status_code, 403)
+
+    def test_whole_documents_are_stamped_as_an_incremental_update(self):
+        original = open(get_pdf_cache().get(self.pdf.pdf_path), 'rb').read()
+        res = self.api.get(f'/api/lessonpdfs/{self.pdf.id}/stream/')
+        stamped = b''.join(res.streaming_content)
+        # The original bytes are passed through untouched, with the pages appended
+        self.assertTrue(stamped.startswith(original))
+        self.assertEqual(len(PdfReader(io.BytesIO(stamped)).pages), 2)
+
+    def test_cold_source_is_filled_in_the_background(self):
+        os.remove(get_pdf_cache().get(self.pdf.pdf_path))
+        with mock.patch.object(get_pdf_cache(), 'fill_async') as fill_async:
+            res = self.api.get(f'/api/lessonpdfs/{self.pdf.id}/stream/')
+        self.assertEqual((res.status_code, res['Retry-After']), (503, '2'))
+        fill_async.assert_called_once_with(self.pdf.pdf_path)
+
+    @override_settings(PDF_WATERMARK_WORKERS=1, PDF_WATERMARK_TIMEOUT=0.05)
+    def test_slow_stamps_keep_running_for_retries(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from .watermark import WatermarkBusy, _jobs
+
+        release = threading.Event()
+        calls = []
+
+        def slow_stamp(src_path, dst_path, text):
+            calls.append(dst_path)
+            release.wait(5)
+            shutil.copyfile(src_path, dst_path)
+
+        pool, slots = ThreadPoolExecutor(max_workers=1), threading.BoundedSemaphore(2)
+        self.addCleanup(pool.shutdown)
+        src = get_pdf_cache().get(self.pdf.pdf_path)
+        with mock.patch('courses.watermark._get_pool', return_value=(pool, slots)):
+            for _ in range(2):
+                with self.assertRaises(WatermarkBusy):
+                    run_stamp('slow', slow_stamp, src, 'slow')
+            # The retry waited on the first job instead of starting another
+            self.assertEqual(len(calls), 1)
+            self.assertFalse(slots.acquire(blocking=False) and slots.acquire(blocking=False))
+            slots.release()
+            release.set()
+            pool.shutdown(wait=True)
+        # Published when it finished, with no request waiting
+        self.assertEqual(_jobs, {})
+        self.assertFalse(os.path.exists(calls[0]))
+        self.assertEqual(open(get_pdf_cache().get_derived('slow'), 'rb').read(), open(src, 'rb').read())
+        self.assertTrue(slots.acquire(blocking=False) and slots.acquire(blocking=False))
+
+    @override_settings(PDF_WATERMARK_WORKERS=1)
+    def test_process_pool(self):
+        src = get_pdf_cache().get(self.pdf.pdf_path)
+        stamped = run_stamp('pool', stamp_document, src, 'pool user')
+        self.assertIn('pool user', PdfReader(stamped).pages[1].extract_text())
+
+
+def make_illustrated_pdf(text, copies=1):
+    """A PDF whose first page is a picture and second page carries ``text``."""
+    writer = PdfWriter()
+    for _ in range(copies):
+        # Separate readers give every copy its own (duplicate) image and font objects
+        picture = io.BytesIO()
+        Image.new('RGB', (800, 400), 'red').save(picture, 'PDF')
+        writer.add_page(PdfReader(picture).pages[0])
+        writer.add_page(PdfReader(io.BytesIO(render_overlay(text, 612, 792))).pages[0])
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+@override_settings(PDF_PROCESSING_WORKERS=0, PDF_THUMBNAIL_SIZE=100)
+class PDFProcessingTests(TempStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        override = override_settings(PDF_CACHE_ROOT=os.path.join(self.storage_root, 'cache'))
+        override.enable()
+        self.addCleanup(override.disable)
+        django_cache.clear()
+        course = Course.objects.create(title='Art')
+        self.lesson = Lesson.objects.create(course=course, title='Colour')
+
+    def create_pdf(self, data):
+        blob = store_chunks([data])
+        with self.captureOnCommitCallbacks(execute=True):
+            pdf = LessonPDF.objects.create(lesson=self.lesson, title='Colour', blob=blob, pdf_path=blob.path)
+        pdf.refresh_from_db()
+        return pdf
+
+    def test_upload_is_processed_after_commit(self):
+        pdf = self.create_pdf(make_illustrated_pdf('primary colours'))
+        self.assertEqual(pdf.processing_status, 'done')
+        self.assertEqual(pdf.page_count, 2)
+        self.assertEqual(pdf.file_size, pdf.blob.size)
+        self.assertIn('primary colours', pdf.pages.get(number=2).text)
+        thumbnail = Image.open(io.BytesIO(b''.join(storage.download(pdf.thumbnail_path))))
+        self.assertEqual(thumbnail.size, (100, 50))
+        self.assertIsNotNone(LessonPDFSerializer(pdf).data['thumbnail_url'])
+
+    def test_reprocessing_is_idempotent(self):
+        pdf = self.create_pdf(make_illustrated_pdf('primary colours'))
+        processed_at = pdf.processed_at
+        self.assertEqual(process_pdf(pdf.pk).processed_at, processed_at)
+        rerun = process_pdf(pdf.pk, force=True)
+        self.assertGreater(rerun.processed_at, processed_at)
+        self.assertEqual(rerun.pages.count(), 2)
+
+    def test_manifest_uses_stored_pages(self):
+        pdf = self.create_pdf(make_pdf([(612, 792), (300, 300)]))
+        self.assertEqual(pdf.thumbnail_path, '')
+        self.assertEqual(pdf.page_count, 2)
+        shutil.rmtree(os.path.join(self.storage_root, 'cache'))
+        with mock.patch('courses.pdf_pages.PdfReader', side_effect=AssertionError):
+            manifest = page_manifest(pdf)
+        self.assertEqual([(p['width'], p['height']) for p in manifest['pages']], [(612, 792), (300, 300)])
+
+    def test_broken_pdf_is_marked_failed(self):
+        with self.assertLogs('courses.pdf_processing', 'WARNING'):
+            pdf = self.create_pdf(b'%PDF-1.4 not really')
+        self.assertEqual(pdf.processing_status, 'failed')
+        self.assertTrue(pdf.processing_error)
+
+    def test_upload_is_optimized_and_original_kept(self):
+        pdf = self.create_pdf(make_illustrated_pdf('primary colours', copies=5))
+        original = pdf.blob.original
+        self.assertIsNotNone(original)
+        self.assertGreater(pdf.blob.bytes_saved, original.size // 2)
+        self.assertEqual(pdf.pdf_path, pdf.blob.path)
+        self.assertEqual((pdf.processing_status, pdf.page_count), ('done', 10))
+        self.assertEqual(pdf.processed_key, pdf.blob.sha256)
+        self.assertIn('primary colours', pdf.pages.get(number=10).text)
+        self.assertTrue(storage.exists(original.path))
+
+        # Unreferenced now, but kept as the fallback for its rewrite
+        original.refresh_from_db()
+        self.assertEqual(original.ref_count, 0)
+        call_command('gc_pdf_blobs', grace_hours=-1, stdout=io.StringIO())
+        self.assertTrue(PDFBlob.objects.filter(pk=original.pk).exists())
+
+    def test_restore_original(self):
+        pdf = self.create_pdf(make_illustrated_pdf('primary colours', copies=3))
+        original = pdf.blob.original
+        with self.captureOnCommitCallbacks(execute=True):
+            restore_original_pdf(pdf)
+        pdf.refresh_from_db()
+        self.assertEqual((pdf.blob, pdf.pdf_path), (original, original.path))
+        self.assertEqual((pdf.processing_status, pdf.processed_key), ('done', original.sha256))
+
+    @override_settings(PDF_OPTIMIZE_UPLOADS=False)
+    def test_optimization_can_be_disabled(self):
+        pdf = self.create_pdf(make_illustrated_pdf('primary colours', copies=3))
+        self.assertIsNone(pdf.blob.original)
+
+    def test_backfill_command(self):
+        blob = store_chunks([make_pdf([(612, 792)])])
+        pdf = LessonPDF.objects.create(lesson=self.lesson, title='Old', blob=blob, pdf_path=blob.path)
+        self.assertEqual(pdf.processing_status, 'pending')
+        out = io.StringIO()
+        call_command('process_pdfs', workers=0, stdout=out)
+        self.assertIn('Processed 1 PDFs', out.getvalue())
+        pdf.refresh_from_db()
+        self.assertEqual((pdf.processing_status, pdf.page_count), ('done', 1))
+
+
+@override_settings(PDF_PROCESSING_WORKERS=0)
+class SearchTests(TempStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        override = override_settings(PDF_CACHE_ROOT=os.path.join(self.storage_root, 'cache'))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.algebra = Course.objects.create(title='Linear Algebra', description='Vectors and matrices')
+        self.lesson = Lesson.objects.create(course=self.algebra, title='Eigenvalues')
+        Course.objects.create(title='Cooking', description='Knife skills')
+        self.user = User.objects.create_user('learner', 'learner@example.com', 'pw')
+        self.api = APIClient()
+
+    def search(self, **params):
+        res = self.api.get('/api/search/', params)
+        self.assertEqual(res.status_code, 200)
+        return res.data
+
+    def test_ranked_and_highlighted(self):
+        data = self.search(q='eigen')
+        self.assertEqual(data['count'], 1)
+        hit = data['results'][0]
+        self.assertEqual((hit['type'], hit['id'], hit['course_id']), ('lesson', self.lesson.id, self.algebra.id))
+        self.assertEqual(hit['highlight'], '<mark>Eigenvalues</mark>')
+
+        Lesson.objects.create(course=self.algebra, title='Matrices')
+        results = self.search(q='matrices')['results']
+        # A title match outranks the same word in a description
+        self.assertEqual([r['type'] for r in results], ['lesson', 'course'])
+
+    def test_highlight_escapes_indexed_html(self):
+        Course.objects.create(title='<b>Bold</b> typography')
+        hit = self.search(q='typography')['results'][0]
+        self.assertEqual(hit['highlight'], '&lt;b&gt;Bold&lt;/b&gt; <mark>typography</mark>')
+
+    def test_course_list_search_uses_the_index(self):
+        res = self.api.get('/api/courses/', {'search': 'eigenvalues'})
+        self.assertEqual([course['title'] for course in res.data], ['Linear Algebra'])
+
+    def test_course_list_search_matches_partial_words(self):
+        # Substrings match titles; descriptions match by word
+        for term in ('gebra', 'GENVAL', 'matrices'):
+            res = self.api.get('/api/courses/', {'search': term})
+            self.assertEqual([course['title'] for course in res.data], ['Linear Algebra'])
+        self.assertEqual(self.api.get('/api/courses/', {'search': '%'}).data, [])
+
+    def test_migration_backfills_existing_rows(self):
+        migration = import_module('courses.migrations.0016_backfill_search_entries')
+        SearchEntry.objects.exclude(kind='course', object_id=self.algebra.id).delete()
+        migration.backfill_search_entries(django_apps, None)
+        self.assertEqual(SearchEntry.objects.filter(kind='course').count(), 2)
+        self.assertEqual(self.search(q='eigenvalues')['count'], 1)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.lesson.title = 'Determinants'
+        self.lesson.save()
+        self.assertEqual(self.search(q='eigenvalues')['count'], 0)
+        self.assertEqual(self.search(q='determinants')['count'], 1)
+        self.algebra.delete()
+        self.assertEqual(self.search(q='determinants')['count'], 0)
+        self.assertFalse(SearchEntry.objects.filter(course_id=self.algebra.id).exists())
+
+    def test_pdf_text_only_for_enrolled_users(self):
+        blob = store_chunks([make_illustrated_pdf('photosynthesis in leaves')])
+        with self.captureOnCommitCallbacks(execute=True):
+            LessonPDF.objects.create(lesson=self.lesson, title='Handout', blob=blob, pdf_path=blob.path)
+        self.assertEqual(self.search(q='photosynthesis')['count'], 0)
+        Enrollment.objects.create(user=self.user, course=self.algebra)
+        self.api.force_authenticate(self.user)
+        hit = self.search(q='photosynthesis')['results'][0]
+        self.assertEqual((hit['type'], hit['title']), ('pdf', 'Handout'))
+        self.assertIn('<mark>photosynthesis</mark>', hit['snippet'])
+
+    def test_pagination(self):
+        for n in range(5):
+            Lesson.objects.create(course=self.algebra, title=f'Proof technique {n}')
+        first = self.search(q='proof', page_size=2)
+        self.assertEqual((first['count'], len(first['results'])), (5, 2))
+        self.assertIsNone(first['previous'])
+        last = self.search(q='proof', page_size=2, page=3)
+        self.assertEqual(len(last['results']), 1)
+        self.assertIsNone(last['next'])
+        self.assertEqual(self.api.get('/api/search/', {'q': 'proof', 'type': 'video'}).status_code, 400)
+
+    def test_rebuild_command(self):
+        SearchEntry.objects.all().delete()
+        self.assertEqual(self.search(q='knife')['count'], 0)
+        out = io.StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('2 courses, 1 lessons, 0 pdfs', out.getvalue())
+        self.assertEqual(self.search(q='knife')['results'][0]['type'], 'course')
+
+
+class SuggestionIndexTests(SimpleTestCase):
+    def setUp(self):
+        self.index = SuggestionIndex()
+        self.index.put('course', 1, 1, 'Linear Algebra')
+        self.index.put('course', 2, 2, 'Álgebra Básica')
+        self.index.put('lesson', 10, 1, 'Algebraic structures')
+
+    def titles(self, query):
+        return [hit['title'] for hit in self.index.suggest(query)]
+
+    def test_matches_normalised_word_prefixes(self):
+        self.assertEqual(sorted(self.titles('ALG')), ['Algebraic structures', 'Linear Algebra', 'Álgebra Básica'])
+        self.assertEqual(self.titles('  basic '), ['Álgebra Básica'])
+        self.assertEqual(self.titles('linear alg'), ['Linear Algebra'])
+        self.assertEqual(self.titles('gebra'), [])
+
+    def test_ranked_by_enrollments(self):
+        self.index.add_enrollments(2, 3)
+        self.index.add_enrollments(1, 1)
+        self.assertEqual(self.titles('alg'), ['Álgebra Básica', 'Linear Algebra', 'Algebraic structures'])
+
+    def test_updates_and_removals(self):
+        self.index.put('lesson', 10, 1, 'Group theory')
+        self.assertEqual(self.titles('algebraic'), [])
+        self.assertEqual(self.titles('group'), ['Group theory'])
+        self.assertFalse(self.index.put('lesson', 10, 1, 'Group theory'))
+        self.index.remove('course', 1)
+        self.assertEqual(self.titles('linear'), [])
+        self.assertEqual(len(self.index), 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SuggestEndpointTests(TestCase):
+    def setUp(self):
+        reset_suggestion_index()
+        self.addCleanup(reset_suggestion_index)
+        self.physics = Course.objects.create(title='Physics')
+        self.lesson = Lesson.objects.create(course=self.physics, title='Photons')
+        self.api = APIClient()
+
+    def suggest(self, q, **params):
+        res = self.api.get('/api/courses/suggest/', {'q': q, **params})
+        self.assertEqual(res.status_code, 200)
+        return [(hit['type'], hit['title']) for hit in res.data]
+
+    def test_built_lazily_then_served_without_queries(self):
+        self.assertEqual(self.suggest('ph'), [('course', 'Physics'), ('lesson', 'Photons')])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('pho'), [('lesson', 'Photons')])
+
+    def test_follows_committed_changes(self):
+        self.suggest('ph')
+        with self.captureOnCommitCallbacks(execute=True):
+            photography = Course.objects.create(title='Photography')
+            user = User.objects.create_user('learner', 'learner@example.com', 'pw')
+            Enrollment.objects.create(user=user, course=photography)
+            self.lesson.title = 'Waves'
+            self.lesson.save()
+        self.assertEqual(self.suggest('ph'), [('course', 'Photography'), ('course', 'Physics')])
+        with self.captureOnCommitCallbacks(execute=True):
+            photography.delete()
+        self.assertEqual(self.suggest('ph'), [('course', 'Physics')])
+        self.assertEqual(self.suggest('wa'), [('lesson', 'Waves')])
+
+    def test_changes_made_before_the_index_is_built_still_reach_other_processes(self):
+        self.suggest('ph')
+        other = suggest._index
+        reset_suggestion_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(title='Photography')
+        self.assertNotEqual(django_cache.get(suggest.GENERATION_KEY, 0), other.generation)
+
+    def test_limit(self):
+        self.assertEqual(len(self.suggest('ph', limit=1)), 1)
+        self.assertEqual(self.suggest(''), [])
+        self.assertEqual(self.api.get('/api/courses/suggest/', {'q': 'ph', 'limit': 'x'}).status_code, 400)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class EnrollmentFlagTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('learner', 'learner@example.com', 'pw')
+        self.courses = [Course.objects.create(title=f'Course {n}') for n in range(6)]
+        for course in self.courses[:2]:
+            Enrollment.objects.create(user=self.user, course=course)
+            Lesson.objects.create(course=course, title=f'Intro to {course.title}')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_course_list_query_count_is_constant(self):
+        # The course page and the user's enrolled ids
+        with self.assertNumQueries(2):
+            res = self.api.get('/api/courses/')
+        enrolled = {course['id'] for course in res.data if course['is_enrolled']}
+        self.assertEqual(enrolled, {course.id for course in self.courses[:2]})
+
+    def test_nested_courses_read_the_shared_set(self):
+        with self.assertNumQueries(3):
+            res = self.api.get('/api/lessons/')
+        self.assertTrue(all(lesson['course']['is_enrolled'] for lesson in res.data))
+
+    def test_my_courses(self):
+        with self.assertNumQueries(2):
+            res = self.api.get('/api/courses/my_courses/')
+        self.assertEqual(len(res.data), 2)
+
+    def test_anonymous_users_are_never_enrolled(self):
+        self.api.force_authenticate(None)
+        # Just the course page
+        with self.assertNumQueries(1):
+            res = self.api.get('/api/courses/')
+        self.assertFalse(any(course['is_enrolled'] for course in res.data))
+
+
+@override_settings(ENROLLMENT_CACHE_TIMEOUT=3600)
+class QueryCountTests(TempStorageMixin, TestCase):
+    """
+    Every API endpoint runs a fixed number of queries however much data there
+    is; an N+1 regression changes these counts.
+    """
+    courses, lessons_per_course, pdfs_per_lesson = 25, 4, 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        cls.user = User.objects.create_user('student', 'student@example.com', 'pw')
+        courses = Course.objects.bulk_create(Course(title=f'Course {n}') for n in range(cls.courses))
+        lessons = Lesson.objects.bulk_create(
+            Lesson(course=course, title=f'{course.title} lesson {n}')
+            for course in courses for n in range(cls.lessons_per_course)
+        )
+        LessonPDF.objects.bulk_create(
+            LessonPDF(lesson=lesson, title=f'{lesson.title} handout {n}', pdf_path='seed.pdf')
+            for lesson in lessons for n in range(cls.pdfs_per_lesson)
+        )
+        Enrollment.objects.bulk_create(Enrollment(user=cls.user, course=course) for course in courses[::2])
+        cls.course, cls.lesson = courses[0], lessons[0]
+        call_command('rebuild_search_index', stdout=io.StringIO())
+
+    def setUp(self):
+        super().setUp()
+        override = override_settings(
+            PDF_CACHE_ROOT=os.path.join(self.storage_root, 'cache'),
+            UPLOAD_STAGING_ROOT=os.path.join(self.storage_root, 'staging'),
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        django_cache.clear()
+        signed_url_cache.clear()
+        self.store('seed.pdf', make_pdf([(612, 792)] * 3))
+        blob = store_chunks([make_pdf([(612, 792)] * 3)])
+        self.pdf = LessonPDF.objects.create(lesson=self.lesson, title='Real', blob=blob, pdf_path=blob.path)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def assertQueries(self, count, method, url, status=200, **kwargs):
+        with self.assertNumQueries(count):
+            res = getattr(self.api, method)(url, **kwargs)
+        self.assertEqual(res.status_code, status)
+        return res
+
+    def test_course_endpoints(self):
+        # Courses and the enrolled ids, which are cached from here on
+        res = self.assertQueries(2, 'get', '/api/courses/')
+        self.assertEqual(len(res.data), self.courses)
+        self.assertQueries(1, 'get', f'/api/courses/{self.course.id}/')
+        res = self.assertQueries(1, 'get', '/api/courses/my_courses/')
+        self.assertEqual(len(res.data), -(-self.courses // 2))
+
+    def test_enrollment_actions(self):
+        other = Course.objects.get(title='Course 1')
+        # get_object, then the conflict-ignoring insert and the enrollment count in a savepoint
+        self.assertQueries(5, 'post', f'/api/courses/{other.id}/enroll/', status=201)
+        # get_object, then the delete and the enrollment count in a savepoint
+        self.assertQueries(5, 'post', f'/api/courses/{other.id}/unenroll/')
+
+    def test_lesson_endpoints(self):
+        res = self.assertQueries(3, 'get', '/api/lessons/')
+        self.assertEqual(len(res.data), self.courses * self.lessons_per_course)
+        res = self.assertQueries(2, 'get', f'/api/lessons/{self.lesson.id}/')
+        self.assertEqual(len(res.data['pdfs']), self.pdfs_per_lesson + 1)
+        # A new caller's enrolled ids aren't cached yet
+        self.api.force_authenticate(User.objects.create_user('other', 'other@example.com', 'pw'))
+        self.assertQueries(3, 'get', f'/api/lessons/{self.lesson.id}/', status=403)
+
+    def test_upload_pdf(self):
+        self.api.force_authenticate(self.admin)
+        upload = SimpleUploadedFile('new.pdf', make_pdf([(612, 792)]), content_type='application/pdf')
+        # The lesson; the blob lookup, then its insert (3, in a savepoint);
+        # the PDF and its blob reference; the page text for the search
+        # entry, whose update_or_create takes 6 (an outer savepoint, the
+        # lookup, then the insert in its own savepoint); the PDF count
+        self.assertQueries(15, 'post', f'/api/lessons/{self.lesson.id}/upload_pdf/',
+                           data={'lesson_id': self.lesson.id, 'pdf_file': upload})
+
+    def test_pdf_endpoints(self):
+        res = self.assertQueries(1, 'get', '/api/lessonpdfs/')
+        self.assertEqual(len(res.data), self.courses * self.lessons_per_course * self.pdfs_per_lesson + 1)
+        self.assertQueries(1, 'get', f'/api/lessonpdfs/{self.pdf.id}/')
+        self.assertQueries(2, 'get', f'/api/lessonpdfs/{self.pdf.id}/view_pdf/')
+        get_pdf_cache().fill(self.pdf.pdf_path)
+        # Enrollment checks read the cached enrolled ids
+        self.assertQueries(1, 'get', f'/api/lessonpdfs/{self.pdf.id}/pages/')
+        self.assertQueries(1, 'get', f'/api/lessonpdfs/{self.pdf.id}/pages/2/')
+        token = issue_pdf_token(self.user.id, self.pdf.id)
+        self.assertQueries(1, 'get', f'/api/lessonpdfs/{self.pdf.id}/stream/?token={token}')
+
+    def test_search_endpoints(self):
+        self.assertQueries(4, 'get', '/api/search/', data={'q': 'handout'})
+        # The index check and matching course ids, then courses (the
+        # enrolled ids are cached)
+        res = self.assertQueries(3, 'get', '/api/courses/', data={'search': 'lesson'})
+        self.assertEqual(len(res.data), self.courses)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, API_MAX_PAGE_SIZE=10)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('learner', 'learner@example.com', 'pw')
+        self.courses = [Course.objects.create(title=f'Course {n}') for n in range(7)]
+        # Ties on created_at are broken by id
+        Course.objects.filter(pk__in=[c.pk for c in self.courses[2:5]]).update(created_at=self.courses[2].created_at)
+        for course in self.courses[::2]:
+            Enrollment.objects.create(user=self.user, course=course)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+        self.expected = list(Course.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def walk(self, url, params):
+        ids, pages = [], []
+        res = self.api.get(url, params)
+        while True:
+            self.assertEqual(res.status_code, 200)
+            pages.append(res.data)
+            ids += [course['id'] for course in res.data['results']]
+            if not res.data['next']:
+                return ids, pages
+            res = self.api.get(res.data['next'])
+
+    def test_walks_every_course_once_in_order(self):
+        ids, pages = self.walk('/api/courses/', {'page_size': 3})
+        self.assertEqual(ids, self.expected)
+        self.assertEqual([len(page['results']) for page in pages], [3, 3, 1])
+        self.assertIsNone(pages[0]['previous'])
+
+        back = self.api.get(pages[2]['previous']).data
+        self.assertEqual([c['id'] for c in back['results']], self.expected[3:6])
+        back = self.api.get(back['previous']).data
+        self.assertEqual([c['id'] for c in back['results']], self.expected[:3])
+        self.assertIsNone(back['previous'])
+
+    def test_deep_pages_cost_the_same_as_the_first(self):
+        first = self.api.get('/api/courses/', {'page_size': 2}).data
+        django_cache.clear()  # measure the queries, not the response cache
+        with self.assertNumQueries(2):
+            self.api.get('/api/courses/', {'page_size': 2})
+        django_cache.clear()
+        with self.assertNumQueries(2):
+            self.api.get(first['next'])
+
+    def test_my_courses_is_one_joined_query(self):
+        with self.assertNumQueries(2):
+            res = self.api.get('/api/courses/my_courses/', {'page_size': 10})
+        self.assertEqual([c['id'] for c in res.data['results']], [pk for pk in self.expected if pk in {c.id for c in self.courses[::2]}])
+        self.assertTrue(all(c['is_enrolled'] for c in res.data['results']))
+
+    def test_lessons_and_pdfs_page_oldest_first(self):
+        lessons = [Lesson.objects.create(course=self.courses[0], title=f'Lesson {n}') for n in range(3)]
+        for lesson in lessons:
+            LessonPDF.objects.create(lesson=lesson, title=lesson.title)
+        ids, _ = self.walk('/api/lessons/', {'page_size': 2})
+        self.assertEqual(ids, [lesson.id for lesson in lessons])
+        ids, _ = self.walk('/api/lessonpdfs/', {'page_size': 2})
+        self.assertEqual(len(ids), 3)
+
+    def test_unpaginated_requests_keep_the_plain_list(self):
+        res = self.api.get('/api/courses/')
+        self.assertCountEqual([c['id'] for c in res.data], self.expected)
+        self.assertEqual(len(self.api.get('/api/courses/', {'page_size': 500}).data['results']), 7)
+        self.assertEqual(self.api.get('/api/courses/', {'cursor': 'nonsense'}).status_code, 404)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, ENROLLMENT_CACHE_TIMEOUT=3600)
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.user = User.objects.create_user('learner', 'learner@example.com', 'pw')
+        self.physics = Course.objects.create(title='Physics')
+        self.chemistry = Course.objects.create(title='Chemistry')
+        Enrollment.objects.create(user=self.user, course=self.physics)
+        self.api = APIClient()
+
+    def flags(self, res):
+        return {course['title']: course['is_enrolled'] for course in res.data}
+
+    def test_list_is_shared_with_per_user_flags(self):
+        self.api.get('/api/courses/')
+        with self.assertNumQueries(0):
+            res = self.api.get('/api/courses/')
+        self.assertEqual(self.flags(res), {'Physics': False, 'Chemistry': False})
+        self.api.force_authenticate(self.user)
+        # Only the caller's enrolled ids are loaded
+        with self.assertNumQueries(1):
+            res = self.api.get('/api/courses/')
+        self.assertEqual(self.flags(res), {'Physics': True, 'Chemistry': False})
+
+    def test_detail_is_cached_per_course(self):
+        self.api.force_authenticate(self.user)
+        self.api.get(f'/api/courses/{self.physics.id}/')
+        # The caller's enrolled ids are cached too by now
+        with self.assertNumQueries(0):
+            res = self.api.get(f'/api/courses/{self.physics.id}/')
+        self.assertEqual((res.data['title'], res.data['is_enrolled']), ('Physics', True))
+        self.assertEqual(self.api.get('/api/courses/999/').status_code, 404)
+
+    def test_signals_invalidate_affected_entries(self):
+        self.api.get('/api/courses/')
+        self.api.get(f'/api/courses/{self.chemistry.id}/')
+        self.physics.title = 'Quantum Physics'
+        self.physics.save()
+        self.assertIn('Quantum Physics', self.flags(self.api.get('/api/courses/')))
+        # Other courses' detail entries survive
+        with self.assertNumQueries(0):
+            self.api.get(f'/api/courses/{self.chemistry.id}/')
+
+        self.api.get('/api/courses/', {'search': 'titration'})
+        Lesson.objects.create(course=self.chemistry, title='Titration')
+        self.assertEqual(len(self.api.get('/api/courses/', {'search': 'titration'}).data), 1)
+        self.chemistry.delete()
+        self.assertEqual(list(self.flags(self.api.get('/api/courses/'))), ['Quantum Physics'])
+
+    def test_versions_are_bumped_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.physics.save()
+            # What another worker rebuilds now is from before the commit
+            versions = catalog_cache.list_version(), catalog_cache.course_version(self.physics.id)
+        self.assertNotEqual(catalog_cache.list_version(), versions[0])
+        self.assertNotEqual(catalog_cache.course_version(self.physics.id), versions[1])
+
+    def test_concurrent_misses_build_once(self):
+        calls, release = [], threading.Event()
+
+        def build():
+            release.wait(5)
+            calls.append(1)
+            return ['payload']
+
+        threads = [threading.Thread(target=catalog_cache.get_or_build, args=('catalog:test', build)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(django_cache.get('catalog:test'), ['payload'])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, ENROLLMENT_CACHE_TIMEOUT=3600)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.user = User.objects.create_user('learner', 'learner@example.com', 'pw')
+        self.course = Course.objects.create(title='Physics')
+        self.lesson = Lesson.objects.create(course=self.course, title='Optics')
+        Enrollment.objects.create(user=self.user, course=self.course)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def revalidate(self, url, etag, queries=None):
+        if queries is None:
+            return self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+        with self.assertNumQueries(queries):
+            return self.api.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_course_list_and_detail(self):
+        for url in ('/api/courses/', f'/api/courses/{self.course.id}/'):
+            res = self.api.get(url)
+            self.assertEqual(res['Cache-Control'], 'private, no-cache')
+            # No query: the payload and the caller's enrolled ids are cached
+            self.assertEqual(self.revalidate(url, res['ETag'], queries=0), 304)
+            self.course.title = f'Physics {url}'
+            self.course.save()
+            self.assertEqual(self.revalidate(url, res['ETag']), 200)
+
+    def test_course_etags_follow_the_cached_payload(self):
+        # Another worker's invalidation never reaches this one's cache
+        # versions, so it keeps serving its copy, and that copy's ETag,
+        # until the entry expires
+        for url in ('/api/courses/', f'/api/courses/{self.course.id}/'):
+            etag = self.api.get(url)['ETag']
+            with mock.patch('courses.catalog_cache.invalidate_course'):
+                Course.objects.filter(pk=self.course.pk).update(title=f'Physics {url}')
+            self.assertEqual(self.revalidate(url, etag), 304)
+            django_cache.clear()
+            self.assertEqual(self.revalidate(url, etag), 200)
+
+    def test_lessons_change_with_their_pdfs_and_course(self):
+        url = f'/api/lessons/{self.lesson.id}/'
+        etag = self.api.get(url)['ETag']
+        # The lesson is loaded to be hashed, but not rendered or sent
+        self.assertEqual(self.revalidate(url, etag, queries=2), 304)
+        pdf = LessonPDF.objects.create(lesson=self.lesson, title='Lenses')
+        self.assertEqual(self.revalidate(url, etag), 200)
+        etag = self.api.get(url)['ETag']
+        pdf.title = 'Mirrors'
+        pdf.save()
+        self.assertEqual(self.revalidate(url, etag), 200)
+        etag = self.api.get('/api/lessons/')['ETag']
+        self.course.title = 'Modern Physics'
+        self.course.save()
+        self.assertEqual(self.revalidate('/api/lessons/', etag), 200)
+
+    def test_enrollment_changes_invalidate(self):
+        etag = self.api.get('/api/courses/')['ETag']
+        Enrollment.objects.filter(user=self.user).delete()
+        self.assertEqual(self.revalidate('/api/courses/', etag), 200)
+
+    def test_etags_are_per_user(self):
+        etag = self.api.get('/api/courses/')['ETag']
+        self.api.force_authenticate(User.objects.create_user('other', 'other@example.com', 'pw'))
+        self.assertEqual(self.revalidate('/api/courses/', etag), 200)
+        self.assertEqual(self.api.get('/api/lessons/999/').status_code, 404)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, ENROLLMENT_CACHE_TIMEOUT=3600)
+class SparseFieldsetTests(TempStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        django_cache.clear()
+        self.user = User.objects.create_user('learner', 'learner@example.com', 'pw')
+        self.course = Course.objects.create(title='Physics', description='Matter and energy')
+        self.lessons = [Lesson.objects.create(course=self.course, title=f'Lesson {n}') for n in range(3)]
+        for lesson in self.lessons:
+            LessonPDF.objects.create(lesson=lesson, title=lesson.title, pdf_path=self.store(f'{lesson.id}.pdf'))
+        Enrollment.objects.create(user=self.user, course=self.course)
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def test_lesson_titles_skip_joins_prefetches_and_signing(self):
+        with mock.patch.object(storage.get_backend(), 'sign_many') as sign_many:
+            # One narrow lesson query, without the enrolled ids
+            with self.assertNumQueries(1):
+                res = self.api.get('/api/lessons/', {'fields': 'id,title'})
+            sign_many.assert_not_called()
+        self.assertEqual(res.data[0], {'id': self.lessons[0].id, 'title': 'Lesson 0'})
+
+    def test_default_representation_is_unchanged(self):
+        lesson = self.api.get(f'/api/lessons/{self.lessons[0].id}/').data
+        self.assertEqual(set(lesson), {'id', 'course', 'title', 'pdfs', 'created_at'})
+        self.assertEqual(set(lesson['course']), {'id', 'title', 'is_enrolled'})
+        self.assertIsNotNone(lesson['pdfs'][0]['signed_url'])
+
+    def test_pdf_fields(self):
+        res = self.api.get('/api/lessonpdfs/', {'fields': 'id,title,page_count'})
+        self.assertEqual(set(res.data[0]), {'id', 'title', 'page_count'})
+        res = self.api.get('/api/lessonpdfs/', {'fields': 'id,signed_url'})
+        self.assertTrue(res.data[0]['signed_url'])
+
+    def test_course_lessons_are_opt_in(self):
+        self.assertNotIn('lessons', self.api.get(f'/api/courses/{self.course.id}/').data)
+        course = self.api.get(f'/api/courses/{self.course.id}/', {'expand': 'lessons'}).data
+        self.assertEqual([lesson['title'] for lesson in course['lessons']], ['Lesson 0', 'Lesson 1', 'Lesson 2'])
+        self.assertTrue(course['is_enrolled'])
+        with self.assertNumQueries(2):
+            # Courses and their lessons; the enrolled ids are cached by now
+            res = self.api.get('/api/courses/my_courses/', {'fields': 'id,lessons,is_enrolled'})
+        self.assertEqual(len(res.data[0]['lessons']), 3)
+
+    def test_course_fields_without_enrollment_flags_skip_the_enrollment_query(self):
+        self.api.get('/api/courses/', {'fields': 'id,title'})
+        with self.assertNumQueries(0):
+            res = self.api.get('/api/courses/', {'fields': 'id,title'})
+        self.assertEqual(res.data, [{'id': self.course.id, 'title': 'Physics'}])
+
+
+class FastReadTests(TempStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        django_cache.clear()
+        self.user = User.objects.create_user('learner', 'learner@example.com', 'pw')
+        self.courses = [Course.objects.create(title=title) for title in ('Physik für alle', 'Line\u2028break')]
+        for course in self.courses:
+            for n in range(2):
+                lesson = Lesson.objects.create(course=course, title=f'{course.title} {n}')
+                LessonPDF.objects.create(lesson=lesson, title=lesson.title, pdf_path=self.store(f'{lesson.id}.pdf'),
+                                         thumbnail_path=self.store(f'{lesson.id}.png'), page_count=3)
+        LessonPDF.objects.create(lesson=lesson, title='No file yet')
+        Enrollment.objects.create(user=self.user, course=self.courses[0])
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def get_both(self, url, params=None):
+        """Response bodies of ``url`` with the serializers and with the fast path"""
+        bodies = []
+        for fast in (False, True):
+            django_cache.clear()
+            with self.settings(API_FAST_READ=fast):
+                res = self.api.get(url, params or {})
+            self.assertEqual(res.status_code, 200)
+            bodies.append(res.content)
+        return bodies
+
+    def test_fast_path_output_is_identical(self):
+        cases = [
+            ('/api/courses/', None),
+            ('/api/courses/', {'expand': 'lessons'}),
+            ('/api/courses/', {'fields': 'title,is_enrolled', 'page_size': 1}),
+            ('/api/courses/my_courses/', {'expand': 'lessons'}),
+            ('/api/lessons/', None),
+            ('/api/lessons/', {'fields': 'id,created_at', 'page_size': 3}),
+        ]
+        for url, params in cases:
+            with self.subTest(url=url, params=params):
+                serialized, fast = self.get_both(url, params)
+                self.assertEqual(fast, serialized)
+
+    def test_pages_continue_from_dict_rows(self):
+        res = self.api.get('/api/lessons/', {'page_size': 3})
+        following = self.api.get(res.data['next'])
+        self.assertEqual([lesson['id'] for lesson in res.data['results'] + following.data['results']],
+                         list(Lesson.objects.order_by('created_at', 'id').values_list('id', flat=True)))
+
+    def test_renderer_matches_json_renderer(self):
+        from decimal import Decimal
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+
+        data = {'title': 'Größe\u2028\u2029', 'when': timezone.now(), 'price': Decimal('1.50'),
+                'ids': {3, 1}, 1: None, 'nested': [{'ok': True}]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_large_json_responses_are_gzipped(self):
+        with self.settings(GZIP_MIN_LENGTH=100):
+            res = self.api.get('/api/lessons/', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(res['Content-Encoding'], 'gzip')
+            small = self.api.get('/api/courses/', {'fields': 'id'}, HTTP_ACCEPT_ENCODING='gzip')
+            self.assertFalse(small.has_header('Content-Encoding'))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, BULK_ENROLL_CHUNK_SIZE=3)
+class BulkEnrollTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'pw', is_staff=True)
+        self.users = [User.objects.create_user(f'student{n}', f'student{n}@example.com', 'pw') for n in range(4)]
+        User.objects.create_user('twin1', 'twin@example.com', 'pw')
+        User.objects.create_user('twin2', 'twin@example.com', 'pw')
+        self.courses = [Course.objects.create(title=f'Course {n}') for n in range(2)]
+        Enrollment.objects.create(user=self.users[0], course=self.courses[0])
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def upload(self, text, **data):
+        return self.api.post('/api/courses/bulk_enroll/',
+                             {'file': SimpleUploadedFile('enroll.csv', text.encode()), **data}, format='multipart')
+
+    def test_pairs_csv(self):
+        course0, course1 = (course.id for course in self.courses)
+        csv_text = (
+            'email,course\n'
+            f'student0@example.com,{course0}\n'  # already enrolled
+            f'student1@example.com,{course0}\n'
+            f'student1,{course1}\n'  # usernames work too
+            f'student1@example.com,{course1}\n'  # repeated
+            f'nobody@example.com,{course0}\n'
+            f'student2@example.com,999\n'
+            f'twin@example.com,{course0}\n'
+            '\n'
+            f'student3@example.com,{course1}\n'
+        )
+        version = enrollment_version(self.users[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.upload(csv_text)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data['created'], res.data['skipped'], res.data['invalid']), (3, 2, 3))
+        self.assertEqual([error['line'] for error in res.data['errors']], [6, 7, 8])
+        self.assertEqual(Enrollment.objects.count(), 4)
+        self.assertNotEqual(enrollment_version(self.users[1]), version)
+
+    def test_cohort_json(self):
+        users = [user.email for user in self.users]
+        res = self.api.post('/api/courses/bulk_enroll/',
+                            {'users': users, 'courses': [course.id for course in self.courses]}, format='json')
+        self.assertEqual((res.data['created'], res.data['skipped'], res.data['invalid']), (7, 1, 0))
+        self.assertEqual(Enrollment.objects.count(), 8)
+
+    def test_cohort_csv_needs_courses(self):
+        self.assertEqual(self.upload('username\nstudent1\n').status_code, 400)
+        res = self.upload('username\nstudent1\nstudent2\n', courses=f'{self.courses[1].id}')
+        self.assertEqual(res.data['created'], 2)
+
+    def test_malformed_json_is_rejected(self):
+        course = self.courses[0].id
+        for body in ({'enrollments': 5}, {'enrollments': [{'user': 'student1', 'course': course}, 'student2']},
+                     {'users': 5, 'courses': [course]}, {'users': 'student1', 'courses': [course]},
+                     {'users': [['student1']], 'courses': [course]}, {'users': ['student1'], 'courses': 5},
+                     ['users']):
+            res = self.api.post('/api/courses/bulk_enroll/', body, format='json')
+            self.assertEqual(res.status_code, 400, body)
+            self.assertIn('error', res.data)
+        self.assertEqual(Enrollment.objects.count(), 1)
+
+    def test_admins_only(self):
+        self.api.force_authenticate(self.users[1])
+        res = self.api.post('/api/courses/bulk_enroll/', {'users': ['student1'], 'courses': [self.courses[0].id]},
+                            format='json')
+        self.assertEqual(res.status_code, 403)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write('user\n' + ''.join(f'{user.username}\n' for user in self.users))
+        self.addCleanup(os.unlink, f.name)
+        out = io.StringIO()
+        call_command('bulk_enroll', f.name, courses=str(self.courses[0].id), stdout=out)
+        self.assertIn('created 3  skipped 1  invalid 0', out.getvalue())
+
+
+# Enrolled ids are only cached with a shared cache (ENROLLMENT_CACHE_TIMEOUT
+# defaults to 0 without Redis); within one test process LocMem is shared
+@override_settings(SECURE_SSL_REDIRECT=False, ENROLLMENT_CACHE_TIMEOUT=3600)
+class EnrolledCourseIdsCacheTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.user = User.objects.create_user('learner', 'learner@example.com', 'pw')
+        self.other = User.objects.create_user('other', 'other@example.com', 'pw')
+        self.courses = [Course.objects.create(title=f'Course {n}') for n in range(2)]
+        self.enrollment = Enrollment.objects.create(user=self.user, course=self.courses[0])
+
+    def test_cached_until_enrollments_change(self):
+        from .enrollment import enrolled_course_ids
+
+        self.assertEqual(enrolled_course_ids(self.user), {self.courses[0].id})
+        with self.assertNumQueries(0):
+            enrolled_course_ids(self.user)
+        Enrollment.objects.create(user=self.user, course=self.courses[1])
+        self.assertEqual(enrolled_course_ids(self.user), {course.id for course in self.courses})
+        # Moving an enrollment (as the admin can) refreshes both users
+        self.enrollment.user = self.other
+        self.enrollment.save()
+        self.assertEqual(enrolled_course_ids(self.user), {self.courses[1].id})
+        self.assertEqual(enrolled_course_ids(self.other), {self.courses[0].id})
+        with self.captureOnCommitCallbacks(execute=True):
+            bulk_enroll([(1, 'learner', self.courses[0].id)])
+        self.assertEqual(enrolled_course_ids(self.user), {course.id for course in self.courses})
+
+    def test_pdf_access_is_checked_against_the_cached_ids(self):
+        lesson = Lesson.objects.create(course=self.courses[1], title='Locked')
+        pdf = LessonPDF.objects.create(lesson=lesson, title='Locked', pdf_path='locked.pdf')
+        api = APIClient()
+        res = api.get(f'/api/lessonpdfs/{pdf.id}/view_pdf/')
+        self.assertEqual((res.status_code, res.data['detail']), (403, 'Authentication required.'))
+        api.force_authenticate(self.user)
+        res = api.get(f'/api/lessonpdfs/{pdf.id}/view_pdf/')
+        self.assertEqual((res.status_code, res.data['detail']), (403, 'You are not enrolled in this course.'))
+        self.assertEqual(api.get(f'/api/lessons/{lesson.id}/').status_code, 403)
+        Enrollment.objects.create(user=self.user, course=self.courses[1])
+        self.assertEqual(api.get(f'/api/lessonpdfs/{pdf.id}/view_pdf/').status_code, 200)
+        with self.assertNumQueries(1):
+            # Just the PDF and its lesson; the check itself is free
+            self.assertEqual(api.get(f'/api/lessonpdfs/{pdf.id}/view_pdf/').status_code, 200)
+
+    @override_settings(ENROLLMENT_CACHE_TIMEOUT=0)
+    def test_not_cached_without_a_shared_cache(self):
+        from .enrollment import enrolled_course_ids
+
+        lesson = Lesson.objects.create(course=self.courses[0], title='Open')
+        pdf = LessonPDF.objects.create(lesson=lesson, title='Open', pdf_path='open.pdf')
+        api = APIClient()
+        api.force_authenticate(self.user)
+        self.assertEqual(api.get(f'/api/lessonpdfs/{pdf.id}/view_pdf/').status_code, 200)
+        # Unenrolled on another worker, whose version bump this one never sees
+        with mock.patch('courses.signals.bump_enrollment_version'):
+            self.enrollment.delete()
+        self.assertEqual(api.get(f'/api/lessonpdfs/{pdf.id}/view_pdf/').status_code, 403)
+        with self.assertNumQueries(1):
+            self.assertEqual(enrolled_course_ids(self.user), frozenset())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CourseCounterTests(TestCase):
+    def setUp(self):
+        django_cache.clear()
+        self.user = User.objects.create_user('learner', 'learner@example.com', 'pw')
+        self.courses = [Course.objects.create(title=f'Course {n}') for n in range(2)]
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def counts(self, course):
+        course.refresh_from_db()
+        return course.enrollment_count, course.lesson_count, course.pdf_count
+
+    def test_enroll_and_unenroll(self):
+        course = self.courses[0]
+        url = f'/api/courses/{course.id}/'
+        self.assertEqual(self.api.post(url + 'enroll/').status_code, 201)
+        res = self.api.post(url + 'enroll/')
+        self.assertEqual((res.status_code, res.data['message']), (400, 'Already enrolled in this course'))
+        self.assertEqual(self.counts(course), (1, 0, 0))
+        self.assertEqual(self.api.post(url + 'unenroll/').status_code, 200)
+        self.assertEqual(self.api.post(url + 'unenroll/').status_code, 400)
+        self.assertEqual(self.counts(course), (0, 0, 0))
+        bulk_enroll([(1, 'learner', course.id), (2, 'learner', self.courses[1].id)])
+        self.assertEqual(self.counts(course), (1, 0, 0))
+        self.assertEqual(self.counts(self.courses[1]), (1, 0, 0))
+
+    def test_lessons_and_pdfs(self):
+        first, second = self.courses
+        lesson = Lesson.objects.create(course=first, title='Lesson')
+        pdf = LessonPDF.objects.create(lesson=lesson, title='PDF', pdf_path='a.pdf')
+        LessonPDF.objects.create(lesson=lesson, title='PDF 2', pdf_path='b.pdf')
+        self.assertEqual(self.counts(first), (0, 1, 2))
+        pdf.delete()
+        self.assertEqual(self.counts(first), (0, 1, 1))
+        # Moving a lesson takes its PDFs along
+        lesson.course = second
+        lesson.save()
+        self.assertEqual((self.counts(first), self.counts(second)), ((0, 0, 0), (0, 1, 1)))
+        lesson.delete()
+        self.assertEqual(self.counts(second), (0, 0, 0))
+
+    def test_saving_a_stale_course_keeps_the_counters(self):
+        course = Course.objects.get(pk=self.courses[0].pk)
+        lesson = Lesson.objects.create(course=self.courses[0], title='Lesson')
+        LessonPDF.objects.create(lesson=lesson, title='PDF', pdf_path='a.pdf')
+        Enrollment.objects.create(user=self.user, course=self.courses[0])
+        course.title = 'Renamed'
+        course.save()
+        self.assertEqual(self.counts(course), (1, 1, 1))
+        self.assertEqual(course.title, 'Renamed')
+
+    def test_reconcile(self):
+        Enrollment.objects.create(user=self.user, course=self.courses[0])
+        Course.objects.update(enrollment_count=99)
+        out = io.StringIO()
+        call_command('reconcile_course_counters', '--dry-run', stdout=out)
+        self.assertEqual(self.counts(self.courses[0]), (99, 0, 0))
+        call_command('reconcile_course_counters', stdout=out)
+        self.assertIn('fixed the counters of 2 courses', out.getvalue())
+        self.assertEqual([self.counts(course) for course in self.courses], [(1, 0, 0), (0, 0, 0)])
+
+    def test_requested_in_fields(self):
+        Enrollment.objects.create(user=self.user, course=self.courses[0])
+        res = self.api.get('/api/courses/?fields=id,enrollment_count')
+        self.assertEqual(sorted(res.data, key=lambda item: item['id']),
+                         [{'id': course.id, 'enrollment_count': n} for course, n in zip(self.courses, (1, 0))])
+        # Not in the default representation
+        self.assertNotIn('enrollment_count', self.api.get(f'/api/courses/{self.courses[0].id}/').data)
+        # Enrollments don't change the catalog's cache versions, so these skip it
+        Enrollment.objects.create(user=self.user, course=self.courses[1])
+        url = f'/api/courses/{self.courses[1].id}/?fields=enrollment_count'
+        res = self.api.get(url)
+        self.assertEqual(res.data, {'enrollment_count': 1})
+        # Their ETags follow the counts
+        Enrollment.objects.filter(course=self.courses[1]).delete()
+        self.assertEqual(self.api.get(url, HTTP_IF_NONE_MATCH=res['ETag']).status_code, 200)
+
+
+# The manifest storage needs collectstatic before templates can render
+@override_settings(SECURE_SSL_REDIRECT=False,
+                   STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class AdminChangelistTests(TestCase):
+    changelists = ('auth/user', 'courses/course', 'courses/lesson', 'courses/lessonpdf', 'courses/enrollment')
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+    def add_rows(self, n):
+        start = Course.objects.count()
+        for i in range(start, start + n):
+            user = User.objects.create_user(f'student{i}', f'student{i}@example.com', 'pw')
+            course = Course.objects.create(title=f'Course {i}')
+            lesson = Lesson.objects.create(course=course, title=f'Lesson {i}')
+            LessonPDF.objects.create(lesson=lesson, title=f'PDF {i}', pdf_path=f'{i}.pdf')
+            Enrollment.objects.create(user=user, course=course)
+
+    def query_counts(self):
+        counts = {}
+        for changelist in self.changelists:
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.get(f'/admin/{changelist}/')
+            self.assertEqual(res.status_code, 200)
+            counts[changelist] = len(queries)
+        return counts
+
+    def test_queries_dont_grow_with_rows(self):
+        self.add_rows(2)
+        counts = self.query_counts()
+        self.add_rows(8)
+        self.assertEqual(self.query_counts(), counts)
+
+    def test_course_enrollments_link(self):
+        self.add_rows(2)
+        course = Course.objects.get(title='Course 0')
+        res = self.client.get('/admin/courses/course/')
+        self.assertContains(res, f'/admin/courses/enrollment/?course__id__exact={course.id}')
+        res = self.client.get(f'/admin/courses/enrollment/?course__id__exact={course.id}')
+        self.assertEqual(res.context['cl'].result_count, 1)
+        # Without a sidebar listing every course
+        self.assertEqual([spec.field.name for spec in res.context['cl'].filter_specs], ['enrolled_at'])
+
+    def test_lesson_changelists_dont_list_every_course(self):
+        from .admin import EstimatedCountPaginator
+
+        self.add_rows(2)
+        course = Course.objects.get(title='Course 0')
+        res = self.client.get('/admin/courses/course/')
+        self.assertContains(res, f'/admin/courses/lesson/?course__id__exact={course.id}')
+        res = self.client.get(f'/admin/courses/lesson/?course__id__exact={course.id}')
+        self.assertEqual(res.context['cl'].result_count, 1)
+        self.assertEqual([spec.field.name for spec in res.context['cl'].filter_specs], ['created_at'])
+        res = self.client.get('/admin/courses/lessonpdf/')
+        self.assertEqual([spec.field.name for spec in res.context['cl'].filter_specs],
+                         ['processing_status', 'uploaded_at'])
+        self.assertIsInstance(res.context['cl'].paginator, EstimatedCountPaginator)
+
+    def test_estimated_count_paginator(self):
+        from .admin import EstimatedCountPaginator
+
+        self.add_rows(3)
+        enrollments = Enrollment.objects.order_by('pk')
+        # Counted exactly here: SQLite has no row estimates
+        self.assertEqual(EstimatedCountPaginator(enrollments, 100).count, 3)
+        with mock.patch.object(EstimatedCountPaginator, 'estimated_count') as estimated_count, \
+                override_settings(ADMIN_ESTIMATED_COUNT_MIN=1000):
+            estimated_count.return_value = 5e6
+            self.assertEqual(EstimatedCountPaginator(enrollments, 100).count, 5000000)
+            # Filtered, or too small to bother: counted exactly
+            self.assertEqual(EstimatedCountPaginator(enrollments.filter(pk__gt=0), 100).count, 3)
+            estimated_count.return_value = -1
+            self.assertEqual(EstimatedCountPaginator(enrollments, 100).count, 3)
+
+
+@override_settings(ENROLLMENT_CACHE_TIMEOUT=3600)
+class CourseBundleTests(TempStorageMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        django_cache.clear()
+        self.user = User.objects.create_user('learner', 'learner@example.com', 'pw')
+        self.course = Course.objects.create(title='Course', description='About')
+        self.lessons = [Lesson.objects.create(course=self.course, title=f'Lesson {n}') for n in range(3)]
+        self.pdfs = [
+            LessonPDF.objects.create(lesson=lesson, title=f'{lesson.title} PDF {n}', pdf_path=self.store(f'{lesson.id}-{n}.pdf'),
+                                     thumbnail_path=self.store(f'thumbs/{lesson.id}-{n}.png', b'png'), page_count=3)
+            for lesson in self.lessons for n in range(2)
+        ]
+        self.url = f'/api/courses/{self.course.id}/bundle/'
+        self.api = APIClient()
+
+    def test_anonymous(self):
+        with self.assertNumQueries(3):
+            res = self.api.get(self.url, {'links': 'first'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data['course']['title'], res.data['course']['is_enrolled']), ('Course', False))
+        self.assertEqual([lesson['id'] for lesson in res.data['lessons']], [lesson.id for lesson in self.lessons])
+        first = res.data['lessons'][0]['pdfs']
+        self.assertEqual([pdf['id'] for pdf in first], [pdf.id for pdf in self.pdfs[:2]])
+        self.assertEqual(first[0]['page_count'], 3)
+        # No links without an enrollment
+        self.assertNotIn('signed_url', first[0])
+        self.assertNotIn('expires_in', res.data)
+        self.assertEqual(self.api.get('/api/courses/999/bundle/').status_code, 404)
+
+    def test_enrolled_with_links(self):
+        Enrollment.objects.create(user=self.user, course=self.course)
+        self.api.force_authenticate(self.user)
+        self.api.get(self.url)
+        # The enrolled ids are cached now
+        with self.assertNumQueries(3):
+            res = self.api.get(self.url, {'links': 'first'})
+        self.assertTrue(res.data['course']['is_enrolled'])
+        self.assertIn('learner', res.data['watermark'])
+        first, second = res.data['lessons'][:2]
+        self.assertIn(f'/api/lessonpdfs/{self.pdfs[0].id}/content/?token=', first['pdfs'][0]['signed_url'])
+        self.assertIsNotNone(first['pdfs'][1]['thumbnail_url'])
+        # Only the first lesson is linked
+        self.assertNotIn('signed_url', second['pdfs'][0])
+        link = first['pdfs'][0]['signed_url']
+        self.assertEqual(self.client.get(link).status_code, 302)
@@ -1,6 +1,35 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Lesson
+from .models import Lesson, UploadSession
 
 class PDFUploadSerializer(serializers.Serializer):
     lesson_id = serializers.IntegerField()
     pdf_file = serializers.FileField()
+    title = serializers.CharField(max_length=200, required=False)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    lesson_id = serializers.PrimaryKeyRelatedField(source='lesson', queryset=Lesson.objects.all())
+    part_size = serializers.IntegerField(required=False, min_value=64 * 1024)
+    total_size = serializers.IntegerField(min_value=1)
+    part_count = serializers.IntegerField(read_only=True)
+    received_parts = serializers.SerializerMethodField()
+    pdf_id = serializers.PrimaryKeyRelatedField(source='pdf', read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'lesson_id', 'title', 'total_size', 'part_size', 'part_count',
+                  'received_parts', 'status', 'pdf_id', 'created_at', 'completed_at']
+        read_only_fields = ['status', 'created_at', 'completed_at']
+
+    def get_received_parts(self, obj):
+        return [{'number': part.number, 'size': part.size, 'sha256': part.sha256} for part in obj.parts.all()]
+
+    def validate_part_size(self, value):
+        if value > settings.UPLOAD_PART_SIZE:
+            raise serializers.ValidationError(f"Parts can be at most {settings.UPLOAD_PART_SIZE} bytes.")
+        return value
+
+    def create(self, validated_data):
+        validated_data.setdefault('part_size', settings.UPLOAD_PART_SIZE)
+        return super().create(validated_data)
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .blobs import hash_chunks, store_blob
+from .models import LessonPDF, UploadPart, UploadSession
+
+
+class UploadError(Exception):
+    """Raised when a part or a completed upload fails validation."""
+
+
+def _staging_dir(session_id):
+    return os.path.join(settings.UPLOAD_STAGING_ROOT, str(session_id))
+
+
+def _part_file(session, number):
+    return os.path.join(_staging_dir(session.id), f"{number:06d}.part")
+
+
+def write_part(session, number, stream, expected_sha256):
+    """
+    Stream one part from ``stream`` to the staging area, verifying its checksum.
+
+    Re-sending a part replaces it, so clients can retry any part that failed.
+    Each request writes its own temporary file and renames it into place, so
+    concurrent retries of one part never interleave their bytes.
+    """
+    if not 1 <= number <= session.part_count:
+        raise UploadError(f"Part number must be between 1 and {session.part_count}.")
+    expected_size = session.expected_part_size(number)
+    chunk_size = settings.UPLOAD_CHUNK_SIZE
+
+    os.makedirs(_staging_dir(session.id), exist_ok=True)
+    final_path = _part_file(session, number)
+    fd, tmp_path = tempfile.mkstemp(dir=_staging_dir(session.id), prefix=f"{number:06d}.", suffix=".tmp")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > expected_size:
+                    raise UploadError(f"Part {number} must be {expected_size} bytes.")
+                digest.update(chunk)
+                fh.write(chunk)
+        if size != expected_size:
+            raise UploadError(f"Part {number} must be {expected_size} bytes, got {size}.")
+        if digest.hexdigest() != (expected_sha256 or '').lower():
+            raise UploadError(f"Checksum mismatch for part {number}.")
+        os.replace(tmp_path, final_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    part, _ = UploadPart.objects.update_or_create(
+        session=session, number=number,
+        defaults={'size': size, 'sha256': digest.hexdigest()},
+    )
+    return part
+
+
+def missing_parts(session):
+    received = set(session.parts.values_list('number', flat=True))
+    return [n for n in range(1, session.part_count + 1) if n not in received]
+
+
+def _unstaged_parts(session):
+    """
+    Received parts whose file isn't in this server's staging area: sent to
+    another server (UPLOAD_STAGING_ROOT isn't shared) or cleaned up since.
+    """
+    return [n for n in range(1, session.part_count + 1) if not os.path.exists(_part_file(session, n))]
+
+
+def _iter_parts(session):
+    chunk_size = settings.UPLOAD_CHUNK_SIZE
+    for number in range(1, session.part_count + 1):
+        try:
+            fh = open(_part_file(session, number), 'rb')
+        except FileNotFoundError:
+            raise UploadError(f"Part {number} is no longer staged; send it again.")
+        with fh:
+            while True:
+                chunk = fh.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+def complete_upload(session):
+    """
+    Store the staged parts, in order, as a blob and create the ``LessonPDF``.
+
+    Hashing and the transfer to storage run outside any transaction; the
+    session row is only locked to create the PDF, so a repeated or
+    concurrent "complete" returns the same PDF (concurrent transfers of the
+    same bytes end up as one blob).
+    """
+    session = UploadSession.objects.select_related('lesson', 'pdf').get(pk=session.pk)
+    if session.status == 'complete':
+        return session.pdf
+    missing = missing_parts(session)
+    if missing:
+        raise UploadError(f"Missing parts: {', '.join(map(str, missing))}.")
+    unstaged = _unstaged_parts(session)
+    if unstaged:
+        # Forget them, so the session lists them as missing and they can be re-sent
+        session.parts.filter(number__in=unstaged).delete()
+        raise UploadError(f"Parts not staged on this server, send them again: {', '.join(map(str, unstaged))}.")
+
+    # Parts are already on local disk, so hashing them first is cheap and lets
+    # a duplicate upload skip the transfer to storage entirely
+    sha256, size = hash_chunks(_iter_parts(session))
+    blob = store_blob(sha256, size, lambda: _iter_parts(session))
+
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().select_related('lesson', 'pdf').get(pk=session.pk)
+        if session.status == 'complete':
+            return session.pdf
+        pdf = LessonPDF.objects.create(lesson=session.lesson, title=session.title, blob=blob, pdf_path=blob.path)
+        session.pdf = pdf
+        session.status = 'complete'
+        session.completed_at = timezone.now()
+        session.save(update_fields=['pdf', 'status', 'completed_at'])
+        transaction.on_commit(lambda: discard_parts(session.id))
+    return pdf
+
+
+def discard_parts(session_id):
+    shutil.rmtree(_staging_dir(session_id), ignore_errors=True)
@@ -1,14 +1,18 @@
 from django.urls import path, include
 from . import views
 from rest_framework import routers
-from .api import CourseViewSet, LessonViewSet, LessonPDFViewSet
+from .api import CourseViewSet, LessonViewSet, LessonPDFViewSet, SearchViewSet, UploadSessionViewSet
 
 router = routers.DefaultRouter()
 router.register(r'courses', CourseViewSet)
 router.register(r'lessons', LessonViewSet)
 router.register(r'lessonpdfs', LessonPDFViewSet)
+router.register(r'uploads', UploadSessionViewSet)
+router.register(r'search', SearchViewSet, basename='search')
 
 urlpatterns = [
     path("", views.home, name="home"),
+    path("storage/", views.local_storage_file, name="local-storage"),
+    path("lessonpdfs/<int:pdf_id>/content/", views.pdf_content, name="pdf-content"),
     path("", include(router.urls)),
 ]
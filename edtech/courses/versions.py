@@ -0,0 +1,26 @@
+"""
+Version counters kept in the Django cache.
+
+Cache keys that embed a version go stale as soon as it is bumped, without
+having to find and delete them.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a counter evicted from the cache can't come
+        # back with a number that old entries were stored under
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
@@ -1,3 +1,5 @@
+import os
+
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from django.contrib.auth.models import User
@@ -8,12 +10,17 @@ from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import render
 from rest_framework.decorators import api_view, permission_classes
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404, render
 from django.utils import timezone
-from .models import Lesson
-from .storage import signed_url
-from django.http import HttpResponse
+from .models import Lesson, LessonPDF
+from .pdf_tokens import InvalidToken, verify_pdf_token
+from .pdf_delivery import serve_pdf
+from .watermark import serve_stamped, server_watermarks_enabled
+from .storage import signed_url, get_backend
+from .storage_backends import LocalFileSystemStorageBackend, StorageError
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseRedirect
 
 
 
@@ -138,6 +145,45 @@ def home(request):
     return HttpResponse("Hello from Courses App!")
 
 
+def local_storage_file(request):
+    """Serve an object from the local filesystem backend behind a signed token."""
+    backend = get_backend()
+    if not isinstance(backend, LocalFileSystemStorageBackend):
+        raise Http404()
+    try:
+        bucket, path = backend.verify(request.GET.get('token', ''))
+        fh = backend.open(bucket, path)
+    except StorageError:
+        raise Http404()
+    return FileResponse(fh, content_type='application/pdf', filename=os.path.basename(path))
+
+
+def pdf_content(request, pdf_id):
+    """
+    Verify a PDF access token issued by view_pdf and redirect to storage.
+
+    The token is checked locally in constant time; the storage URL comes from
+    the signed URL cache, so most requests make no call to the provider. With
+    PDF_DELIVERY_MODE = 'proxy' the bytes are served from the local PDF cache.
+    """
+    try:
+        access = verify_pdf_token(request.GET.get('token', ''), pdf_id=pdf_id, scope='view')
+    except InvalidToken as exc:
+        return HttpResponseForbidden(str(exc))
+    if server_watermarks_enabled():
+        # Never hand out the unstamped original when stamping is on
+        pdf = get_object_or_404(LessonPDF.objects.select_related('blob'), pk=pdf_id)
+        return serve_stamped(request, pdf, access.user_id)
+    if settings.PDF_DELIVERY_MODE == 'proxy':
+        return serve_pdf(request, get_object_or_404(LessonPDF.objects.select_related('blob'), pk=pdf_id))
+    pdf_path = LessonPDF.objects.filter(pk=pdf_id).values_list('pdf_path', flat=True).first()
+    if not pdf_path:
+        raise Http404()
+    response = HttpResponseRedirect(signed_url(pdf_path, expires_sec=60))
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
 
 
 @login_required
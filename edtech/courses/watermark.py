@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import PermissionDenied
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+from .pdf_cache import get_pdf_cache
+from .pdf_delivery import serve_cached_file
+from .pdf_pages import PDFNotCached, content_key, page_manifest
+from .pdf_stamping import stamp_document, stamp_pages
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+# Stamps in progress in this process, by derived cache key
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class WatermarkBusy(Exception):
+    """
+    Raised when every stamping slot stays busy, or a stamp doesn't finish,
+    within PDF_WATERMARK_TIMEOUT seconds.
+    """
+
+
+def server_watermarks_enabled():
+    return settings.PDF_WATERMARK_MODE == 'server'
+
+
+def watermark_text(user):
+    """Per-user text stamped into served PDFs; stable so overlays can be cached."""
+    return f"{user.username or user.email} • #{user.id}"
+
+
+def _get_pool():
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = settings.PDF_WATERMARK_WORKERS
+                # Spawned workers don't inherit the request worker's threads or sockets
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+                # Bound queued work so a burst can't pile up unbounded CPU jobs
+                _slots = threading.BoundedSemaphore(workers * 2)
+    return _pool, _slots
+
+
+@receiver(setting_changed)
+def _reset_pool(setting, **kwargs):
+    global _pool
+    if setting == 'PDF_WATERMARK_WORKERS' and _pool is not None:
+        _pool.shutdown(wait=False)
+        _pool = None
+
+
+class _StampJob:
+    """A stamp running in the pool, building the derived cache file ``key`` in ``tmp_path``."""
+
+    def __init__(self, key, tmp_path, future):
+        self.key = key
+        self.tmp_path = tmp_path
+        self.future = future
+        self._local = None
+        self._lock = threading.Lock()
+
+    def publish(self):
+        """Move the finished stamp into the PDF disk cache (once) and return it there."""
+        with self._lock:
+            if self._local is None:
+                self.future.result()
+                self._local = get_pdf_cache().publish_derived(self.key, self.tmp_path)
+            return self._local
+
+
+def _finish(job, slots):
+    # Runs when the stamp ends, whether or not a request is still waiting on it
+    slots.release()
+    try:
+        job.publish()
+    except Exception:
+        logger.warning("Watermark stamp %s failed", job.key, exc_info=True)
+        if os.path.exists(job.tmp_path):
+            os.remove(job.tmp_path)
+    finally:
+        with _jobs_lock:
+            if _jobs.get(job.key) is job:
+                del _jobs[job.key]
+
+
+def _start(key, stamp, src_path, args):
+    """The running job for ``key``, starting one unless another request already did."""
+    with _jobs_lock:
+        job = _jobs.get(key)
+    if job is not None:
+        return job
+    pool, slots = _get_pool()
+    if not slots.acquire(timeout=settings.PDF_WATERMARK_TIMEOUT):
+        raise WatermarkBusy("Watermarking is busy, try again shortly.")
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is not None:
+            # Started by another request while this one waited for a slot
+            slots.release()
+            return job
+        tmp_path = get_pdf_cache().derived_tmp(key)
+        try:
+            future = pool.submit(stamp, src_path, tmp_path, *args)
+        except BaseException:
+            slots.release()
+            os.remove(tmp_path)
+            raise
+        job = _jobs[key] = _StampJob(key, tmp_path, future)
+    # The slot is held until the job finishes, even if no request waits for it
+    future.add_done_callback(lambda _: _finish(job, slots))
+    return job
+
+
+def run_stamp(key, stamp, src_path, *args):
+    """
+    Build the derived cache file ``key`` with ``stamp(src_path, tmp_path, *args)``
+    in the process pool (or inline when PDF_WATERMARK_WORKERS is 0), and
+    return it.
+
+    Jobs are tracked by key, so a request that gives up waiting after
+    PDF_WATERMARK_TIMEOUT leaves its stamp running: retries wait on the same
+    job, and its output is published to the cache when it finishes.
+    """
+    if settings.PDF_WATERMARK_WORKERS == 0:
+        return get_pdf_cache().get_or_build(key, lambda tmp_path: stamp(src_path, tmp_path, *args))
+    job = _start(key, stamp, src_path, args)
+    try:
+        job.future.result(timeout=settings.PDF_WATERMARK_TIMEOUT)
+    except FutureTimeout:
+        raise WatermarkBusy("Watermarking is taking too long, try again shortly.")
+    return job.publish()
+
+
+def stamped_file(pdf, text, first=None, last=None):
+    """
+    Return a local file with pages ``first``..``last`` (default: all) of
+    ``pdf`` stamped with ``text``, cached in the PDF disk cache.
+
+    Whole documents are stamped as an incremental update, page by page
+    without holding the document in memory; page ranges are small enough to
+    rewrite. A source PDF not in the local cache raises ``PDFNotCached``
+    (after starting a background fill), like page requests do.
+    """
+    pdf_cache = get_pdf_cache()
+    text_key = hashlib.sha256(text.encode()).hexdigest()[:16]
+    pages = 'all' if first is None else f"{first}-{last}"
+    key = f"stamped:{content_key(pdf)}:{pages}:{text_key}"
+    local = pdf_cache.get_derived(key)
+    if local is not None:
+        return local
+    # Raises UnreadablePDF for files that couldn't be stamped anyway
+    page_manifest(pdf)
+    src_path = pdf_cache.get(pdf.pdf_path)
+    if src_path is None:
+        pdf_cache.fill_async(pdf.pdf_path)
+        raise PDFNotCached(pdf.pdf_path)
+    if first is None:
+        return run_stamp(key, stamp_document, src_path, text)
+    return run_stamp(key, stamp_pages, src_path, first, last, text)
+
+
+def stamped_etag(pdf, text, first=None, last=None):
+    text_key = hashlib.sha256(text.encode()).hexdigest()[:16]
+    pages = f"-p{first}-{last}" if first else ""
+    return f'"{content_key(pdf)}{pages}-w{text_key}"'
+
+
+def serve_stamped(request, pdf, user_id, first=None, last=None):
+    """Serve the caller's stamped copy, answering 503 if the pool is saturated or slow."""
+    user = get_user_model().objects.only('username', 'email').filter(pk=user_id).first()
+    if user is None:
+        # A token that outlived its user
+        raise PermissionDenied("This link's user no longer exists.")
+    text = watermark_text(user)
+    try:
+        return serve_cached_file(
+            request,
+            lambda: stamped_file(pdf, text, first, last),
+            etag=stamped_etag(pdf, text, first, last),
+            last_modified=pdf.uploaded_at.timestamp(),
+        )
+    except WatermarkBusy as exc:
+        response = HttpResponse(str(exc), status=503, content_type='text/plain')
+        response['Retry-After'] = '2'
+        return response
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'edtech.settings')
 
 application = get_asgi_application()
+
+# Fail at startup, not on the first upload, when the configured PDF storage
+# backend can't be built (e.g. Supabase selected without credentials)
+from courses.storage import get_backend  # noqa: E402
+
+get_backend()
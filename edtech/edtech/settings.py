@@ -68,8 +68,28 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # orjson-backed; same output as JSONRenderer (see courses/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': (
+        'courses.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
+# Keyset pagination (courses/pagination.py), used when a list request passes
+# ?page_size= or ?cursor=
+API_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", "50"))
+API_MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", "200"))
+# Build course and lesson lists from values() rows rather than serializers
+# (courses/fast_read.py); the JSON is the same either way
+API_FAST_READ = os.getenv("API_FAST_READ", "True") == "True"
+# Smallest JSON/text response worth gzipping (courses/middleware.py)
+GZIP_MIN_LENGTH = int(os.getenv("GZIP_MIN_LENGTH", "1024"))
+# Rows per query batch for bulk enrollment (courses/bulk_enroll.py)
+BULK_ENROLL_CHUNK_SIZE = int(os.getenv("BULK_ENROLL_CHUNK_SIZE", "2000"))
+# Unfiltered admin changelists of tables with at least this many rows show
+# PostgreSQL's row estimate instead of running COUNT(*) (courses/admin.py)
+ADMIN_ESTIMATED_COUNT_MIN = int(os.getenv("ADMIN_ESTIMATED_COUNT_MIN", "100000"))
+
 # JWT Configuration
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -87,6 +107,7 @@ AUTHENTICATION_BACKENDS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'courses.middleware.LargeResponseGZipMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -192,10 +213,120 @@ else:
         }
     }
 
+
+# Cache
+# The catalog response cache, its version counters and the enrolled course
+# ids must be shared by every worker process, or an invalidation only reaches
+# the process that made it. Production sets REDIS_URL; without it each process
+# has its own local-memory cache, and the timeouts below are kept short.
+REDIS_URL = os.getenv("REDIS_URL", "")
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE = os.getenv("SUPABASE_SERVICE_ROLE")
 SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "courses")
 
+# PDF storage backend (see courses/storage_backends.py). Supabase unless local
+# storage is opted into: with DEBUG and no Supabase credentials, or by setting
+# PDF_STORAGE_BACKEND explicitly. Container disks are usually ephemeral, so
+# production never falls back to them; edtech/wsgi.py refuses to start when
+# Supabase is selected but not configured.
+if DEBUG and not (SUPABASE_URL and SUPABASE_SERVICE_ROLE):
+    _default_storage_backend = 'courses.storage_backends.LocalFileSystemStorageBackend'
+else:
+    _default_storage_backend = 'courses.storage_backends.SupabaseStorageBackend'
+PDF_STORAGE_BACKEND = os.getenv("PDF_STORAGE_BACKEND", _default_storage_backend)
+PDF_STORAGE_ROOT = os.getenv("PDF_STORAGE_ROOT", os.path.join(BASE_DIR, 'storage'))
+
+# Shared keep-alive HTTP client used by the Supabase storage backend
+SUPABASE_HTTP_POOL_SIZE = int(os.getenv("SUPABASE_HTTP_POOL_SIZE", "20"))
+SUPABASE_HTTP_TIMEOUT = float(os.getenv("SUPABASE_HTTP_TIMEOUT", "30"))
+SUPABASE_HTTP_CONNECT_TIMEOUT = float(os.getenv("SUPABASE_HTTP_CONNECT_TIMEOUT", "5"))
+SUPABASE_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_HTTP_KEEPALIVE_EXPIRY", "60"))
+
+# In-process signed URL cache (see courses/storage.py)
+SIGNED_URL_CACHE_SIZE = int(os.getenv("SIGNED_URL_CACHE_SIZE", "1024"))
+# Fraction of a signed URL's lifetime that must remain for it to be reused
+SIGNED_URL_CACHE_MIN_VALIDITY = float(os.getenv("SIGNED_URL_CACHE_MIN_VALIDITY", "0.5"))
+# Maximum number of paths signed per create_signed_urls call
+SIGNED_URL_BATCH_SIZE = int(os.getenv("SIGNED_URL_BATCH_SIZE", "100"))
+
+
+# Locally signed PDF access tokens (see courses/pdf_tokens.py). Defaults to
+# a key derived from SECRET_KEY; set separately to rotate PDF links alone.
+PDF_TOKEN_SECRET = os.getenv("PDF_TOKEN_SECRET", "")
+PDF_TOKEN_TTL = int(os.getenv("PDF_TOKEN_TTL", "300"))
+
+# PDF delivery: 'redirect' sends viewers to a signed storage URL, 'proxy'
+# serves bytes (with Range support) from a bounded local disk cache
+PDF_DELIVERY_MODE = os.getenv("PDF_DELIVERY_MODE", "redirect")
+PDF_CACHE_ROOT = os.getenv("PDF_CACHE_ROOT", os.path.join(BASE_DIR, 'pdf_cache'))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+PDF_CACHE_FILL_WORKERS = int(os.getenv("PDF_CACHE_FILL_WORKERS", "2"))
+# How often (seconds) each process recounts the directory it shares with the
+# others, so their fills count against PDF_CACHE_MAX_BYTES
+PDF_CACHE_RESCAN_INTERVAL = float(os.getenv("PDF_CACHE_RESCAN_INTERVAL", "60"))
+# e.g. 'X-Accel-Redirect' with an nginx internal location mapped to PDF_CACHE_ROOT
+PDF_SENDFILE_HEADER = os.getenv("PDF_SENDFILE_HEADER", "")
+PDF_SENDFILE_PREFIX = os.getenv("PDF_SENDFILE_PREFIX", "/protected-pdfs/")
+# Largest page range /api/lessonpdfs/{id}/pages/{first}-{last}/ will cut
+PDF_PAGE_RANGE_MAX = int(os.getenv("PDF_PAGE_RANGE_MAX", "50"))
+# 'client' only returns watermark text for the viewer to overlay; 'server'
+# stamps it into every PDF page served to the user
+PDF_WATERMARK_MODE = os.getenv("PDF_WATERMARK_MODE", "client")
+# Processes in the stamping pool (0 stamps inline in the request worker)
+PDF_WATERMARK_WORKERS = int(os.getenv("PDF_WATERMARK_WORKERS", "2"))
+PDF_WATERMARK_TIMEOUT = float(os.getenv("PDF_WATERMARK_TIMEOUT", "30"))
+
+# Post-upload processing (page count, text, thumbnail): background threads,
+# or 0 to process inline when the upload's transaction commits
+PDF_PROCESSING_WORKERS = int(os.getenv("PDF_PROCESSING_WORKERS", "2"))
+PDF_THUMBNAIL_SIZE = int(os.getenv("PDF_THUMBNAIL_SIZE", "320"))
+# Rewrite uploads with compressed streams and shared fonts/images, keeping the
+# original as a fallback; linearized for fast web view when qpdf is installed
+PDF_OPTIMIZE_UPLOADS = os.getenv("PDF_OPTIMIZE_UPLOADS", "True") == "True"
+PDF_QPDF_BINARY = os.getenv("PDF_QPDF_BINARY", "qpdf")
+
+# Full-text search (courses/search.py)
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "20"))
+SEARCH_MAX_BODY_CHARS = int(os.getenv("SEARCH_MAX_BODY_CHARS", "200000"))
+
+# Typeahead suggestions (courses/suggest.py): keys scanned per lookup, and how
+# often each process checks for title changes made elsewhere / fully rebuilds
+SUGGEST_SCAN_LIMIT = int(os.getenv("SUGGEST_SCAN_LIMIT", "2000"))
+SUGGEST_SYNC_INTERVAL = float(os.getenv("SUGGEST_SYNC_INTERVAL", "5"))
+SUGGEST_MAX_AGE = float(os.getenv("SUGGEST_MAX_AGE", "600"))
+SUGGEST_MAX_RESULTS = int(os.getenv("SUGGEST_MAX_RESULTS", "20"))
+
+# Shared course list/detail response cache (courses/catalog_cache.py); entries
+# are versioned and invalidated by signals, so with Redis the timeout only
+# bounds memory. Without it, it bounds how long other processes serve stale data
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", "3600" if REDIS_URL else "30"))
+# How long a rebuild may hold its lock, and how long other requests wait on it
+CATALOG_CACHE_LOCK_TIMEOUT = int(os.getenv("CATALOG_CACHE_LOCK_TIMEOUT", "10"))
+CATALOG_CACHE_LOCK_WAIT = float(os.getenv("CATALOG_CACHE_LOCK_WAIT", "2"))
+# Cached per-user enrolled course ids (courses/enrollment.py); versioned like
+# the catalog cache, so this too only bounds memory. They decide PDF access, so
+# without Redis they aren't cached (0): another process's copy would keep an
+# unenrolled user's access
+ENROLLMENT_CACHE_TIMEOUT = int(os.getenv("ENROLLMENT_CACHE_TIMEOUT", "3600" if REDIS_URL else "0"))
+
+# Uploads: chunk size for streaming to storage, and staging area for
+# resumable (init/part/complete) uploads. With several servers behind a load
+# balancer the staging area must be a volume they all mount, since the parts
+# of one upload can reach different servers. Run ``manage.py
+# clean_upload_sessions`` periodically to drop abandoned uploads
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+UPLOAD_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_STAGING_ROOT = os.getenv("UPLOAD_STAGING_ROOT", os.path.join(BASE_DIR, 'upload_parts'))
+UPLOAD_SESSION_MAX_AGE_HOURS = float(os.getenv("UPLOAD_SESSION_MAX_AGE_HOURS", "24"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators